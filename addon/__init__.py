@@ -1,3 +1,4 @@
+from . import config, jobs
 from . import ops
 from . import ui
 from . import props
@@ -6,6 +7,9 @@ from . import handlers
 
 
 def register():
+    if config.cp_state.scheduler is None:
+        config.cp_state.scheduler = jobs.Scheduler(max_workers=2)
+
     ops.register()
     props.register()
     ui.register()
@@ -0,0 +1,136 @@
+import collections
+import concurrent.futures
+import os
+
+from . import config, history, refs, store
+
+
+# 'logical' sums file sizes, 'physical' the blocks allocated on disk, counting
+# each inode once (hardlinks) and only the allocated parts of sparse files.
+# Extents shared through reflinks can't be told apart from a plain stat, so
+# reflinked copies still count in full in 'physical'.
+DiskUsage = collections.namedtuple("DiskUsage", ["logical", "physical", "files"])
+
+# Physical bytes only this timeline uses (what deleting it would free), and
+# bytes it shares with other timelines
+TimelineUsage = collections.namedtuple("TimelineUsage", ["unique", "shared"])
+
+# st_blocks is in 512 bytes units whatever the filesystem block size
+_BLOCK_UNIT = 512
+
+_SCAN_WORKERS = 8
+
+
+def _physical_size(stat):
+    blocks = getattr(stat, "st_blocks", None)
+    # Windows has no st_blocks
+    if blocks is None:
+        return stat.st_size
+    return blocks * _BLOCK_UNIT
+
+
+def _scan_folder(path):
+    """Stats of the files directly in 'path', and its subfolders"""
+    stats = []
+    folders = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            # skip symbolic links
+            if entry.is_dir(follow_symlinks=False):
+                folders.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                # DirEntry.stat leaves st_ino/st_dev empty on Windows
+                stats.append(os.stat(entry.path, follow_symlinks=False))
+
+    return stats, folders
+
+
+def _iter_stats(folder):
+    """
+    Stats every file under 'folder'. Folders are scanned in parallel since most
+    of the time goes into waiting on the filesystem.
+    """
+    with concurrent.futures.ThreadPoolExecutor(_SCAN_WORKERS) as executor:
+        pending = {executor.submit(_scan_folder, folder)}
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                stats, folders = future.result()
+                yield from stats
+                pending.update(executor.submit(_scan_folder, f) for f in folders)
+
+
+def get_folder_usage(folder):
+    logical = 0
+    physical = 0
+    files = 0
+    seen_inodes = set()
+
+    for stat in _iter_stats(folder):
+        files += 1
+        logical += stat.st_size
+
+        inode = (stat.st_dev, stat.st_ino)
+        if inode not in seen_inodes:
+            seen_inodes.add(inode)
+            physical += _physical_size(stat)
+
+    return DiskUsage(logical, physical, files)
+
+
+def get_usage(filepath):
+    """Usage of the project's whole .checkpoints folder"""
+    _paths = config.get_paths(filepath)
+    return get_folder_usage(_paths[config.PATHS_KEYS.ROOT_FOLDER])
+
+
+def get_timeline_usage(filepath):
+    """Returns {timeline: TimelineUsage} for every timeline of the project"""
+    # inode: [physical size, link count, links seen, timelines using it]
+    inodes = {}
+    # The inode of each path, chunks are shared by many checkpoints and
+    # only stat'ed the first time
+    paths_seen = {}
+
+    def add_file(path, timeline):
+        inode = paths_seen.get(path)
+        if inode is None:
+            stat = os.stat(path)
+            inode = inodes.get((stat.st_dev, stat.st_ino))
+            if inode is None:
+                inode = [_physical_size(stat), stat.st_nlink, 0, set()]
+                inodes[(stat.st_dev, stat.st_ino)] = inode
+            inode[2] += 1
+            paths_seen[path] = inode
+        inode[3].add(timeline)
+
+    _paths = config.get_paths(filepath)
+    _saves = _paths[config.PATHS_KEYS.CHECKPOINTS_FOLDER]
+
+    usage = {}
+    for timeline in history.list_timelines(filepath):
+        usage[timeline] = [0, 0]
+        for path in history.get_timeline_files(filepath, timeline):
+            add_file(path, timeline)
+
+    for checkpoint_id, timelines in refs.get_refs(filepath).items():
+        checkpoint_path = os.path.join(_saves, checkpoint_id)
+        if not os.path.exists(checkpoint_path):
+            continue
+
+        paths = [checkpoint_path]
+        paths.extend(store.get_checkpoint_objects(filepath, checkpoint_id))
+        for timeline in timelines:
+            usage.setdefault(timeline, [0, 0])
+            for path in paths:
+                add_file(path, timeline)
+
+    for size, link_count, links, timelines in inodes.values():
+        # Files also linked from outside the store aren't freed with it
+        is_shared = len(timelines) > 1 or links < link_count
+        for timeline in timelines:
+            usage[timeline][1 if is_shared else 0] += size
+
+    return {timeline: TimelineUsage(*sizes) for timeline, sizes in usage.items()}
@@ -0,0 +1,310 @@
+import collections
+import gzip
+import mmap
+import re
+import struct
+
+
+BLEND_MAGIC = b"BLENDER"
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+ENDB_CODE = b"ENDB"
+DNA1_CODE = b"DNA1"
+
+_LEGACY_HEADER_SIZE = 12
+
+BlendHeader = collections.namedtuple(
+    "BlendHeader",
+    ["size", "pointer_size", "is_little_endian", "version", "file_format_version"],
+)
+
+# 'offset' is where the block's data starts, the BHead sits right before it
+BlockRecord = collections.namedtuple(
+    "BlockRecord",
+    ["code", "size", "old_pointer", "sdna_index", "count", "offset", "header_size"],
+)
+
+SdnaField = collections.namedtuple(
+    "SdnaField", ["type", "name", "offset", "size", "is_pointer"]
+)
+SdnaStruct = collections.namedtuple("SdnaStruct", ["type", "size", "fields"])
+
+
+def parse_header(data):
+    """
+    Parses the file header, either the legacy 12 bytes one
+    ("BLENDER-v402": pointer size, endianness, version) or the 17 bytes one
+    used since the large BHead format ("BLENDER17-01v0500").
+    """
+    if data[:7] != BLEND_MAGIC:
+        raise ValueError("Not a .blend file")
+
+    if data[7:9].isdigit():
+        size = int(data[7:9])
+        if len(data) < size or data[9:10] != b"-":
+            raise ValueError("Unsupported .blend header")
+        file_format_version = int(data[10:12])
+        endian = data[12:13]
+        version = int(data[13:size])
+        pointer_size = 8
+    else:
+        size = _LEGACY_HEADER_SIZE
+        pointer_size = {b"_": 4, b"-": 8}.get(data[7:8])
+        if pointer_size is None:
+            raise ValueError("Unsupported .blend pointer size")
+        endian = data[8:9]
+        version = int(data[9:12])
+        file_format_version = 0
+
+    if endian not in (b"v", b"V"):
+        raise ValueError("Unsupported .blend endianness")
+
+    return BlendHeader(size, pointer_size, endian == b"v", version, file_format_version)
+
+
+def _bhead_struct(header):
+    """Returns the BHead layout and the order of its fields"""
+    byte_order = "<" if header.is_little_endian else ">"
+
+    if header.file_format_version >= 1:
+        # LargeBHead8: code, SDNAnr, old, len, nr
+        return struct.Struct(f"{byte_order}4siQqq"), (0, 3, 2, 1, 4)
+    if header.pointer_size == 8:
+        # SmallBHead8: code, len, old, SDNAnr, nr
+        return struct.Struct(f"{byte_order}4siQii"), (0, 1, 2, 3, 4)
+    # BHead4: code, len, old, SDNAnr, nr
+    return struct.Struct(f"{byte_order}4siIii"), (0, 1, 2, 3, 4)
+
+
+def _open_zstd(path):
+    try:
+        from compression import zstd
+
+        return zstd.open(path, "rb")
+    except ImportError:
+        pass
+
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError(
+            "Reading zstd compressed .blend files requires the 'zstandard' module"
+        )
+
+    # Blender writes one frame per block of the file
+    return zstandard.ZstdDecompressor().stream_reader(
+        open(path, "rb"), read_across_frames=True, closefd=True
+    )
+
+
+def _read_exactly(file, size):
+    data = bytearray()
+    while len(data) < size:
+        piece = file.read(size - len(data))
+        if not piece:
+            break
+        data += piece
+    return bytes(data)
+
+
+class BlendFile:
+    """
+    Block-level reader for .blend files.
+
+    Uncompressed files are memory mapped and block data is handed out as
+    zero-copy memoryviews. Compressed files (gzip or zstd) are decompressed as
+    a stream, so only one block is held in memory at a time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.compression = None
+        self._file = open(path, "rb")
+        # Memory map of the file, None for compressed files
+        self.map = None
+        self._stream = None
+
+        magic = self._file.read(7)
+        self._file.seek(0)
+
+        if magic.startswith(_GZIP_MAGIC):
+            self.compression = "gzip"
+            self._file.close()
+            self._file = gzip.open(path, "rb")
+            self._stream = self._file
+        elif magic.startswith(_ZSTD_MAGIC):
+            self.compression = "zstd"
+            self._file.close()
+            self._file = _open_zstd(path)
+            self._stream = self._file
+        else:
+            self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.map is not None:
+            header_data = self.map[: _LEGACY_HEADER_SIZE + 5]
+        else:
+            header_data = _read_exactly(self._stream, _LEGACY_HEADER_SIZE)
+            if header_data[7:9].isdigit():
+                header_data += _read_exactly(
+                    self._stream, int(header_data[7:9]) - _LEGACY_HEADER_SIZE
+                )
+
+        self.header = parse_header(header_data)
+        self._bhead, self._bhead_order = _bhead_struct(self.header)
+        self._consumed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self._file.close()
+
+    def pack_bhead(self, record, old_pointer=None):
+        """Packs the BHead of 'record', optionally with another old pointer"""
+        if old_pointer is None:
+            old_pointer = record.old_pointer
+
+        values = [None] * 5
+        fields = (record.code, record.size, old_pointer, record.sdna_index, record.count)
+        for field, index in zip(fields, self._bhead_order):
+            values[index] = field
+
+        return self._bhead.pack(*values)
+
+    def _make_record(self, values, offset):
+        code, size, old_pointer, sdna_index, count = (
+            values[i] for i in self._bhead_order
+        )
+        return BlockRecord(
+            code, size, old_pointer, sdna_index, count, offset, self._bhead.size
+        )
+
+    def _iter_mapped(self):
+        view = memoryview(self.map)
+        position = self.header.size
+        try:
+            while position + self._bhead.size <= len(self.map):
+                values = self._bhead.unpack_from(self.map, position)
+                data_offset = position + self._bhead.size
+                record = self._make_record(values, data_offset)
+
+                yield record, view[data_offset : data_offset + record.size]
+
+                if record.code == ENDB_CODE:
+                    return
+                position = data_offset + record.size
+        finally:
+            view.release()
+
+    def _iter_stream(self):
+        # A stream can only be walked once, from right after the header
+        if self._consumed:
+            raise ValueError("Compressed .blend files can only be iterated once")
+        self._consumed = True
+
+        position = self.header.size
+        while True:
+            bhead = _read_exactly(self._stream, self._bhead.size)
+            if len(bhead) < self._bhead.size:
+                return
+
+            data_offset = position + self._bhead.size
+            record = self._make_record(self._bhead.unpack(bhead), data_offset)
+
+            data = _read_exactly(self._stream, record.size)
+            if len(data) < record.size:
+                raise ValueError(f"Truncated block in '{self.path}'")
+
+            yield record, data
+
+            if record.code == ENDB_CODE:
+                return
+            position = data_offset + record.size
+
+    def iter_blocks(self):
+        """Yields (BlockRecord, data) for every file block, in file order"""
+        if self.map is not None:
+            return self._iter_mapped()
+        return self._iter_stream()
+
+
+_ARRAY_DIMENSIONS = re.compile(r"\[(\d+)\]")
+
+
+def _field_length(name, type_size, pointer_size):
+    is_pointer = name.startswith("*") or name.startswith("(*")
+    length = pointer_size if is_pointer else type_size
+
+    # Function pointers like '(*func)()' are single pointers
+    if not name.startswith("(*"):
+        for dimension in _ARRAY_DIMENSIONS.findall(name):
+            length *= int(dimension)
+
+    return length, is_pointer
+
+
+def parse_sdna(data, header):
+    """
+    Parses the DNA1 block, describing every struct stored in the file.
+    Returns a list of SdnaStruct indexed like BlockRecord.sdna_index.
+    """
+    data = bytes(data)
+    byte_order = "<" if header.is_little_endian else ">"
+    position = 0
+
+    def expect(tag):
+        nonlocal position
+        position = (position + 3) & ~3
+        if data[position : position + 4] != tag:
+            raise ValueError(f"Malformed SDNA, expected {tag!r}")
+        position += 4
+
+    def read_int(fmt):
+        nonlocal position
+        value = struct.unpack_from(byte_order + fmt, data, position)[0]
+        position += struct.calcsize(fmt)
+        return value
+
+    def read_strings(count):
+        nonlocal position
+        strings = []
+        for _ in range(count):
+            end = data.index(b"\0", position)
+            strings.append(data[position:end].decode("utf-8", "replace"))
+            position = end + 1
+        return strings
+
+    expect(b"SDNA")
+    expect(b"NAME")
+    names = read_strings(read_int("i"))
+    expect(b"TYPE")
+    types = read_strings(read_int("i"))
+    expect(b"TLEN")
+    type_sizes = [read_int("h") for _ in types]
+    expect(b"STRC")
+
+    structs = []
+    for _ in range(read_int("i")):
+        type_index = read_int("h")
+        fields = []
+        offset = 0
+        for _ in range(read_int("h")):
+            field_type = read_int("h")
+            field_name = names[read_int("h")]
+            size, is_pointer = _field_length(
+                field_name, type_sizes[field_type], header.pointer_size
+            )
+            fields.append(
+                SdnaField(types[field_type], field_name, offset, size, is_pointer)
+            )
+            offset += size
+        structs.append(SdnaStruct(types[type_index], type_sizes[type_index], fields))
+
+    return structs
@@ -0,0 +1,193 @@
+import hashlib
+import struct
+
+from . import blendfile
+
+
+# Blocks without pointers worth normalizing: the SDNA itself, the end marker,
+# the thumbnail and the render info
+_SKIPPED_CODES = {blendfile.DNA1_CODE, blendfile.ENDB_CODE, b"TEST", b"REND"}
+
+# Both BHead layouts keep the old pointer right after the first two ints
+_BHEAD_OLD_POINTER_OFFSET = 8
+
+_POINTER_OFFSET = struct.Struct(">Q")
+
+
+def _pointer_offsets(sdna_struct, pointer_size):
+    """Offsets of every pointer slot inside one element of 'sdna_struct'"""
+    offsets = []
+    for field in sdna_struct.fields:
+        if field.is_pointer:
+            offsets.extend(range(field.offset, field.offset + field.size, pointer_size))
+    return tuple(offsets)
+
+
+class NormalizedBlend:
+    """
+    Presents an uncompressed .blend file with every pointer value zeroed:
+    the old pointers of the BHeads and the pointer fields of SDNA structs.
+    Those addresses change on every save even when the data doesn't, so the
+    normalized form of unchanged datablocks stays byte-identical between saves.
+
+    The zeroed values are written, in file order, to 'write_pointers' as
+    (offset delta, original bytes) entries that PointerPatcher puts back.
+    Raises ValueError for files it can't normalize (compressed, not a .blend).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._blend = blendfile.BlendFile(path)
+
+        try:
+            if self._blend.compression:
+                raise ValueError("Compressed .blend files can't be normalized")
+            self._read_structure()
+        except BaseException:
+            self._blend.close()
+            raise
+
+        self.pointer_size = self._blend.header.pointer_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._blend.close()
+
+    def _read_structure(self):
+        """
+        Finds the SDNA (stored at the end of the file) and checks that every
+        BHead packs back to the exact same bytes, so normalizing is reversible.
+        """
+        blend = self._blend
+        file_map = blend.map
+
+        self.sdna = None
+        self.end = blend.header.size
+        for record, data in blend.iter_blocks():
+            header_offset = record.offset - record.header_size
+            if blend.pack_bhead(record) != file_map[header_offset : record.offset]:
+                raise ValueError("Unexpected BHead layout")
+            if record.code == blendfile.DNA1_CODE:
+                self.sdna = blendfile.parse_sdna(data, blend.header)
+            self.end = record.offset + record.size
+
+        if self.sdna is None:
+            raise ValueError("The .blend file has no SDNA")
+
+        self.digest = hashlib.sha256(file_map).hexdigest()
+        self.size = len(file_map)
+
+    def iter_pieces(self, write_pointers):
+        """
+        Yields (bhead, data) for each block of the normalized file. The file
+        header comes first with no data, trailing bytes last with no bhead.
+        """
+        blend = self._blend
+        pointer_size = self.pointer_size
+        null_pointer = bytes(pointer_size)
+        offsets_by_struct = {}
+        entries = bytearray()
+        last_offset = 0
+
+        def record_pointer(offset, value):
+            nonlocal last_offset
+            entries.extend(_POINTER_OFFSET.pack(offset - last_offset))
+            entries.extend(value)
+            last_offset = offset
+
+        yield blend.map[: blend.header.size], b""
+
+        for record, data in blend.iter_blocks():
+            bhead = blend.pack_bhead(record, old_pointer=0)
+            if record.old_pointer:
+                start = record.offset - record.header_size + _BHEAD_OLD_POINTER_OFFSET
+                record_pointer(start, blend.map[start : start + pointer_size])
+
+            if record.code not in _SKIPPED_CODES and 0 < record.sdna_index < len(
+                self.sdna
+            ):
+                sdna_struct = self.sdna[record.sdna_index]
+                offsets = offsets_by_struct.get(record.sdna_index)
+                if offsets is None:
+                    offsets = _pointer_offsets(sdna_struct, pointer_size)
+                    offsets_by_struct[record.sdna_index] = offsets
+
+                # Blocks that aren't a plain array of their struct are left alone
+                if offsets and record.size == sdna_struct.size * record.count:
+                    normalized = None
+                    for element in range(0, record.size, sdna_struct.size):
+                        for pointer_offset in offsets:
+                            start = element + pointer_offset
+                            value = data[start : start + pointer_size]
+                            if value == null_pointer:
+                                continue
+                            if normalized is None:
+                                normalized = bytearray(data)
+                            normalized[start : start + pointer_size] = null_pointer
+                            record_pointer(record.offset + start, value)
+                    if normalized is not None:
+                        data = normalized
+
+            if entries:
+                write_pointers(bytes(entries))
+                entries.clear()
+
+            yield bhead, data
+
+        if self.end < self.size:
+            yield b"", blend.map[self.end :]
+
+
+class PointerPatcher:
+    """
+    File-like wrapper putting pointer values back into a normalized stream
+    while it's written to 'destination'. 'table' is read sequentially.
+    """
+
+    def __init__(self, destination, table, pointer_size):
+        self._destination = destination
+        self._pointer_size = pointer_size
+        self._position = 0
+        self._pending = bytearray()
+        self._entries = self._iter_entries(table)
+        self._next = next(self._entries, None)
+
+    def _iter_entries(self, table):
+        entry = struct.Struct(f"{_POINTER_OFFSET.format}{self._pointer_size}s")
+        offset = 0
+        while True:
+            data = table.read(entry.size * 4096)
+            if not data:
+                return
+            if len(data) % entry.size:
+                raise ValueError("Truncated pointer table")
+
+            for delta, value in entry.iter_unpack(data):
+                offset += delta
+                yield offset, value
+
+    def write(self, data):
+        self._pending += data
+        end = self._position + len(self._pending)
+        pointer_size = self._pointer_size
+
+        while self._next and self._next[0] + pointer_size <= end:
+            offset, value = self._next
+            start = offset - self._position
+            self._pending[start : start + pointer_size] = value
+            self._next = next(self._entries, None)
+
+        # Hold back a pointer split across two writes until it's complete
+        flushed = len(self._pending)
+        if self._next and self._next[0] < end:
+            flushed = self._next[0] - self._position
+
+        self._destination.write(self._pending[:flushed])
+        del self._pending[:flushed]
+        self._position += flushed
+
+    def close(self):
+        if self._pending or self._next:
+            raise ValueError("Pointer table doesn't match the restored file")
@@ -0,0 +1,79 @@
+import zlib
+
+
+# Boundaries are only evaluated where the anchor byte occurs, which keeps the
+# scan inside C-level bytes.find calls. At each candidate position the hash of
+# the preceding window decides the cut, so boundaries move with the content
+# instead of with the offset (an insertion only changes the chunks around it).
+_ANCHOR_BYTE = 0x9D
+_WINDOW_SIZE = 48
+
+READ_SIZE = 4 * 1024 * 1024
+
+
+class Chunker:
+    """
+    Incremental content-defined chunker.
+    Feed data with 'update' and collect the remaining chunk with 'finish'.
+    """
+
+    def __init__(self, min_size, max_size, boundary_mask):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.boundary_mask = boundary_mask
+        self._buffer = bytearray()
+
+    def _find_boundary(self, start, is_eof):
+        buffer = self._buffer
+        available = len(buffer) - start
+        if available <= self.min_size:
+            return len(buffer) if is_eof and available else None
+
+        end = min(len(buffer), start + self.max_size)
+        view = memoryview(buffer)
+
+        position = buffer.find(_ANCHOR_BYTE, start + self.min_size, end)
+        while position != -1:
+            window = view[position - _WINDOW_SIZE + 1 : position + 1]
+            if not zlib.crc32(window) & self.boundary_mask:
+                return position + 1
+            position = buffer.find(_ANCHOR_BYTE, position + 1, end)
+
+        if end == start + self.max_size or is_eof:
+            return end
+
+        return None
+
+    def _cut(self, is_eof):
+        chunks = []
+        start = 0
+        while True:
+            cut = self._find_boundary(start, is_eof)
+            if cut is None or cut == start:
+                break
+            chunks.append(bytes(self._buffer[start:cut]))
+            start = cut
+
+        del self._buffer[:start]
+        return chunks
+
+    def update(self, data):
+        """Returns the chunks completed by 'data'"""
+        self._buffer += data
+        return self._cut(False)
+
+    def finish(self):
+        return self._cut(True)
+
+
+def iter_chunks(file, min_size, max_size, boundary_mask):
+    """Splits a binary file object into content-defined chunks"""
+    chunker = Chunker(min_size, max_size, boundary_mask)
+
+    while True:
+        data = file.read(READ_SIZE)
+        if not data:
+            break
+        yield from chunker.update(data)
+
+    yield from chunker.finish()
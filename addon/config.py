@@ -1,7 +1,10 @@
+import contextlib
 import os
 import json
 import textwrap
 
+from . import locking, metadata
+
 
 class PATHS_KEYS:
     ROOT_FOLDER = ".checkpoints"
@@ -11,6 +14,20 @@ class PATHS_KEYS:
 
     ORIGINAL_TL_FILE = "Original.json"
     PERSISTED_STATE_FILE = "_persisted_state.json"
+    REFS_FILE = "_refs.json"
+    METADATA_FILE = "metadata.db"
+    LOCK_FILE = "_lock"
+    STORE_LOCK_FILE = "_store_lock"
+
+
+# Checkpoint dates as displayed, e.g. Fri Sep  2 19:36:07 2022 +0530.
+# Checkpoints also store a "timestamp" (seconds since the epoch), parsing
+# this one is slow and depends on the locale
+CP_TIME_FORMAT = "%c %z"
+
+# Seconds to wait for another instance storing a checkpoint, a large file
+# can take minutes
+STORE_LOCK_TIMEOUT = 30 * 60.0
 
 
 # Singleton for storing global state
@@ -21,7 +38,30 @@ class _CheckpointState:
 
     # def __init__(self):
     #     self.placeholder = placeholder_value
-    pass
+
+    # Background jobs of the addon, see utils.submit_job. Created when the
+    # addon is registered, importing it starts no threads
+    scheduler = None
+
+    # Whether the working file differs from its active checkpoint, cleared
+    # whenever the file or the state changes, see utils.check_is_modified
+    modified_cache = None
+    # Content digests by (path, size, mtime_ns) of the working file, and by
+    # checkpoint id (checkpoints never change), see utils.remember_file_digest
+    file_digests = {}
+    checkpoint_digests = {}
+
+    # Increased on every write to a project's state or timelines, tells the
+    # project model (see model.get_project) to reload
+    generation = 0
+    project = None
+    # (model, version) the checkpoints list was last filled from
+    list_version = None
+
+    # Timeline names and selector items, see utils.get_timeline_catalogue
+    timeline_catalogue = None
+    # Descriptions of every timeline, see utils.get_search_index
+    search_index = None
 
 
 # One state to rule them all (otherwise known as a singleton)
@@ -40,7 +80,25 @@ def multiline_label(context, text, parent, icon="NONE"):
         parent.label(text=text_line)
 
 
+# Project paths by project folder, see get_paths
+_paths_by_folder = {}
+
+# States read, by project folder: (stamp of the files read, state)
+_states = {}
+
+
 def get_paths(filepath):
+    """
+    Paths of the addon's files for the project in 'filepath'. Computed once
+    per project, the dict returned is shared and must not be modified.
+    """
+    paths = _paths_by_folder.get(filepath)
+    if paths is None:
+        paths = _paths_by_folder[filepath] = _build_paths(filepath)
+    return paths
+
+
+def _build_paths(filepath):
     _root_folder_path = os.path.join(
         filepath, PATHS_KEYS.ROOT_FOLDER)
 
@@ -56,37 +114,166 @@ def get_paths(filepath):
     _persisted_state_path = os.path.join(
         _root_folder_path, PATHS_KEYS.PERSISTED_STATE_FILE)
 
+    _refs_path = os.path.join(
+        _root_folder_path, PATHS_KEYS.REFS_FILE)
+
+    _metadata_path = os.path.join(
+        _root_folder_path, PATHS_KEYS.METADATA_FILE)
+
+    _lock_path = os.path.join(
+        _root_folder_path, PATHS_KEYS.LOCK_FILE)
+
+    _store_lock_path = os.path.join(
+        _root_folder_path, PATHS_KEYS.STORE_LOCK_FILE)
+
     return {
         PATHS_KEYS.ROOT_FOLDER: _root_folder_path,
         PATHS_KEYS.TIMELINES_FOLDER: _timelines_folder_path,
         PATHS_KEYS.CHECKPOINTS_FOLDER: _saves_folder_path,
         PATHS_KEYS.OBJECTS_FOLDER: _objects_folder_path,
-        PATHS_KEYS.PERSISTED_STATE_FILE: _persisted_state_path
+        PATHS_KEYS.PERSISTED_STATE_FILE: _persisted_state_path,
+        PATHS_KEYS.REFS_FILE: _refs_path,
+        PATHS_KEYS.METADATA_FILE: _metadata_path,
+        PATHS_KEYS.LOCK_FILE: _lock_path,
+        PATHS_KEYS.STORE_LOCK_FILE: _store_lock_path
     }
 
 
+def read_lock(filepath):
+    """
+    Shares the project's metadata with other readers, in this Blender and
+    others (see locking). Raises locking.LockTimeout if a writer keeps it.
+    """
+    return locking.reading(get_paths(filepath)[PATHS_KEYS.LOCK_FILE])
+
+
+def write_lock(filepath):
+    """Holds the project's metadata alone, see read_lock"""
+    return locking.writing(get_paths(filepath)[PATHS_KEYS.LOCK_FILE])
+
+
+def store_lock(filepath):
+    """
+    Held while checkpoints are stored or their objects freed, by any Blender
+    instance, see store. Separate from the metadata lock: saves are long.
+    """
+    return locking.writing(
+        get_paths(filepath)[PATHS_KEYS.STORE_LOCK_FILE], timeout=STORE_LOCK_TIMEOUT
+    )
+
+
+def get_lock_stats(filepath):
+    """locking.LockStats of the project, for this Blender instance"""
+    return locking.get_stats(get_paths(filepath)[PATHS_KEYS.LOCK_FILE])
+
+
+def uses_database(filepath):
+    """Whether the project's state and timelines are in SQLite, see metadata"""
+    _paths = get_paths(filepath)
+    return os.path.exists(_paths[PATHS_KEYS.METADATA_FILE])
+
+
+def _get_state_stamp(_paths):
+    """(st_mtime_ns, st_size) of the files the state may be read from"""
+    _metadata = _paths[PATHS_KEYS.METADATA_FILE]
+    files = (_metadata, f"{_metadata}-wal", _paths[PATHS_KEYS.PERSISTED_STATE_FILE])
+
+    stamp = []
+    for path in files:
+        try:
+            stat = os.stat(path)
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
 def get_state(filepath):
+    """
+    Reads the state, or returns the one last read if its files haven't
+    changed since. Each call returns its own copy.
+    """
     _paths = get_paths(
         filepath)
 
-    with open(_paths[PATHS_KEYS.PERSISTED_STATE_FILE]) as f:
-        state = json.load(f)
-        return state
+    stamp = _get_state_stamp(_paths)
+    cached = _states.get(filepath)
+    if cached and cached[0] == stamp:
+        return dict(cached[1])
+
+    with read_lock(filepath):
+        # Same test as uses_database, without another stat
+        if stamp[0] is not None:
+            state = metadata.get_state(_paths[PATHS_KEYS.METADATA_FILE])
+        else:
+            with open(_paths[PATHS_KEYS.PERSISTED_STATE_FILE]) as f:
+                state = json.load(f)
+
+    _states[filepath] = (stamp, state)
+    return dict(state)
+
+
+def invalidate_state(filepath):
+    """Forgets the state read, for writes the stamps could miss"""
+    _states.pop(filepath, None)
 
 
 def set_state(filepath, prop, value):
+    with edit_state(filepath) as state:
+        if prop not in state:
+            raise ValueError(f"Property '{prop}' not found in state")
+        state[prop] = value
+
+
+@contextlib.contextmanager
+def edit_state(filepath, fsync=False):
+    """
+    Yields the state for changes, saved all at once when the block exits
+    without an exception: one read and one write whatever the number of
+    properties changed. Only existing properties can be set.
+
+    The file is replaced whole, never left half written. 'fsync' also
+    makes the change durable before returning. Other instances wait for
+    the edit to finish, see write_lock.
+    """
     _paths = get_paths(filepath)
-    with open(_paths[PATHS_KEYS.PERSISTED_STATE_FILE], 'r+') as f:
-        state = json.load(f)
+    with write_lock(filepath):
+        state = get_state(filepath)
+        previous = dict(state)
+        yield state
+
+        unknown = state.keys() - previous.keys()
+        if unknown:
+            raise ValueError(f"Property '{unknown.pop()}' not found in state")
+
+        changes = {k: v for k, v in state.items() if previous.get(k) != v}
+        if not changes:
+            return
 
-        if prop in state:
-            state[prop] = value
+        if uses_database(filepath):
+            metadata.update_state(_paths[PATHS_KEYS.METADATA_FILE], changes)
         else:
-            raise ValueError(f"Property '{prop}' not found in state")
+            _write_state(_paths[PATHS_KEYS.PERSISTED_STATE_FILE], state, fsync)
+
+    invalidate_state(filepath)
+    if cp_state.modified_cache is not None:
+        cp_state.modified_cache["stale"] = True
+    bump_generation()
+
 
-        f.seek(0)
+def _write_state(path, state, fsync):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
         json.dump(state, f, indent=4)
-        f.truncate()
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def bump_generation():
+    """To call after writing to the state or the timelines"""
+    cp_state.generation += 1
 
 
 def has_root_folder(filepath):
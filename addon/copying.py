@@ -0,0 +1,171 @@
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+
+# Linux ioctl sharing the extents of one file with another (btrfs, XFS, ...)
+_FICLONE = 0x40049409
+
+_CHUNK_SIZE = 8 * 1024 * 1024
+_BENCHMARK_SIZE = 8 * 1024 * 1024
+
+# Errors meaning a strategy can't be used for these two files
+_UNSUPPORTED_ERRORS = {
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTSUP,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EBADF,
+    errno.EPERM,
+}
+
+# Best strategy order found for each device, see 'detect_strategies'
+_strategies_by_device = {}
+
+
+def _copy_reflink(source, destination, size):
+    import fcntl
+
+    fcntl.ioctl(destination.fileno(), _FICLONE, source.fileno())
+
+
+def _copy_file_range(source, destination, size):
+    copied = 0
+    while copied < size:
+        sent = os.copy_file_range(source.fileno(), destination.fileno(), size - copied)
+        if not sent:
+            break
+        copied += sent
+
+
+def _copy_sendfile(source, destination, size):
+    copied = 0
+    while copied < size:
+        sent = os.sendfile(destination.fileno(), source.fileno(), copied, size - copied)
+        if not sent:
+            break
+        copied += sent
+
+
+def _copy_chunked(source, destination, size):
+    shutil.copyfileobj(source, destination, _CHUNK_SIZE)
+
+
+# Strategy name: copy function, fastest kinds first
+STRATEGIES = {
+    "reflink": _copy_reflink,
+    "copy_file_range": _copy_file_range,
+    "sendfile": _copy_sendfile,
+    "chunked": _copy_chunked,
+}
+
+
+def get_available_strategies():
+    """Strategies this platform implements, before trying them on a filesystem"""
+    # FICLONE is Linux only, like copy_file_range and file to file sendfile
+    if not sys.platform.startswith("linux"):
+        return ["chunked"]
+
+    return [
+        strategy
+        for strategy in STRATEGIES
+        if strategy != "copy_file_range" or hasattr(os, "copy_file_range")
+    ]
+
+
+def _copy_with(strategy, source, destination):
+    """Copies between two open files, rewinding them if the strategy fails"""
+    size = os.fstat(source.fileno()).st_size
+    try:
+        STRATEGIES[strategy](source, destination, size)
+        destination.flush()
+        if os.fstat(destination.fileno()).st_size != size:
+            raise OSError(errno.EIO, "Incomplete copy")
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED_ERRORS:
+            raise
+        source.seek(0)
+        destination.seek(0)
+        destination.truncate()
+        return False
+
+    return True
+
+
+def _benchmark(folder, strategies):
+    """Returns 'strategies' that work in 'folder', fastest first"""
+    timings = []
+    with tempfile.NamedTemporaryFile(dir=folder, suffix=".tmp") as source:
+        source.write(os.urandom(_BENCHMARK_SIZE))
+        source.flush()
+
+        for strategy in strategies:
+            source.seek(0)
+            with tempfile.TemporaryFile(dir=folder) as destination:
+                start = time.perf_counter()
+                if _copy_with(strategy, source, destination):
+                    timings.append((time.perf_counter() - start, strategy))
+
+    # Reflinks are near instant and take no space, whatever the benchmark says
+    def rank(timing):
+        seconds, strategy = timing
+        return strategy != "reflink", seconds
+
+    ranked = [strategy for _, strategy in sorted(timings, key=rank)]
+    # The chunked copy always works, kept as the last resort if it failed here
+    if "chunked" not in ranked:
+        ranked.append("chunked")
+    return ranked
+
+
+def detect_strategies(folder):
+    """
+    Tries every copy strategy on the filesystem of 'folder', once per device.
+    Returns the working strategy names, best first.
+    """
+    device = os.stat(folder).st_dev
+    strategies = _strategies_by_device.get(device)
+    if strategies is None:
+        strategies = _benchmark(folder, get_available_strategies())
+        _strategies_by_device[device] = strategies
+
+    return strategies
+
+
+def supports_reflink(folder):
+    return detect_strategies(folder)[0] == "reflink"
+
+
+def copy_file(source_file, destination_file, strategy=None):
+    """
+    Copies 'source_file' to 'destination_file' with the best strategy for the
+    destination's filesystem, or with 'strategy' first if given. Strategies
+    that fail for these files (e.g. reflinks across filesystems) fall back to
+    the next one. Returns the name of the strategy used.
+    """
+    folder = os.path.dirname(os.path.abspath(destination_file))
+    strategies = detect_strategies(folder)
+    if strategy:
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown copy strategy '{strategy}'")
+        strategies = [strategy] + [s for s in strategies if s != strategy]
+
+    used = "chunked"
+    with open(source_file, "rb") as source, open(destination_file, "wb") as destination:
+        for candidate in strategies:
+            if candidate == "chunked":
+                break
+            if _copy_with(candidate, source, destination):
+                used = candidate
+                break
+
+        if used == "chunked":
+            _copy_chunked(source, destination, 0)
+
+    shutil.copymode(source_file, destination_file)
+    return used
@@ -0,0 +1,159 @@
+import hashlib
+import struct
+
+from . import chunking
+
+
+# rsync looks a block up at every byte offset and needs a cheap weak checksum
+# to make that affordable. Here the blocks are cut at content-defined
+# boundaries instead (the rolling window hash of 'chunking'), so both files
+# agree on where blocks start and a single strong digest per block is enough.
+BLOCK_MIN_SIZE = 2 * 1024
+BLOCK_MAX_SIZE = 64 * 1024
+BLOCK_BOUNDARY_MASK = 0x1F
+
+_SIGNATURE_ENTRY = struct.Struct(">16sI")
+
+_COPY_OP = b"C"
+_COPY_ARGS = struct.Struct(">QI")
+_LITERAL_OP = b"L"
+_LITERAL_ARGS = struct.Struct(">I")
+
+_COPY_SIZE = 1024 * 1024
+
+
+def _new_chunker():
+    return chunking.Chunker(BLOCK_MIN_SIZE, BLOCK_MAX_SIZE, BLOCK_BOUNDARY_MASK)
+
+
+def _block_digest(block):
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+
+class SignatureBuilder:
+    """Computes the block signature of a file fed through 'update'"""
+
+    def __init__(self):
+        self._chunker = _new_chunker()
+        self._signature = bytearray()
+
+    def _add_blocks(self, blocks):
+        for block in blocks:
+            self._signature += _SIGNATURE_ENTRY.pack(_block_digest(block), len(block))
+
+    def update(self, data):
+        self._add_blocks(self._chunker.update(data))
+
+    def cut(self):
+        """Forces a block boundary at the current position"""
+        self._add_blocks(self._chunker.finish())
+
+    def finish(self):
+        self.cut()
+        return bytes(self._signature)
+
+
+def parse_signature(signature):
+    """Maps the block digests of a signature to their offset in the file"""
+    offsets = {}
+    offset = 0
+    for digest, length in _SIGNATURE_ENTRY.iter_unpack(signature):
+        offsets.setdefault(digest, offset)
+        offset += length
+
+    return offsets
+
+
+class DeltaEncoder:
+    """
+    Encodes the file fed through 'update' as copy/literal operations against a
+    base file, given the base's signature. Operations are passed to 'write' as
+    they are produced, and the new file's own signature is built on the way.
+    """
+
+    def __init__(self, base_signature, write):
+        self._base_offsets = parse_signature(base_signature)
+        self._write = write
+        self._chunker = _new_chunker()
+        self._signature = bytearray()
+        self._pending_copy = None
+
+        self.size = 0
+        self.literal_size = 0
+
+    def _flush_copy(self):
+        if self._pending_copy:
+            self._write(_COPY_OP + _COPY_ARGS.pack(*self._pending_copy))
+            self._pending_copy = None
+
+    def _add_blocks(self, blocks):
+        for block in blocks:
+            digest = _block_digest(block)
+            self._signature += _SIGNATURE_ENTRY.pack(digest, len(block))
+            self.size += len(block)
+
+            base_offset = self._base_offsets.get(digest)
+            if base_offset is None:
+                self._flush_copy()
+                self._write(_LITERAL_OP + _LITERAL_ARGS.pack(len(block)))
+                self._write(block)
+                self.literal_size += len(block)
+                continue
+
+            # Extend the previous copy when blocks follow each other in the base
+            pending = self._pending_copy
+            if pending and pending[0] + pending[1] == base_offset:
+                pending[1] += len(block)
+            else:
+                self._flush_copy()
+                self._pending_copy = [base_offset, len(block)]
+
+    def update(self, data):
+        self._add_blocks(self._chunker.update(data))
+
+    def cut(self):
+        """Forces a block boundary, the base must have been cut the same way"""
+        self._add_blocks(self._chunker.finish())
+
+    def finish(self):
+        """Returns the signature of the encoded file"""
+        self.cut()
+        self._flush_copy()
+        return bytes(self._signature)
+
+
+def _read_exactly(file, size):
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated delta")
+    return data
+
+
+def _copy_bytes(source, destination, size):
+    while size:
+        data = _read_exactly(source, min(size, _COPY_SIZE))
+        destination.write(data)
+        size -= len(data)
+
+
+def apply_delta(base_file, delta_file, destination):
+    """
+    Rebuilds a file from its base and delta, streaming into 'destination'.
+    'base_file' must be seekable, 'delta_file' only needs 'read'.
+    """
+    while True:
+        op = delta_file.read(1)
+        if not op:
+            break
+
+        if op == _COPY_OP:
+            offset, length = _COPY_ARGS.unpack(_read_exactly(delta_file, _COPY_ARGS.size))
+            base_file.seek(offset)
+            _copy_bytes(base_file, destination, length)
+        elif op == _LITERAL_OP:
+            (length,) = _LITERAL_ARGS.unpack(
+                _read_exactly(delta_file, _LITERAL_ARGS.size)
+            )
+            _copy_bytes(delta_file, destination, length)
+        else:
+            raise ValueError(f"Unknown delta operation {op!r}")
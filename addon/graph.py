@@ -0,0 +1,284 @@
+# Checkpoint records linked to their parent, the checkpoint before them in
+# their timeline. A timeline is just a head record: walking the parents from
+# it gives its history, newest first, and a timeline branching off another
+# shares every record up to the branch point.
+#
+# Records are never changed once added. Editing or deleting a checkpoint
+# adds an overlay instead: overlays are linked to the previous one of their
+# timeline, and each holds the edit or delete event (see history) of one
+# record. A timeline is a head record and its last overlay (see View), so
+# timelines sharing records keep their own descriptions and deletions.
+#
+# Each record also keeps its ancestors 1, 2, 4, ... generations up, which
+# finds the n-th ancestor, or whether a record is an ancestor of another, in
+# O(log depth) steps.
+
+
+class Record:
+    __slots__ = ("key", "parent", "checkpoint", "depth", "jumps")
+
+    def __init__(self, key, parent, checkpoint, depth, jumps):
+        self.key = key
+        self.parent = parent
+        self.checkpoint = checkpoint
+        self.depth = depth
+        self.jumps = jumps
+
+
+class Overlay:
+    __slots__ = ("key", "parent", "record", "event")
+
+    def __init__(self, key, parent, record, event):
+        self.key = key
+        self.parent = parent
+        self.record = record
+        self.event = event
+
+
+def content_key(parent, checkpoint):
+    """Records with the same key can be shared instead of added again"""
+    return (parent, tuple(sorted(checkpoint.items())))
+
+
+class Graph:
+    def __init__(self):
+        self.records = {}
+        self.overlays = {}
+        self._by_checkpoint = {}
+        self._by_content = {}
+        # Checkpoints with more than one record, e.g. branched without history
+        self._copied = set()
+
+    def __len__(self):
+        return len(self.records) + len(self.overlays)
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def add(self, key, parent, checkpoint):
+        """Adds a record, its parent has to be there already"""
+        if parent is None:
+            depth = 0
+            jumps = ()
+        else:
+            if parent not in self.records:
+                raise ValueError(f"Record '{key}' has an unknown parent '{parent}'")
+            depth = self.records[parent].depth + 1
+            jumps = [parent]
+            while True:
+                above = self.records[jumps[-1]].jumps
+                if len(jumps) > len(above):
+                    break
+                jumps.append(above[len(jumps) - 1])
+            jumps = tuple(jumps)
+
+        record = Record(key, parent, checkpoint, depth, jumps)
+        self.records[key] = record
+        keys = self._by_checkpoint.setdefault(checkpoint["id"], [])
+        keys.append(key)
+        if len(keys) > 1:
+            self._copied.add(checkpoint["id"])
+        self._by_content.setdefault(content_key(parent, checkpoint), key)
+        return record
+
+    def add_overlay(self, key, parent, record, event):
+        """Adds an overlay changing 'record', its parent has to be there already"""
+        if parent is not None and parent not in self.overlays:
+            raise ValueError(f"Overlay '{key}' has an unknown parent '{parent}'")
+        if record not in self.records:
+            raise ValueError(f"Overlay '{key}' changes an unknown record '{record}'")
+        overlay = self.overlays[key] = Overlay(key, parent, record, event)
+        return overlay
+
+    def walk_overlays(self, key):
+        """Overlays from 'key' back to the first one, newest first"""
+        while key is not None:
+            overlay = self.overlays[key]
+            yield overlay
+            key = overlay.parent
+
+    def find(self, parent, checkpoint):
+        """The key of a record with this parent and content, None if none"""
+        return self._by_content.get(content_key(parent, checkpoint))
+
+    def walk(self, key, start=0):
+        """Records from the 'start'-th ancestor of 'key' up to the root"""
+        if key is None:
+            return
+        key = self.ancestor(key, start)
+        while key is not None:
+            record = self.records[key]
+            yield record
+            key = record.parent
+
+    def ancestor(self, key, generations):
+        """The ancestor 'generations' up from 'key', None past the root"""
+        if generations > self.records[key].depth:
+            return None
+
+        level = 0
+        while generations:
+            if generations & 1:
+                key = self.records[key].jumps[level]
+            generations >>= 1
+            level += 1
+        return key
+
+    def is_ancestor(self, key, descendant):
+        """Whether 'key' is 'descendant' or one of its ancestors"""
+        generations = self.records[descendant].depth - self.records[key].depth
+        return generations >= 0 and self.ancestor(descendant, generations) == key
+
+    def find_checkpoint(self, head, checkpoint_id, hidden=()):
+        """
+        The record of 'checkpoint_id' in the history of 'head', or None.
+        Records in 'hidden' don't count.
+        """
+        if head is None:
+            return None
+        for key in self._by_checkpoint.get(checkpoint_id, ()):
+            if key not in hidden and self.is_ancestor(key, head):
+                return key
+        return None
+
+    def common_ancestor(self, key, other):
+        """The newest record both histories share, None if none"""
+        if key is None or other is None:
+            return None
+
+        depth = min(self.records[key].depth, self.records[other].depth)
+        key = self.ancestor(key, self.records[key].depth - depth)
+        other = self.ancestor(other, self.records[other].depth - depth)
+        if key == other:
+            return key
+
+        for level in reversed(range(len(self.records[key].jumps))):
+            jumps = self.records[key].jumps
+            other_jumps = self.records[other].jumps
+            if level < len(jumps) and jumps[level] != other_jumps[level]:
+                key = jumps[level]
+                other = other_jumps[level]
+
+        parent = self.records[key].parent
+        return parent if parent == self.records[other].parent else None
+
+    def reachable(self, heads):
+        """The keys of every record in the histories of 'heads'"""
+        keys = set()
+        for head in heads:
+            key = head
+            while key is not None and key not in keys:
+                keys.add(key)
+                key = self.records[key].parent
+        return keys
+
+    def reachable_overlays(self, overlays):
+        """The keys of every overlay up to 'overlays'"""
+        keys = set()
+        for key in overlays:
+            while key is not None and key not in keys:
+                keys.add(key)
+                key = self.overlays[key].parent
+        return keys
+
+
+class View:
+    """
+    The history of 'head' as its timeline shows it: the records newest
+    first, without those its overlays deleted and with their descriptions
+    edited. Deletions are expected to be few, they are skipped one by one.
+    """
+
+    def __init__(self, graph, head, overlay):
+        self.graph = graph
+        self.head = head
+        self.descriptions = {}
+        self.hidden = set()
+
+        changed = set()
+        for entry in graph.walk_overlays(overlay):
+            # The newest change of a record wins
+            if entry.record in changed:
+                continue
+            changed.add(entry.record)
+            if entry.event["op"] == "delete":
+                self.hidden.add(entry.record)
+            else:
+                self.descriptions[entry.record] = entry.event["description"]
+
+        # Depths of the deleted records of this history, newest first.
+        # Branches share overlays with changes to records they don't have
+        self._hidden_depths = []
+        if head is not None:
+            self._hidden_depths = sorted(
+                (
+                    graph.records[key].depth
+                    for key in self.hidden
+                    if graph.is_ancestor(key, head)
+                ),
+                reverse=True,
+            )
+
+    def __len__(self):
+        if self.head is None:
+            return 0
+        return self.graph.records[self.head].depth + 1 - len(self._hidden_depths)
+
+    def checkpoint(self, key):
+        """The checkpoint of record 'key', as this timeline has it"""
+        checkpoint = dict(self.graph.records[key].checkpoint)
+        if key in self.descriptions:
+            checkpoint["description"] = self.descriptions[key]
+        return checkpoint
+
+    def record_at(self, index):
+        """The key of the 'index'-th record shown (newest first), or None"""
+        if self.head is None or index < 0:
+            return None
+
+        depth = self.graph.records[self.head].depth - index
+        for hidden_depth in self._hidden_depths:
+            if hidden_depth < depth:
+                break
+            depth -= 1
+        if depth < 0:
+            return None
+        return self.graph.ancestor(self.head, self.graph.records[self.head].depth - depth)
+
+    def walk(self, start=0):
+        """Records shown from the 'start'-th one"""
+        key = self.record_at(start)
+        while key is not None:
+            record = self.graph.records[key]
+            if key not in self.hidden:
+                yield record
+            key = record.parent
+
+    def find(self, checkpoint_id):
+        """The record of 'checkpoint_id' if shown, or None"""
+        return self.graph.find_checkpoint(self.head, checkpoint_id, self.hidden)
+
+    def index_of(self, key):
+        """The index of shown record 'key', newest first"""
+        depth = self.graph.records[key].depth
+        above = sum(1 for d in self._hidden_depths if d > depth)
+        return self.graph.records[self.head].depth - depth - above
+
+    def common_checkpoint(self, other):
+        """
+        The newest record of this history whose checkpoint 'other' shows
+        too, or None. Checkpoints are compared, not records: a checkpoint
+        branched without history has a record of its own.
+        """
+        graph = self.graph
+        key = graph.common_ancestor(self.head, other.head)
+        while key is not None and (key in self.hidden or key in other.hidden):
+            key = graph.records[key].parent
+
+        for checkpoint_id in graph._copied:
+            found = self.find(checkpoint_id)
+            if found is None or other.find(checkpoint_id) is None:
+                continue
+            if key is None or graph.records[found].depth > graph.records[key].depth:
+                key = found
+        return key
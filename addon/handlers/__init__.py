@@ -1,9 +1,15 @@
-from . import post_save
+from .. import utils
+from . import load_post, post_save, relative_dates
 
 
 def register():
     post_save.register()
+    load_post.register()
+    relative_dates.register()
 
 
 def unregister():
+    utils.stop_polling_jobs()
+    relative_dates.unregister()
+    load_post.unregister()
     post_save.unregister()
@@ -0,0 +1,20 @@
+import bpy
+from bpy.app.handlers import persistent
+
+from .. import config, utils
+
+
+@persistent
+def postLoadHandler(_):
+    utils.invalidate_is_modified()
+    # The window manager holding the checkpoints list may be a new one
+    config.cp_state.project = None
+    utils.convert_project_metadata()
+
+
+def register():
+    bpy.app.handlers.load_post.append(postLoadHandler)
+
+
+def unregister():
+    bpy.app.handlers.load_post.remove(postLoadHandler)
@@ -6,6 +6,8 @@ from .. import utils
 
 @persistent
 def postSaveHandler(_):
+    utils.invalidate_is_modified()
+
     prefs = utils.prefs()
     if prefs.shouldDisplayPostSaveDialog and bpy.ops.checkpoint.post_save_dialog.poll():
         bpy.ops.checkpoint.post_save_dialog("INVOKE_DEFAULT")
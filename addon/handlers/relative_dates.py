@@ -0,0 +1,27 @@
+import bpy
+
+from .. import utils
+
+
+# The labels count minutes at the finest
+_REFRESH_INTERVAL = 60
+
+
+def refreshRelativeDates():
+    checkpoints = bpy.context.window_manager.checkpoint.checkpoints
+    if checkpoints:
+        utils.refresh_relative_dates(checkpoints)
+        utils.tag_redraw()
+
+    return _REFRESH_INTERVAL
+
+
+def register():
+    bpy.app.timers.register(
+        refreshRelativeDates, first_interval=_REFRESH_INTERVAL, persistent=True
+    )
+
+
+def unregister():
+    if bpy.app.timers.is_registered(refreshRelativeDates):
+        bpy.app.timers.unregister(refreshRelativeDates)
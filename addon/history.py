@@ -0,0 +1,665 @@
+import functools
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from . import config, graph, metadata
+
+
+# A timeline is a head, '<name>.json' holding {"head": <record key>,
+# "overlay": <overlay key>}, into a graph of checkpoint records shared by
+# every timeline of the project (see graph). Records and overlays are
+# appended to GRAPH_FILE, one JSON object per line:
+#
+#   {"key": ..., "parent": <key or null>, "checkpoint": {...}}
+#   {"key": ..., "parent": <overlay key or null>, "record": ..., "event": {...}}
+#
+# Branching off a timeline only writes a head, adding a checkpoint appends a
+# record and moves the head. Editing or deleting a checkpoint appends an
+# overlay holding the event, whatever the checkpoint's age: the timelines
+# still pointing to the previous overlay don't see it.
+# Lines are appended before the head pointing to them is replaced, so a
+# crash in between leaves unreachable lines, never a broken timeline.
+# Those are dropped when the graph is compacted (see compact_graph).
+#
+# Projects from before the graph have the checkpoints of each timeline in
+# '<name>.json'. They're still read as such, and moved to the graph on the
+# first write (see _migrate).
+#
+# Projects converted to SQLite (see convert_to_database) keep their timelines
+# in the database instead, these functions dispatch to metadata. SQLite
+# coordinates instances itself, JSON timelines are read and written under
+# the project lock (see config.read_lock).
+
+TIMELINE_EXTENSION = ".json"
+GRAPH_FILE = "_graph.jsonl"
+
+# The graph is compacted once it holds this many unreachable records, and
+# at least as many as reachable ones
+_COMPACT_RECORDS = 1024
+
+# Timeline views kept per graph, see _get_view
+_MAX_VIEWS = 16
+
+# Dates of checkpoints without a timestamp parsed at a time, see add_timestamps
+_MAX_PARSED_DATES = 64 * 1024
+
+
+def get_timeline_path(filepath, timeline):
+    _paths = config.get_paths(filepath)
+    return os.path.join(_paths[config.PATHS_KEYS.TIMELINES_FOLDER], timeline)
+
+
+def get_graph_path(filepath):
+    return get_timeline_path(filepath, GRAPH_FILE)
+
+
+def _db_path(filepath):
+    """The project's database, None for JSON projects"""
+    if not config.uses_database(filepath):
+        return None
+    return config.get_paths(filepath)[config.PATHS_KEYS.METADATA_FILE]
+
+
+def list_timelines(filepath):
+    """Timeline names ('<name>.json') of the project"""
+    db_path = _db_path(filepath)
+    if db_path:
+        return metadata.list_timelines(db_path)
+
+    _paths = config.get_paths(filepath)
+    return [
+        name
+        for name in os.listdir(_paths[config.PATHS_KEYS.TIMELINES_FOLDER])
+        if name.endswith(TIMELINE_EXTENSION)
+    ]
+
+
+def has_timeline(filepath, timeline):
+    db_path = _db_path(filepath)
+    if db_path:
+        return metadata.has_timeline(db_path, timeline)
+    return os.path.exists(get_timeline_path(filepath, timeline))
+
+
+def get_timeline_files(filepath, timeline):
+    """The files storing 'timeline', the graph is shared by all of them"""
+    if config.uses_database(filepath):
+        return []
+
+    files = [get_timeline_path(filepath, timeline)]
+    if os.path.exists(get_graph_path(filepath)):
+        files.append(get_graph_path(filepath))
+    return files
+
+
+class _LoadedGraph:
+    def __init__(self):
+        self.graph = graph.Graph()
+        self.inode = None
+        self.offset = 0
+        # Estimate of the records and overlays reachable, see _is_due
+        self.live = 0
+        self.migrated = False
+        # graph.View by (head, overlay), they never change
+        self.views = {}
+
+
+# Graphs by file, read again only from where they were left: records are
+# only ever appended, until compaction replaces the file. Readers share
+# them, everything cached is changed under _graphs_lock.
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def _load_graph(filepath):
+    graph_path = get_graph_path(filepath)
+    with _graphs_lock:
+        loaded = _graphs.get(graph_path)
+        try:
+            f = open(graph_path, "rb")
+        except FileNotFoundError:
+            if loaded is None or loaded.inode is not None:
+                loaded = _graphs[graph_path] = _LoadedGraph()
+            return loaded
+
+        with f:
+            stat = os.fstat(f.fileno())
+            if loaded is None or loaded.inode != stat.st_ino or stat.st_size < loaded.offset:
+                migrated = loaded is not None and loaded.migrated
+                loaded = _graphs[graph_path] = _LoadedGraph()
+                loaded.inode = stat.st_ino
+                loaded.migrated = migrated
+                full = True
+            else:
+                full = False
+
+            f.seek(loaded.offset)
+            data = f.read(stat.st_size - loaded.offset)
+
+        # A last line without its newline is a record being written, or cut
+        # short by a crash: left for next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].split(b"\n"):
+            if line:
+                _add_line(loaded.graph, json.loads(line))
+        loaded.offset += end
+
+        if full:
+            heads = [_read_head(filepath, timeline) for timeline in list_timelines(filepath)]
+            heads = [head for head in heads if isinstance(head, tuple)]
+            loaded.live = len(_get_live(loaded.graph, heads))
+        return loaded
+
+
+def _add_line(_graph, line):
+    if "event" in line:
+        _graph.add_overlay(line["key"], line["parent"], line["record"], line["event"])
+    else:
+        _graph.add(line["key"], line["parent"], line["checkpoint"])
+
+
+def _get_live(_graph, heads):
+    """
+    Keys of the records and overlays the (head, overlay) 'heads' reach. The
+    records overlays change are kept too, a branch may share overlays
+    changing records it doesn't have.
+    """
+    overlays = _graph.reachable_overlays(overlay for _, overlay in heads)
+    records = _graph.reachable(
+        [head for head, _ in heads if head is not None]
+        + [_graph.overlays[key].record for key in overlays]
+    )
+    return records | overlays
+
+
+def _read_head(filepath, timeline):
+    """
+    The (head record, last overlay) keys, or the checkpoint list of a
+    timeline not migrated
+    """
+    with open(get_timeline_path(filepath, timeline)) as f:
+        head = json.load(f)
+    if isinstance(head, list):
+        return head
+    return head["head"], head.get("overlay")
+
+
+def _write_head(filepath, timeline, key, overlay=None):
+    timeline_path = get_timeline_path(filepath, timeline)
+    temp_path = f"{timeline_path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"head": key, "overlay": overlay}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, timeline_path)
+
+
+def _get_view(loaded, head, overlay):
+    """The graph.View of a timeline, shared by the reads until it changes"""
+    with _graphs_lock:
+        view = loaded.views.get((head, overlay))
+        if view is None:
+            if len(loaded.views) >= _MAX_VIEWS:
+                loaded.views.clear()
+            view = loaded.views[head, overlay] = graph.View(loaded.graph, head, overlay)
+        return view
+
+
+def _add_live(loaded, count):
+    """Counts records and overlays just added as reachable, see _is_due"""
+    with _graphs_lock:
+        loaded.live += count
+
+
+def _mark_migrated(loaded):
+    with _graphs_lock:
+        loaded.migrated = True
+
+
+def read_timeline(filepath, timeline, start=0, count=None):
+    """
+    The checkpoints of 'timeline', newest first. 'start' and 'count' read
+    only part of it, without walking the checkpoints before 'start'.
+    """
+    db_path = _db_path(filepath)
+    if db_path:
+        return metadata.read_timeline(db_path, timeline, start, count)
+
+    with config.read_lock(filepath):
+        return _read(filepath, timeline, start, count)
+
+
+def _read(filepath, timeline, start=0, count=None):
+    head = _read_head(filepath, timeline)
+    if isinstance(head, list):
+        return head[start:] if count is None else head[start : start + count]
+
+    view = _get_view(_load_graph(filepath), *head)
+    history = []
+    for record in view.walk(start):
+        if count is not None and len(history) >= count:
+            break
+        history.append(view.checkpoint(record.key))
+    return history
+
+
+def count_checkpoints(filepath, timeline):
+    db_path = _db_path(filepath)
+    if db_path:
+        return metadata.count_checkpoints(db_path, timeline)
+
+    with config.read_lock(filepath):
+        head = _read_head(filepath, timeline)
+        if isinstance(head, list):
+            return len(head)
+        return len(_get_view(_load_graph(filepath), *head))
+
+
+def find_checkpoint(filepath, timeline, checkpoint_id):
+    """The index of 'checkpoint_id' in 'timeline' (newest first), or None"""
+    db_path = _db_path(filepath)
+    if db_path:
+        return metadata.find_checkpoint(db_path, timeline, checkpoint_id)
+
+    with config.read_lock(filepath):
+        head = _read_head(filepath, timeline)
+        if isinstance(head, list):
+            ids = [c["id"] for c in head]
+            return ids.index(checkpoint_id) if checkpoint_id in ids else None
+
+        view = _get_view(_load_graph(filepath), *head)
+        key = view.find(checkpoint_id)
+        return None if key is None else view.index_of(key)
+
+
+def _add_lines(filepath, lines):
+    """Appends new records and overlays with a single write"""
+    if not lines:
+        return
+
+    data = b"".join(json.dumps(line).encode("utf-8") + b"\n" for line in lines)
+    with open(get_graph_path(filepath), "a+b") as f:
+        _drop_cut_record(f)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    # Read back like another instance's records, keeps the offset right
+    _load_graph(filepath)
+
+
+def _drop_cut_record(f):
+    """Truncates a record cut short by a crash, new ones would be glued to it"""
+    end = f.seek(0, os.SEEK_END)
+    if not end:
+        return
+    f.seek(end - 1)
+    if f.read(1) == b"\n":
+        return
+
+    f.seek(0)
+    f.truncate(f.read().rfind(b"\n") + 1)
+
+
+class _Change:
+    """Records and overlays to add to the loaded graph, before they're written"""
+
+    def __init__(self, loaded):
+        self.loaded = loaded
+        self.graph = loaded.graph
+        self.lines = []
+        self._records = {}
+        self._overlays = {}
+        self._by_content = {}
+
+    def add(self, parent, checkpoint):
+        """The key of a record with this content, reusing an existing one"""
+        content = graph.content_key(parent, checkpoint)
+        key = self._by_content.get(content)
+        if key is None and parent not in self._records:
+            key = self.graph.find(parent, checkpoint)
+        if key is not None:
+            return key
+
+        key = self.new_record(parent, checkpoint)
+        self._by_content[content] = key
+        return key
+
+    def new_record(self, parent, checkpoint):
+        key = uuid.uuid4().hex
+        self._records[key] = (parent, checkpoint)
+        self.lines.append({"key": key, "parent": parent, "checkpoint": checkpoint})
+        return key
+
+    def new_overlay(self, parent, record, event):
+        key = uuid.uuid4().hex
+        self._overlays[key] = (parent, record, event)
+        self.lines.append(
+            {"key": key, "parent": parent, "record": record, "event": event}
+        )
+        return key
+
+    def find(self, head, overlay, checkpoint_id):
+        """The record of 'checkpoint_id' the timeline shows, or None"""
+        hidden = set()
+        while overlay in self._overlays:
+            parent, record, event = self._overlays[overlay]
+            if event["op"] == "delete":
+                hidden.add(record)
+            overlay = parent
+
+        while head in self._records:
+            parent, checkpoint = self._records[head]
+            if checkpoint["id"] == checkpoint_id and head not in hidden:
+                return head
+            head = parent
+
+        view = _get_view(self.loaded, head, overlay)
+        return self.graph.find_checkpoint(head, checkpoint_id, view.hidden | hidden)
+
+    def apply(self, head, overlay, event):
+        """The (head, overlay) of a timeline once 'event' is applied to it"""
+        op = event["op"]
+        if op == "add":
+            checkpoint = event["checkpoint"]
+            if self.find(head, overlay, checkpoint["id"]) is None:
+                head = self.new_record(head, checkpoint)
+        elif op in ("edit", "delete"):
+            # Only the event is added, however old the checkpoint is
+            key = self.find(head, overlay, event["id"])
+            if key is not None:
+                overlay = self.new_overlay(overlay, key, event)
+        else:
+            raise ValueError(f"Unknown timeline event '{op}'")
+        return head, overlay
+
+    def chain(self, history):
+        """The head of a history (checkpoints newest first) built from the root"""
+        head = None
+        for checkpoint in reversed(history):
+            head = self.add(head, checkpoint)
+        return head
+
+
+def _migrate(filepath):
+    """Moves timelines from before the graph into it, sharing what they can"""
+    loaded = _load_graph(filepath)
+    if loaded.migrated:
+        return loaded
+
+    heads = {}
+    change = _Change(loaded)
+    for timeline in sorted(list_timelines(filepath)):
+        head = _read_head(filepath, timeline)
+        if isinstance(head, list):
+            heads[timeline] = change.chain(head)
+
+    _add_lines(filepath, change.lines)
+    for timeline, head in heads.items():
+        _write_head(filepath, timeline, head)
+
+    loaded = _load_graph(filepath)
+    _add_live(loaded, len(change.lines))
+    _mark_migrated(loaded)
+    return loaded
+
+
+def _is_due(loaded):
+    garbage = len(loaded.graph) - loaded.live
+    return garbage >= max(_COMPACT_RECORDS, loaded.live)
+
+
+def write_timeline(filepath, timeline, history):
+    """Replaces the whole timeline, e.g. to create it"""
+    db_path = _db_path(filepath)
+    if db_path:
+        metadata.write_timeline(db_path, timeline, history)
+        return
+
+    with config.write_lock(filepath):
+        loaded = _migrate(filepath)
+        change = _Change(loaded)
+        head = change.chain(history)
+        _add_lines(filepath, change.lines)
+        _write_head(filepath, timeline, head)
+        _add_live(loaded, len(change.lines))
+
+
+def append_events(filepath, timeline, events):
+    """
+    Applies 'events' to 'timeline', their new records and overlays are
+    appended with a single write and fsync before the head moves, so they're
+    all kept or none are. Returns whether the graph is due for compaction.
+    """
+    db_path = _db_path(filepath)
+    if db_path:
+        metadata.apply_events(db_path, timeline, events)
+        return False
+
+    with config.write_lock(filepath):
+        loaded = _migrate(filepath)
+        head = _read_head(filepath, timeline)
+        change = _Change(loaded)
+        new_head = head
+        for event in events:
+            new_head = change.apply(*new_head, event)
+
+        _add_lines(filepath, change.lines)
+        if new_head != head:
+            _write_head(filepath, timeline, *new_head)
+
+        _add_live(loaded, len(change.lines))
+        return _is_due(loaded)
+
+
+def add_checkpoint(checkpoint):
+    return {"op": "add", "checkpoint": checkpoint}
+
+
+def edit_checkpoint(checkpoint_id, description):
+    return {"op": "edit", "id": checkpoint_id, "description": description}
+
+
+def delete_checkpoint(checkpoint_id):
+    return {"op": "delete", "id": checkpoint_id}
+
+
+def branch_timeline(filepath, timeline, new_timeline, start, keep_history):
+    """
+    Creates 'new_timeline' from the 'start'-th checkpoint of 'timeline', with
+    the checkpoints before it if 'keep_history'
+    """
+    db_path = _db_path(filepath)
+    if db_path:
+        metadata.branch_timeline(db_path, timeline, new_timeline, start, keep_history)
+        return
+
+    with config.write_lock(filepath):
+        if has_timeline(filepath, new_timeline):
+            raise FileExistsError(f"Timeline '{new_timeline}' already exists")
+
+        loaded = _migrate(filepath)
+        head, overlay = _read_head(filepath, timeline)
+        view = _get_view(loaded, head, overlay)
+        key = view.record_at(start)
+        if key is None:
+            raise ValueError(f"Timeline '{timeline}' has no checkpoint {start}")
+
+        if keep_history:
+            # Shares the records and overlays, nothing to copy
+            _write_head(filepath, new_timeline, key, overlay)
+            return
+
+        change = _Change(loaded)
+        new_head = change.add(None, view.checkpoint(key))
+        _add_lines(filepath, change.lines)
+        _write_head(filepath, new_timeline, new_head)
+        _add_live(loaded, len(change.lines))
+
+
+def timeline_contains(filepath, timeline, checkpoint_id):
+    """Whether 'checkpoint_id' is in the history of 'timeline'"""
+    db_path = _db_path(filepath)
+    if db_path:
+        return metadata.timeline_contains(db_path, timeline, checkpoint_id)
+
+    with config.read_lock(filepath):
+        head = _read_head(filepath, timeline)
+        if isinstance(head, list):
+            return any(c["id"] == checkpoint_id for c in head)
+        return _get_view(_load_graph(filepath), *head).find(checkpoint_id) is not None
+
+
+def filter_checkpoints(filepath, timeline, checkpoint_ids):
+    """The ids of 'checkpoint_ids' in the history of 'timeline'"""
+    db_path = _db_path(filepath)
+    if db_path:
+        return metadata.filter_checkpoints(db_path, timeline, checkpoint_ids)
+
+    with config.read_lock(filepath):
+        head = _read_head(filepath, timeline)
+        if isinstance(head, list):
+            ids = {c["id"] for c in _read(filepath, timeline)}
+            return [c for c in checkpoint_ids if c in ids]
+
+        view = _get_view(_load_graph(filepath), *head)
+        return [c for c in checkpoint_ids if view.find(c) is not None]
+
+
+def common_ancestor(filepath, timeline, other_timeline):
+    """
+    The newest checkpoint of 'timeline' also in 'other_timeline', None if
+    they share none. Checkpoints are compared by id, like in SQLite.
+    """
+    db_path = _db_path(filepath)
+    if db_path:
+        return metadata.common_ancestor(db_path, timeline, other_timeline)
+
+    with config.read_lock(filepath):
+        head = _read_head(filepath, timeline)
+        other_head = _read_head(filepath, other_timeline)
+        if isinstance(head, list) or isinstance(other_head, list):
+            other_ids = {c["id"] for c in _read(filepath, other_timeline)}
+            for checkpoint in _read(filepath, timeline):
+                if checkpoint["id"] in other_ids:
+                    return checkpoint
+            return None
+
+        loaded = _load_graph(filepath)
+        view = _get_view(loaded, *head)
+        key = view.common_checkpoint(_get_view(loaded, *other_head))
+        return None if key is None else view.checkpoint(key)
+
+
+def compact_graph(filepath):
+    """
+    Rewrites the graph without the records and overlays no timeline reaches
+    anymore
+    """
+    with config.write_lock(filepath):
+        loaded = _migrate(filepath)
+        _graph = loaded.graph
+        heads = [_read_head(filepath, timeline) for timeline in list_timelines(filepath)]
+        keys = _get_live(_graph, heads)
+
+        # Parents first, as they're read back
+        records = sorted(
+            (_graph.records[key] for key in keys if key in _graph.records),
+            key=lambda r: r.depth,
+        )
+        lines = [
+            {"key": r.key, "parent": r.parent, "checkpoint": r.checkpoint}
+            for r in records
+        ]
+        # In the order they were added, which has them after their parent
+        lines.extend(
+            {"key": o.key, "parent": o.parent, "record": o.record, "event": o.event}
+            for o in _graph.overlays.values()
+            if o.key in keys
+        )
+
+        graph_path = get_graph_path(filepath)
+        temp_path = f"{graph_path}.tmp"
+        with open(temp_path, "wb") as f:
+            for line in lines:
+                f.write(json.dumps(line).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, graph_path)
+
+        _mark_migrated(_load_graph(filepath))
+
+
+def rename_timeline(filepath, timeline, new_timeline):
+    db_path = _db_path(filepath)
+    if db_path:
+        metadata.rename_timeline(db_path, timeline, new_timeline)
+        return
+
+    with config.write_lock(filepath):
+        os.rename(
+            get_timeline_path(filepath, timeline),
+            get_timeline_path(filepath, new_timeline),
+        )
+
+
+def delete_timeline(filepath, timeline):
+    """Removes the head, its records are dropped on the next compaction"""
+    db_path = _db_path(filepath)
+    if db_path:
+        metadata.delete_timeline(db_path, timeline)
+        return
+
+    with config.write_lock(filepath):
+        os.remove(get_timeline_path(filepath, timeline))
+
+
+@functools.lru_cache(maxsize=_MAX_PARSED_DATES)
+def _parse_date(date):
+    try:
+        return int(datetime.strptime(date, config.CP_TIME_FORMAT).timestamp())
+    except ValueError:
+        return None
+
+
+def add_timestamps(checkpoints):
+    """
+    Sets the missing "timestamp" of 'checkpoints' (as read, not stored)
+    from their date, for checkpoints from before timestamps were stored.
+    Dates written in another locale can't be parsed, those get a None
+    timestamp: unknown.
+    """
+    for checkpoint in checkpoints:
+        if "timestamp" not in checkpoint:
+            checkpoint["timestamp"] = _parse_date(checkpoint["date"])
+
+
+def convert_to_database(filepath):
+    """
+    Moves the state and timelines of a JSON project into its SQLite database.
+    The JSON files are only removed once the database is complete.
+    """
+    _paths = config.get_paths(filepath)
+    with config.write_lock(filepath):
+        if config.uses_database(filepath):
+            return
+
+        state = config.get_state(filepath)
+        timelines = {}
+        for timeline in list_timelines(filepath):
+            timelines[timeline] = _read(filepath, timeline)
+            # The database can't tell a missing timestamp from an unknown one
+            add_timestamps(timelines[timeline])
+
+        metadata.import_project(
+            _paths[config.PATHS_KEYS.METADATA_FILE], state, timelines
+        )
+
+        for timeline in timelines:
+            os.remove(get_timeline_path(filepath, timeline))
+        if os.path.exists(get_graph_path(filepath)):
+            os.remove(get_graph_path(filepath))
+        os.remove(_paths[config.PATHS_KEYS.PERSISTED_STATE_FILE])
@@ -0,0 +1,225 @@
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+from . import locking
+
+
+# Lower runs first: what the user waits on beats what can wait
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_MAINTENANCE = 2
+
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+FINISHED = "FINISHED"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    Work to run in the background, 'work(job)' returns the job's result.
+    The work reports its progress through 'update', which is also where it
+    stops if the job was cancelled.
+
+    'on_finish(job)' is called on the thread polling the scheduler (Blender's
+    main thread) whatever the outcome, so it's where results are committed.
+
+    'tag' tells jobs of the same kind apart, see Scheduler.submit.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(
+        self,
+        kind,
+        label,
+        work,
+        priority=PRIORITY_NORMAL,
+        on_finish=None,
+        cancellable=True,
+    ):
+        self.id = next(self._ids)
+        self.kind = kind
+        self.tag = None
+        self.label = label
+        self.priority = priority
+        self.cancellable = cancellable
+        self._work = work
+        self._on_finish = on_finish
+        self._cancel_event = threading.Event()
+
+        self.state = QUEUED
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+    def run(self):
+        if self._cancel_event.is_set():
+            self.state = CANCELLED
+            return
+
+        self.state = RUNNING
+        self.started_at = time.monotonic()
+        try:
+            self.result = self._work(self)
+            self.state = FINISHED
+        except JobCancelled:
+            self.state = CANCELLED
+        except Exception as e:
+            self.error = e
+            self.state = FAILED
+        finally:
+            self.finished_at = time.monotonic()
+
+    def finish(self):
+        if self._on_finish:
+            self._on_finish(self)
+
+    def update(self, done, total):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+        self.done = done
+        self.total = total
+
+    def cancel(self):
+        """Queued jobs never start, running ones stop at their next update"""
+        if self.cancellable:
+            self._cancel_event.set()
+
+    @property
+    def is_cancelling(self):
+        return self._cancel_event.is_set() and self.is_active
+
+    @property
+    def is_active(self):
+        return self.state in (QUEUED, RUNNING)
+
+    @property
+    def progress(self):
+        """Fraction of the work done, between 0 and 1"""
+        if not self.total:
+            return 0.0
+        return min(self.done / self.total, 1.0)
+
+    @property
+    def throughput(self):
+        """Bytes per second since the job started"""
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+
+class Scheduler:
+    """
+    Runs jobs on a bounded pool of worker threads, by priority then in
+    submission order. 'poll' must be called regularly from the main thread
+    to hand finished jobs to their 'on_finish'.
+    """
+
+    def __init__(self, max_workers=2, history_size=5):
+        self.max_workers = max_workers
+        self._condition = threading.Condition()
+        self._queue = []
+        self._order = itertools.count()
+        self._workers = []
+        self._jobs = []
+        self._finished = collections.deque()
+        self.history = collections.deque(maxlen=history_size)
+
+    def submit(self, job, tag=None):
+        """'tag' is what the job works on, to find it with 'find'"""
+        job.tag = tag
+        with self._condition:
+            heapq.heappush(self._queue, (job.priority, next(self._order), job))
+            self._jobs.append(job)
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._work, name="checkpoint-jobs", daemon=True
+                )
+                self._workers.append(worker)
+                worker.start()
+            self._condition.notify()
+        return job
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                _, _, job = heapq.heappop(self._queue)
+
+            job.run()
+
+            with self._condition:
+                self._finished.append(job)
+
+    def cancel(self, job_id):
+        for job in self.jobs:
+            if job.id == job_id:
+                job.cancel()
+
+    def poll(self):
+        """
+        Calls 'on_finish' for jobs done since the last poll. Those that find
+        the project locked by another instance are finished at a next poll.
+        """
+        busy = []
+        while True:
+            with self._condition:
+                if not self._finished:
+                    break
+                job = self._finished.popleft()
+                self._jobs.remove(job)
+
+            # A failing commit must not keep the other jobs from finishing
+            try:
+                job.finish()
+            except locking.LockTimeout:
+                busy.append(job)
+                continue
+            except Exception as e:
+                job.error = e
+                job.state = FAILED
+            self.history.append(job)
+
+        if busy:
+            with self._condition:
+                self._jobs.extend(busy)
+                self._finished.extend(busy)
+
+    @property
+    def jobs(self):
+        """Running and queued jobs, in submission order"""
+        with self._condition:
+            return list(self._jobs)
+
+    def has_jobs(self):
+        with self._condition:
+            return bool(self._jobs)
+
+    def find(self, kind, tag=None):
+        """Running and queued jobs of 'kind', only those tagged 'tag' if given"""
+        return [
+            job
+            for job in self.jobs
+            if job.kind == kind and (tag is None or job.tag == tag)
+        ]
+
+    def last(self, kind):
+        """The last finished job of 'kind', if still in the history"""
+        for job in reversed(self.history):
+            if job.kind == kind:
+                return job
+        return None
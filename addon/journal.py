@@ -0,0 +1,220 @@
+import contextlib
+import json
+import os
+import threading
+
+
+# An index kept as a JSON snapshot plus the changes made to it since, one
+# line each in '<snapshot>.journal': a change costs appending its line, not
+# rewriting the index. Each process reads an index once, then only the
+# lines other Blender instances appended since. When the journal outgrows
+# the snapshot it's folded back into it, so rewrites stay amortized.
+#
+# Lines are numbered and the snapshot records the last one it includes: a
+# crash between writing the snapshot and removing the journal replays no
+# change twice. Callers coordinate writers with a lock of their own.
+#
+#   snapshot: {"seq": <last line included>, "data": ...}
+#   journal:  {"seq": <line number>, "change": ...}
+
+JOURNAL_EXTENSION = ".journal"
+
+# The journal is folded into the snapshot past this size, or past the
+# snapshot's own size if larger
+_COMPACT_SIZE = 64 * 1024
+
+
+class _Loaded:
+    def __init__(self):
+        self.data = None
+        self.seq = 0
+        self.snapshot_stamp = None
+        self.journal_inode = None
+        self.offset = 0
+
+
+# Indexes by snapshot path, each with a lock for the threads loading it
+_indexes = {}
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _get_lock(path):
+    with _locks_lock:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = threading.Lock()
+        return lock
+
+
+def _get_journal_path(path):
+    return f"{path}{JOURNAL_EXTENSION}"
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _load(path, build, apply):
+    loaded = _indexes.get(path)
+    stamp = _stat(path)
+    built = False
+    if loaded is None or stamp is None or loaded.snapshot_stamp != stamp:
+        loaded = _indexes[path] = _Loaded()
+        if stamp is None:
+            # Built from what it indexes, the journal's changes are in it
+            loaded.data = build()
+            built = True
+        else:
+            with open(path) as f:
+                snapshot = json.load(f)
+            if snapshot.keys() == {"seq", "data"}:
+                loaded.data = snapshot["data"]
+                loaded.seq = snapshot["seq"]
+            else:
+                # Indexes from before the journal are the data alone
+                loaded.data = snapshot
+            loaded.snapshot_stamp = stamp
+
+    try:
+        f = open(_get_journal_path(path), "rb")
+    except FileNotFoundError:
+        loaded.journal_inode = None
+        loaded.offset = 0
+        return loaded
+
+    with f:
+        stat = os.fstat(f.fileno())
+        if loaded.journal_inode != stat.st_ino or stat.st_size < loaded.offset:
+            loaded.journal_inode = stat.st_ino
+            loaded.offset = 0
+        f.seek(loaded.offset)
+        data = f.read(stat.st_size - loaded.offset)
+
+    # A last line without its newline is being written, or was cut short
+    # by a crash before it was acknowledged
+    end = data.rfind(b"\n") + 1
+    for line in data[:end].split(b"\n"):
+        if not line:
+            continue
+        line = json.loads(line)
+        if line["seq"] > loaded.seq:
+            if not built:
+                apply(loaded.data, line["change"])
+            loaded.seq = line["seq"]
+    loaded.offset += end
+    return loaded
+
+
+def read(path, build, apply):
+    """
+    The index at 'path' with every change applied, shared: it must not be
+    modified, nor kept across a write. 'build()' creates it if there's no
+    snapshot yet, 'apply(data, change)' applies a journal change.
+    """
+    with _get_lock(path):
+        return _load(path, build, apply).data
+
+
+class Edit:
+    """Changes to an index, applied as they're made and journaled at the end"""
+
+    def __init__(self, data, apply):
+        self.data = data
+        self.changes = []
+        self._apply = apply
+
+    def apply(self, change):
+        """Applies 'change', returns what the index's 'apply' returns"""
+        self.changes.append(change)
+        return self._apply(self.data, change)
+
+
+@contextlib.contextmanager
+def editing(path, build, apply):
+    """
+    Yields an Edit of the index at 'path' (see read). Its changes are
+    appended to the journal with a single write and fsync when the block
+    exits without an exception, and forgotten otherwise.
+    """
+    with _get_lock(path):
+        loaded = _load(path, build, apply)
+
+    edit = Edit(loaded.data, apply)
+    try:
+        yield edit
+        with _get_lock(path):
+            _write(path, loaded, edit.changes)
+    except BaseException:
+        # Partly applied, read again next time
+        with _get_lock(path):
+            _indexes.pop(path, None)
+        raise
+
+
+def _write(path, loaded, changes):
+    if loaded.snapshot_stamp is None:
+        # Built, not read: the snapshot comes first
+        _write_snapshot(path, loaded)
+    if not changes:
+        return
+
+    lines = []
+    for change in changes:
+        loaded.seq += 1
+        lines.append(json.dumps({"seq": loaded.seq, "change": change}).encode("utf-8"))
+
+    with open(_get_journal_path(path), "a+b") as f:
+        _drop_cut_line(f)
+        f.write(b"\n".join(lines) + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+        loaded.journal_inode = os.fstat(f.fileno()).st_ino
+        loaded.offset = f.tell()
+
+    if loaded.offset >= max(_COMPACT_SIZE, loaded.snapshot_stamp[2]):
+        _write_snapshot(path, loaded)
+
+
+def _drop_cut_line(f):
+    """Truncates a line cut short by a crash, new ones would be glued to it"""
+    end = f.seek(0, os.SEEK_END)
+    if not end:
+        return
+    f.seek(end - 1)
+    if f.read(1) == b"\n":
+        return
+
+    f.seek(0)
+    f.truncate(f.read().rfind(b"\n") + 1)
+    f.seek(0, os.SEEK_END)
+
+
+def _write_snapshot(path, loaded):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"seq": loaded.seq, "data": loaded.data}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    loaded.snapshot_stamp = _stat(path)
+
+    try:
+        os.remove(_get_journal_path(path))
+    except FileNotFoundError:
+        pass
+    loaded.journal_inode = None
+    loaded.offset = 0
+
+
+def rewrite(path, data, apply):
+    """Replaces the index at 'path' with 'data', e.g. rebuilt from scratch"""
+    with _get_lock(path):
+        # Read for its line number, new lines are numbered on from it
+        loaded = _load(path, lambda: data, apply)
+        loaded.data = data
+        _write_snapshot(path, loaded)
@@ -0,0 +1,267 @@
+import json
+import os
+import socket
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows, only threads of this Blender are coordinated
+    fcntl = None
+
+
+# Reader/writer lock of a project's metadata (state, timelines, references),
+# shared by every Blender instance opening the project. Across processes
+# it's an advisory flock on '.checkpoints/_lock'; within this one, threads
+# coordinate on a condition so they don't each need their own lock.
+#
+# A thread may take the lock again, and read while it writes. Writing while
+# it reads would wait on itself: take the write lock first instead.
+
+DEFAULT_TIMEOUT = 10.0
+
+_POLL_INTERVAL = 0.01
+_MAX_POLL_INTERVAL = 0.25
+
+
+class LockTimeout(TimeoutError):
+    pass
+
+
+class LockStats:
+    """How much waiting for other instances cost, see get_stats"""
+
+    def __init__(self):
+        self.acquired = 0
+        self.contended = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+
+class _ProjectLock:
+    def __init__(self, path):
+        self.path = path
+        self.owner_path = f"{path}.owner"
+        self.stats = LockStats()
+        self._condition = threading.Condition()
+        self._file = None
+        self._readers = 0
+        self._writer = None
+        self._write_depth = 0
+        # A thread is polling the flock, others wait for it to get it
+        self._pending = False
+
+    def acquire(self, exclusive, timeout):
+        deadline = time.monotonic() + timeout
+        me = threading.get_ident()
+
+        with self._condition:
+            if self._writer == me:
+                self._write_depth += 1
+                return
+
+            if exclusive:
+                busy = lambda: (
+                    self._writer is not None or self._readers or self._pending
+                )
+            else:
+                busy = lambda: self._writer is not None or self._pending
+
+            # Other threads of this instance hold it in a conflicting mode
+            start = time.monotonic()
+            while busy():
+                if not self._condition.wait(deadline - time.monotonic()):
+                    self._timed_out(start)
+
+            if not exclusive and self._readers:
+                self._readers += 1
+                return
+            self._pending = True
+
+        # Polled without the condition, so threads releasing or reentering
+        # it don't wait on another instance too
+        operation = fcntl and (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            self._lock_file(operation, deadline)
+        except BaseException:
+            with self._condition:
+                self._pending = False
+                self._condition.notify_all()
+            raise
+
+        with self._condition:
+            self._pending = False
+            if exclusive:
+                self._writer = me
+                self._write_depth = 1
+                self._write_owner()
+            else:
+                # No writer can hold it now, a record left is from a crash
+                self._clear_owner()
+                self._readers += 1
+            self._condition.notify_all()
+
+    def release(self):
+        with self._condition:
+            if self._writer == threading.get_ident():
+                self._write_depth -= 1
+                if self._write_depth:
+                    return
+                self._writer = None
+                self._clear_owner()
+            else:
+                self._readers -= 1
+                if self._readers:
+                    return
+
+            self._unlock_file()
+            self._condition.notify_all()
+
+    def _open(self):
+        # The project folder may have been deleted and created again since
+        if self._file and os.fstat(self._file.fileno()).st_nlink == 0:
+            self._file.close()
+            self._file = None
+        if self._file is None:
+            self._file = open(self.path, "a+")
+
+    def _lock_file(self, operation, deadline):
+        self._open()
+        if fcntl is None:
+            return
+
+        start = time.monotonic()
+        interval = _POLL_INTERVAL
+        while True:
+            try:
+                fcntl.flock(self._file.fileno(), operation | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                pass
+            if time.monotonic() >= deadline:
+                self._timed_out(start)
+            time.sleep(interval)
+            interval = min(interval * 2, _MAX_POLL_INTERVAL)
+
+        self._record(time.monotonic() - start)
+
+    def _unlock_file(self):
+        if fcntl is not None and self._file:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def _record(self, waited):
+        stats = self.stats
+        stats.acquired += 1
+        if waited >= _POLL_INTERVAL:
+            stats.contended += 1
+            stats.wait_time += waited
+            stats.max_wait = max(stats.max_wait, waited)
+
+    def _timed_out(self, start):
+        stats = self.stats
+        stats.timeouts += 1
+        stats.wait_time += time.monotonic() - start
+        raise LockTimeout(
+            f"The project is busy: {describe_owner(self._read_owner())}"
+        )
+
+    def _write_owner(self):
+        """Records who writes, only to tell waiting instances"""
+        owner = {
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "since": time.time(),
+        }
+        try:
+            with open(self.owner_path, "w") as f:
+                json.dump(owner, f)
+        except OSError:
+            pass
+
+    def _clear_owner(self):
+        try:
+            os.remove(self.owner_path)
+        except OSError:
+            pass
+
+    def _read_owner(self):
+        try:
+            with open(self.owner_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def is_stale(owner):
+    """
+    Whether the writer recorded in 'owner' is a process of this machine that
+    no longer exists. The system releases the locks of dead processes, so if
+    the lock is still held, a network share kept it: it has to be cleared on
+    the file server.
+    """
+    return owner["host"] == socket.gethostname() and not _is_alive(owner["pid"])
+
+
+def describe_owner(owner):
+    if owner is None:
+        return "another Blender instance is reading it"
+
+    held = time.time() - owner["since"]
+    description = (
+        f"process {owner['pid']} on {owner['host']} has been writing to it"
+        f" for {held:.0f}s"
+    )
+    if is_stale(owner):
+        description += " (that process is gone, the lock may be stale)"
+    return description
+
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _get_lock(lock_path):
+    with _locks_lock:
+        lock = _locks.get(lock_path)
+        if lock is None:
+            lock = _locks[lock_path] = _ProjectLock(lock_path)
+        return lock
+
+
+class _Holding:
+    def __init__(self, lock_path, exclusive, timeout):
+        self._lock = _get_lock(lock_path)
+        self._exclusive = exclusive
+        self._timeout = timeout
+
+    def __enter__(self):
+        self._lock.acquire(self._exclusive, self._timeout)
+        return self
+
+    def __exit__(self, *args):
+        self._lock.release()
+
+
+def reading(lock_path, timeout=DEFAULT_TIMEOUT):
+    """Context manager sharing the lock with other readers"""
+    return _Holding(lock_path, False, timeout)
+
+
+def writing(lock_path, timeout=DEFAULT_TIMEOUT):
+    """Context manager holding the lock alone"""
+    return _Holding(lock_path, True, timeout)
+
+
+def get_stats(lock_path):
+    return _get_lock(lock_path).stats
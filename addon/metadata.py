@@ -0,0 +1,417 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+
+
+# SQLite store for a project's state and timelines, used instead of the JSON
+# files once a project was converted (see import_project). Functions take the
+# path of the database, config.get_paths gives it.
+#
+# A checkpoint's description belongs to its timeline entry, like in the JSON
+# timelines: editing it in one timeline leaves the others alone.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    timestamp INTEGER,
+    size INTEGER,
+    stored INTEGER
+);
+CREATE TABLE IF NOT EXISTS timelines (
+    name TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS timeline_checkpoints (
+    timeline TEXT NOT NULL REFERENCES timelines (name) ON UPDATE CASCADE,
+    checkpoint_id TEXT NOT NULL REFERENCES checkpoints (id),
+    description TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (timeline, checkpoint_id)
+);
+CREATE INDEX IF NOT EXISTS timeline_checkpoints_position
+    ON timeline_checkpoints (timeline, position);
+CREATE INDEX IF NOT EXISTS timeline_checkpoints_checkpoint
+    ON timeline_checkpoints (checkpoint_id);
+CREATE INDEX IF NOT EXISTS checkpoints_timestamp ON checkpoints (timestamp);
+"""
+
+# Columns of the checkpoints table added after its creation
+_ADDED_COLUMNS = ("size", "stored")
+
+# Ids bound per statement, SQLite allows 999 parameters in older versions
+_BATCH_SIZE = 500
+
+# Connections by database path, one set per thread as sqlite3 requires
+_local = threading.local()
+
+
+def _open(db_path):
+    # Transactions are started explicitly, see 'transaction'
+    connection = sqlite3.connect(db_path, isolation_level=None)
+    connection.execute("PRAGMA journal_mode = WAL")
+    # Safe with WAL: a crash may lose the last commits, never corrupt the file
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute("PRAGMA foreign_keys = ON")
+    _upgrade(connection)
+    return connection
+
+
+def _get_missing_columns(connection):
+    rows = connection.execute("PRAGMA table_info(checkpoints)")
+    columns = {row[1] for row in rows}
+    return [c for c in _ADDED_COLUMNS if columns and c not in columns]
+
+
+def _upgrade(connection):
+    """Adds the columns databases were created without"""
+    if not _get_missing_columns(connection):
+        return
+
+    # Checked again, another instance may be upgrading it too
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        for column in _get_missing_columns(connection):
+            connection.execute(f"ALTER TABLE checkpoints ADD COLUMN {column} INTEGER")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+def connect(db_path):
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    connection = connections.get(db_path)
+    if connection is None:
+        connection = connections[db_path] = _open(db_path)
+    return connection
+
+
+def close_connections():
+    """Closes this thread's connections, e.g. before deleting a database"""
+    for connection in getattr(_local, "connections", {}).values():
+        connection.close()
+    _local.connections = {}
+
+
+@contextlib.contextmanager
+def transaction(db_path):
+    """
+    Yields a connection inside a write transaction, committed when the block
+    exits without an exception and rolled back otherwise.
+    """
+    connection = connect(db_path)
+    # Taking the write lock upfront, a read lock can't always be upgraded
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+def get_state(db_path):
+    rows = connect(db_path).execute("SELECT key, value FROM state")
+    return {key: json.loads(value) for key, value in rows}
+
+
+def update_state(db_path, changes):
+    """Sets the properties in 'changes' ({key: value}) in one transaction"""
+    with transaction(db_path) as connection:
+        for prop, value in changes.items():
+            cursor = connection.execute(
+                "UPDATE state SET value = ? WHERE key = ?", (json.dumps(value), prop)
+            )
+            if not cursor.rowcount:
+                raise ValueError(f"Property '{prop}' not found in state")
+
+
+def list_timelines(db_path):
+    rows = connect(db_path).execute("SELECT name FROM timelines")
+    return [name for name, in rows]
+
+
+def has_timeline(db_path, timeline):
+    row = connect(db_path).execute(
+        "SELECT 1 FROM timelines WHERE name = ?", (timeline,)
+    ).fetchone()
+    return row is not None
+
+
+def _to_checkpoint(checkpoint_id, description, date, timestamp, size, stored):
+    # Timestamps are added on import (see history.convert_to_database), NULL
+    # is a date that couldn't be parsed
+    checkpoint = {
+        "id": checkpoint_id,
+        "description": description,
+        "date": date,
+        "timestamp": timestamp,
+    }
+    for key, value in (("size", size), ("stored", stored)):
+        if value is not None:
+            checkpoint[key] = value
+    return checkpoint
+
+
+def read_timeline(db_path, timeline, start=0, count=None):
+    """
+    The checkpoints of 'timeline', newest first, like a JSON timeline. Only
+    'count' of them from the 'start'-th one if given.
+    """
+    connection = connect(db_path)
+    if not has_timeline(db_path, timeline):
+        raise FileNotFoundError(f"Timeline '{timeline}' not found")
+
+    rows = connection.execute(
+        """
+        SELECT c.id, m.description, c.date, c.timestamp, c.size, c.stored
+        FROM timeline_checkpoints AS m JOIN checkpoints AS c ON c.id = m.checkpoint_id
+        WHERE m.timeline = ?
+        ORDER BY m.position DESC
+        LIMIT ? OFFSET ?
+        """,
+        (timeline, -1 if count is None else count, start),
+    )
+    return [_to_checkpoint(*row) for row in rows]
+
+
+def count_checkpoints(db_path, timeline):
+    (count,) = connect(db_path).execute(
+        "SELECT COUNT(*) FROM timeline_checkpoints WHERE timeline = ?", (timeline,)
+    ).fetchone()
+    return count
+
+
+def find_checkpoint(db_path, timeline, checkpoint_id):
+    """The index of 'checkpoint_id' in 'timeline' (newest first), or None"""
+    if not timeline_contains(db_path, timeline, checkpoint_id):
+        return None
+
+    (index,) = connect(db_path).execute(
+        """
+        SELECT COUNT(*) FROM timeline_checkpoints
+        WHERE timeline = ? AND position > (
+            SELECT position FROM timeline_checkpoints
+            WHERE timeline = ? AND checkpoint_id = ?
+        )
+        """,
+        (timeline, timeline, checkpoint_id),
+    ).fetchone()
+    return index
+
+
+def _insert_checkpoint(connection, timeline, checkpoint, position):
+    connection.execute(
+        """
+        INSERT OR IGNORE INTO checkpoints (id, date, timestamp, size, stored)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (
+            checkpoint["id"],
+            checkpoint["date"],
+            checkpoint.get("timestamp"),
+            checkpoint.get("size"),
+            checkpoint.get("stored"),
+        ),
+    )
+    connection.execute(
+        """
+        INSERT OR IGNORE INTO timeline_checkpoints
+            (timeline, checkpoint_id, description, position)
+        VALUES (?, ?, ?, ?)
+        """,
+        (timeline, checkpoint["id"], checkpoint["description"], position),
+    )
+
+
+def _remove_unlisted_checkpoints(connection):
+    connection.execute(
+        """
+        DELETE FROM checkpoints WHERE id NOT IN
+            (SELECT checkpoint_id FROM timeline_checkpoints)
+        """
+    )
+
+
+def write_timeline(db_path, timeline, history):
+    with transaction(db_path) as connection:
+        _write_timeline(connection, timeline, history)
+
+
+def _write_timeline(connection, timeline, history):
+    connection.execute("INSERT OR IGNORE INTO timelines (name) VALUES (?)", (timeline,))
+    connection.execute(
+        "DELETE FROM timeline_checkpoints WHERE timeline = ?", (timeline,)
+    )
+    for index, checkpoint in enumerate(history):
+        _insert_checkpoint(connection, timeline, checkpoint, len(history) - index)
+    _remove_unlisted_checkpoints(connection)
+
+
+def apply_events(db_path, timeline, events):
+    """Applies timeline events (see history) in one transaction"""
+    with transaction(db_path) as connection:
+        for event in events:
+            op = event["op"]
+            if op == "add":
+                (position,) = connection.execute(
+                    """
+                    SELECT COALESCE(MAX(position), 0) + 1
+                    FROM timeline_checkpoints WHERE timeline = ?
+                    """,
+                    (timeline,),
+                ).fetchone()
+                _insert_checkpoint(connection, timeline, event["checkpoint"], position)
+            elif op == "edit":
+                connection.execute(
+                    """
+                    UPDATE timeline_checkpoints SET description = ?
+                    WHERE timeline = ? AND checkpoint_id = ?
+                    """,
+                    (event["description"], timeline, event["id"]),
+                )
+            elif op == "delete":
+                connection.execute(
+                    """
+                    DELETE FROM timeline_checkpoints
+                    WHERE timeline = ? AND checkpoint_id = ?
+                    """,
+                    (timeline, event["id"]),
+                )
+            else:
+                raise ValueError(f"Unknown timeline event '{op}'")
+
+        _remove_unlisted_checkpoints(connection)
+
+
+def branch_timeline(db_path, timeline, new_timeline, start, keep_history):
+    """
+    Creates 'new_timeline' from the 'start'-th checkpoint of 'timeline', see
+    history.branch_timeline
+    """
+    with transaction(db_path) as connection:
+        if has_timeline(db_path, new_timeline):
+            raise FileExistsError(f"Timeline '{new_timeline}' already exists")
+
+        row = connection.execute(
+            """
+            SELECT position FROM timeline_checkpoints WHERE timeline = ?
+            ORDER BY position DESC LIMIT 1 OFFSET ?
+            """,
+            (timeline, start),
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"Timeline '{timeline}' has no checkpoint {start}")
+        (position,) = row
+
+        connection.execute("INSERT INTO timelines (name) VALUES (?)", (new_timeline,))
+        # Positions are only compared within a timeline, they're kept as is
+        connection.execute(
+            f"""
+            INSERT INTO timeline_checkpoints
+                (timeline, checkpoint_id, description, position)
+            SELECT ?, checkpoint_id, description, position
+            FROM timeline_checkpoints
+            WHERE timeline = ? AND position {"<=" if keep_history else "="} ?
+            """,
+            (new_timeline, timeline, position),
+        )
+
+
+def timeline_contains(db_path, timeline, checkpoint_id):
+    row = connect(db_path).execute(
+        """
+        SELECT 1 FROM timeline_checkpoints WHERE timeline = ? AND checkpoint_id = ?
+        """,
+        (timeline, checkpoint_id),
+    ).fetchone()
+    return row is not None
+
+
+def filter_checkpoints(db_path, timeline, checkpoint_ids):
+    """The ids of 'checkpoint_ids' in 'timeline'"""
+    connection = connect(db_path)
+    found = set()
+    # Under SQLite's limit of parameters per statement
+    for i in range(0, len(checkpoint_ids), _BATCH_SIZE):
+        batch = checkpoint_ids[i : i + _BATCH_SIZE]
+        rows = connection.execute(
+            f"""
+            SELECT checkpoint_id FROM timeline_checkpoints
+            WHERE timeline = ? AND checkpoint_id IN ({", ".join("?" * len(batch))})
+            """,
+            (timeline, *batch),
+        )
+        found.update(checkpoint_id for checkpoint_id, in rows)
+    return [c for c in checkpoint_ids if c in found]
+
+
+def common_ancestor(db_path, timeline, other_timeline):
+    """The newest checkpoint of 'timeline' also in 'other_timeline', or None"""
+    row = connect(db_path).execute(
+        """
+        SELECT c.id, m.description, c.date, c.timestamp, c.size, c.stored
+        FROM timeline_checkpoints AS m
+        JOIN timeline_checkpoints AS o
+            ON o.checkpoint_id = m.checkpoint_id AND o.timeline = ?
+        JOIN checkpoints AS c ON c.id = m.checkpoint_id
+        WHERE m.timeline = ?
+        ORDER BY m.position DESC
+        LIMIT 1
+        """,
+        (other_timeline, timeline),
+    ).fetchone()
+    return None if row is None else _to_checkpoint(*row)
+
+
+def rename_timeline(db_path, timeline, new_timeline):
+    with transaction(db_path) as connection:
+        # The memberships follow, ON UPDATE CASCADE
+        connection.execute(
+            "UPDATE timelines SET name = ? WHERE name = ?", (new_timeline, timeline)
+        )
+
+
+def delete_timeline(db_path, timeline):
+    with transaction(db_path) as connection:
+        connection.execute(
+            "DELETE FROM timeline_checkpoints WHERE timeline = ?", (timeline,)
+        )
+        connection.execute("DELETE FROM timelines WHERE name = ?", (timeline,))
+        _remove_unlisted_checkpoints(connection)
+
+
+def import_project(db_path, state, timelines):
+    """
+    Creates the database from a JSON project's 'state' and 'timelines'
+    ({name: history}). It's built aside and moved in place once complete,
+    so a database that exists is always a whole one.
+    """
+    temp_path = f"{db_path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    connection = sqlite3.connect(temp_path, isolation_level=None)
+    try:
+        connection.executescript(_SCHEMA)
+        connection.execute("BEGIN")
+        connection.executemany(
+            "INSERT INTO state (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value)) for key, value in state.items()],
+        )
+        for timeline, history in timelines.items():
+            _write_timeline(connection, timeline, history)
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
+
+    os.replace(temp_path, db_path)
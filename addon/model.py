@@ -0,0 +1,223 @@
+import os
+import time
+import numpy as np
+
+from . import config, history, locking, sorting
+
+
+# External changes (another Blender instance, a synced folder) are only
+# looked for this often, the addon's own writes bump the generation instead
+_STAT_INTERVAL = 1.0
+
+# Checkpoints read for the list at a time, however long the timeline is
+WINDOW_SIZE = 100
+
+
+class ProjectModel:
+    """
+    What the panels show of a project: its state, a window of the current
+    timeline's checkpoints (see set_window and set_sort) and the timeline
+    names. Read from disk once, then again only
+    when the addon wrote to the project (see config.bump_generation) or when
+    the files changed on disk.
+
+    'version' increases each time the content actually changed, so copies
+    of it (like the checkpoints list) know when to sync.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.version = 0
+
+        self.has_root_folder = False
+        self.state = None
+        self.checkpoints = []
+        self.checkpoint_count = 0
+        self.window_start = 0
+        self.sort = sorting.TIMELINE
+        self.sort_reverse = False
+        self.timelines = []
+
+        # Only read while sorted, with the orders computed from them
+        self._columns = None
+        self._orders = {}
+        self._order = None
+        self._rows = None
+
+        self._generation = None
+        self._stamps = None
+        self._checked_at = 0.0
+        # Another instance held the project at the last refresh
+        self._busy = False
+
+    def refresh(self):
+        """Reloads the model if needed, returns whether it changed"""
+        generation = config.cp_state.generation
+        now = time.monotonic()
+        if now - self._checked_at < _STAT_INTERVAL and (
+            generation == self._generation or self._busy
+        ):
+            return False
+        self._checked_at = now
+
+        stamps = self._get_stamps()
+        if generation == self._generation and stamps == self._stamps:
+            return False
+
+        previous = self._get_content()
+        try:
+            self._load()
+        except locking.LockTimeout:
+            # What was read stays shown, it's read again at a next refresh
+            self._busy = True
+        else:
+            self._busy = False
+            self._generation = generation
+            # Stamps taken before reading: a write in between is seen next time
+            self._stamps = stamps
+
+        if previous == self._get_content():
+            return False
+        self.version += 1
+        return True
+
+    def _get_content(self):
+        return (
+            self.has_root_folder,
+            self.state,
+            self.checkpoints,
+            self.checkpoint_count,
+            self.timelines,
+        )
+
+    def _clamp_window(self, start):
+        last_start = max(self.checkpoint_count - 1, 0) // WINDOW_SIZE * WINDOW_SIZE
+        return max(min(start, last_start), 0)
+
+    def set_window(self, start):
+        """
+        Reads the checkpoints from the 'start'-th one instead, returns whether
+        the window moved
+        """
+        start = self._clamp_window(start)
+        if not self.has_root_folder or start == self.window_start:
+            return False
+
+        self.window_start = start
+        timeline = self.state["current_timeline"]
+        self._load_window(timeline)
+        self.version += 1
+        return True
+
+    def set_sort(self, sort, reverse):
+        """
+        Orders the list by 'sort' (see sorting) instead, returns whether
+        that changed anything
+        """
+        if (sort, reverse) == (self.sort, self.sort_reverse):
+            return False
+
+        self.sort = sort
+        self.sort_reverse = reverse
+        if self.has_root_folder:
+            self._load_window(self.state["current_timeline"])
+        self.version += 1
+        return True
+
+    def to_index(self, row):
+        """The index in the timeline of the checkpoint at 'row' of the list"""
+        if self._order is None or row >= len(self._order):
+            return row
+        return int(self._order[row])
+
+    def to_row(self, index):
+        """The row of the list showing the 'index'-th checkpoint"""
+        if self._order is None or index >= len(self._order):
+            return index
+        if self._rows is None:
+            self._rows = np.empty_like(self._order)
+            self._rows[self._order] = np.arange(len(self._order))
+        return int(self._rows[index])
+
+    def _get_stamps(self):
+        """Modification times of every file the model is read from"""
+        _paths = config.get_paths(self.filepath)
+        # The database is only written to its WAL file until checkpointed
+        _metadata = _paths[config.PATHS_KEYS.METADATA_FILE]
+        files = [
+            _paths[config.PATHS_KEYS.PERSISTED_STATE_FILE],
+            _paths[config.PATHS_KEYS.TIMELINES_FOLDER],
+            _metadata,
+            f"{_metadata}-wal",
+            history.get_graph_path(self.filepath),
+        ]
+        if self.state:
+            timeline = self.state["current_timeline"]
+            files.append(history.get_timeline_path(self.filepath, timeline))
+
+        stamps = []
+        for path in files:
+            try:
+                stat = os.stat(path)
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamps.append(None)
+        return stamps
+
+    def _load(self):
+        self.has_root_folder = config.has_root_folder(self.filepath)
+        if not self.has_root_folder:
+            self.state = None
+            self.checkpoints = []
+            self.checkpoint_count = 0
+            self.timelines = []
+            return
+
+        self._columns = None
+
+        # Read together, not with another instance's change in between
+        with config.read_lock(self.filepath):
+            self.state = config.get_state(self.filepath)
+            timeline = self.state["current_timeline"]
+            self.checkpoint_count = history.count_checkpoints(self.filepath, timeline)
+            self.window_start = self._clamp_window(self.window_start)
+            self._load_window(timeline)
+            self.timelines = sorted(history.list_timelines(self.filepath))
+
+    def _load_window(self, timeline):
+        self._rows = None
+        if self.sort == sorting.TIMELINE and not self.sort_reverse:
+            self._order = None
+            self.checkpoints = history.read_timeline(
+                self.filepath, timeline, self.window_start, WINDOW_SIZE
+            )
+            history.add_timestamps(self.checkpoints)
+            return
+
+        # Sorting needs the whole timeline, each order is computed once
+        if self._columns is None:
+            checkpoints = history.read_timeline(self.filepath, timeline)
+            history.add_timestamps(checkpoints)
+            self._columns = sorting.Columns(checkpoints)
+            self._orders = {}
+        key = (self.sort, self.sort_reverse)
+        if key not in self._orders:
+            self._orders[key] = self._columns.get_order(*key)
+        self._order = self._orders[key]
+
+        end = self.window_start + WINDOW_SIZE
+        self.checkpoints = [
+            self._columns.get_checkpoint(index)
+            for index in self._order[self.window_start : end]
+        ]
+
+
+def get_project(filepath):
+    """The model of the project in 'filepath', refreshed if needed"""
+    project = config.cp_state.project
+    if project is None or project.filepath != filepath:
+        project = ProjectModel(filepath)
+        config.cp_state.project = project
+
+    project.refresh()
+    return project
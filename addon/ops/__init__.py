@@ -10,6 +10,10 @@ from .checkpoint_load import LoadCheckpoint
 from .checkpoint_add import AddCheckpoint, PostSaveDialog
 from .checkpoint_edit import EditCheckpoint
 from .checkpoint_export import ExportCheckpoint
+from .checkpoints_page import PageCheckpoints
+from .checkpoint_search import SearchCheckpoints, JumpToCheckpoint
+from .disk_usage_recount import RecountDiskUsage
+from .job_cancel import CancelJob, ClearJobHistory
 
 
 classes = [
@@ -23,7 +27,13 @@ classes = [
     DeleteCheckpoint,
     ExportCheckpoint,
     EditCheckpoint,
+    PageCheckpoints,
+    SearchCheckpoints,
+    JumpToCheckpoint,
     PostSaveDialog,
+    RecountDiskUsage,
+    CancelJob,
+    ClearJobHistory,
 ]
 
 
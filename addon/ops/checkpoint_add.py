@@ -1,11 +1,12 @@
 from datetime import datetime, timezone
-import json
 import os
-import shutil
 import uuid
 import bpy
 
-from .. import config, utils
+from .. import config, copying, history, jobs, locking, refs, store, utils
+
+
+ADD_CHECKPOINT_JOB = "ADD_CHECKPOINT"
 
 
 class AddCheckpoint(bpy.types.Operator):
@@ -20,6 +21,10 @@ class AddCheckpoint(bpy.types.Operator):
         description="A short description of the changes made",
     )
 
+    @classmethod
+    def poll(cls, context):
+        return not is_adding_checkpoint()
+
     def execute(self, context):
         filepath = bpy.path.abspath("//")
 
@@ -29,10 +34,9 @@ class AddCheckpoint(bpy.types.Operator):
 
         bpy.ops.wm.save_mainfile()
 
-        add_checkpoint(filepath, self.description)
+        start_add_checkpoint(filepath, self.description)
 
         self.description = ""
-        checkpoint_context.selectedListIndex = 0
         checkpoint_context.should_display_dialog__ = True
         if checkpoint_context.checkpointDescription:
             checkpoint_context.checkpointDescription = ""
@@ -62,6 +66,7 @@ class PostSaveDialog(bpy.types.Operator):
             checkpoint_context.isInitialized
             and checkpoint_context.should_display_dialog__
             and state["filename"] == filename
+            and not is_adding_checkpoint()
         )
 
     def invoke(self, context, event):
@@ -97,55 +102,192 @@ class PostSaveDialog(bpy.types.Operator):
 
         filepath = bpy.path.abspath("//")
 
-        add_checkpoint(filepath, description)
+        start_add_checkpoint(filepath, description)
 
-        checkpoint_context.selectedListIndex = 0
         if checkpoint_context.checkpointDescription:
             checkpoint_context.checkpointDescription = ""
 
-        self.report({"INFO"}, "Successfully saved!")
+        self.report({"INFO"}, "Saving checkpoint...")
 
         return {"FINISHED"}
 
 
 def add_checkpoint(filepath, description):
+    """Adds a checkpoint of the saved file, blocking until it's stored"""
+    request = prepare_checkpoint(filepath, description)
+    manifest = store_checkpoint(request)
+    commit_checkpoint(request, manifest)
+
+
+def start_add_checkpoint(filepath, description):
+    """
+    Adds a checkpoint of the saved file without blocking: the file is stored
+    by a background job, and the checkpoint shows up in its timeline once the
+    job is committed on the main thread.
+    """
+    request = prepare_checkpoint(filepath, description)
+
+    job = jobs.Job(
+        ADD_CHECKPOINT_JOB,
+        f"Add checkpoint '{request['description']}'",
+        lambda job: store_checkpoint(request, job.update),
+        on_finish=lambda job: _finish_add_checkpoint(job, request),
+    )
+    return utils.submit_job(job)
+
+
+def is_adding_checkpoint():
+    return bool(config.cp_state.scheduler.find(ADD_CHECKPOINT_JOB))
+
+
+def _finish_add_checkpoint(job, request):
+    # Jobs cancelled before they started never got to remove their snapshot
+    if os.path.exists(request["source_file"]):
+        os.remove(request["source_file"])
+
+    if job.state == jobs.FINISHED:
+        commit_checkpoint(request, job.result)
+        # The list shows another timeline if it was switched meanwhile
+        state = config.get_state(request["filepath"])
+        if state["current_timeline"] == request["timeline"]:
+            utils.select_checkpoint(bpy.context.window_manager.checkpoint, 0)
+
+
+def _snapshot_source(filepath, checkpoint_id, source_file):
+    """
+    Links the saved file into the saves folder, for the background job to
+    read. Blender saves by writing a new file and renaming it over the old
+    one, so saving again while the job runs doesn't change what it reads.
+    """
     _paths = config.get_paths(filepath)
     _saves = _paths[config.PATHS_KEYS.CHECKPOINTS_FOLDER]
-    _timelines = _paths[config.PATHS_KEYS.TIMELINES_FOLDER]
+
+    snapshot = os.path.join(_saves, f"{checkpoint_id}.snapshot.tmp")
+    try:
+        os.link(source_file, snapshot)
+    except OSError:
+        # Filesystems without hardlinks (FAT, some network shares)
+        copying.copy_file(source_file, snapshot)
+
+    return snapshot
+
+
+def prepare_checkpoint(filepath, description):
+    """Gathers what storing a checkpoint needs, must run on the main thread"""
     state = config.get_state(filepath)
     filename = state["filename"]
-    current_timeline = state["current_timeline"]
 
     # new checkpoint ID
     checkpoint_id = f"{uuid.uuid4().hex}.blend"
 
-    # Copy current file and pastes into saves
     source_file = os.path.join(filepath, filename)
-    destination_file = os.path.join(_saves, checkpoint_id)
-    shutil.copy(source_file, destination_file)
+    codec, level = utils.get_compression_settings()
+    now = datetime.now(timezone.utc)
+
+    return {
+        "fingerprint": utils.get_file_fingerprint(source_file),
+        "filepath": filepath,
+        "checkpoint_id": checkpoint_id,
+        "description": description.strip(" \t\n\r"),
+        "date": now.strftime(utils.CP_TIME_FORMAT),
+        "timestamp": int(now.timestamp()),
+        "timeline": state["current_timeline"],
+        "base_checkpoint_id": state["active_checkpoint"],
+        "source_file": _snapshot_source(filepath, checkpoint_id, source_file),
+        "codec": codec,
+        "level": level,
+        "max_delta_chain": utils.prefs().deltaChainLength,
+        "method": utils.get_storage_method(),
+    }
+
+
+def store_checkpoint(request, progress=None):
+    """Stores the file into saves, safe to run in a background thread"""
+    try:
+        return store.save_checkpoint(
+            request["filepath"],
+            request["source_file"],
+            request["checkpoint_id"],
+            request["codec"],
+            request["level"],
+            base_checkpoint_id=request["base_checkpoint_id"],
+            max_delta_chain=request["max_delta_chain"],
+            method=request["method"],
+            progress=progress,
+        )
+    finally:
+        os.remove(request["source_file"])
 
-    # updates timeline info
-    timeline_path = os.path.join(_timelines, current_timeline)
-    with open(timeline_path, "r+") as f:
-        timeline_history = json.load(f)
 
-        datetimeString = datetime.now(timezone.utc).strftime(utils.CP_TIME_FORMAT)
+def commit_checkpoint(request, manifest):
+    """Lists a stored checkpoint in its timeline, must run on the main thread"""
+    filepath = request["filepath"]
+    checkpoint_id = request["checkpoint_id"]
+
+    # Taken once for the whole commit: if another instance keeps the project
+    # busy, nothing is written and the job is committed again later
+    with config.write_lock(filepath):
+        try:
+            _commit_checkpoint(request, manifest)
+        except locking.LockTimeout:
+            raise
+        except Exception:
+            _discard_checkpoint(request)
+            raise
+
+    # The store just hashed the file, no need to do it again to compare them
+    if "digest" in manifest:
+        utils.remember_file_digest(request["fingerprint"], manifest["digest"])
+        utils.remember_checkpoint_digest(checkpoint_id, manifest["digest"])
+
 
-        checkpoint = {
-            "id": checkpoint_id,
-            "description": description.strip(" \t\n\r"),
-            "date": datetimeString,
-        }
+def _discard_checkpoint(request):
+    """Removes a stored checkpoint whose commit failed before its timeline listed it"""
+    filepath = request["filepath"]
+    checkpoint_id = request["checkpoint_id"]
+    timeline = request["timeline"]
 
-        timeline_history.insert(0, checkpoint)
+    if history.has_timeline(filepath, timeline) and history.timeline_contains(
+        filepath, timeline, checkpoint_id
+    ):
+        return
 
-        f.seek(0)
-        json.dump(timeline_history, f, indent=4)
-        f.truncate()
+    # If the index can't be written either, it keeps the checkpoint around
+    with refs.edit_refs(filepath) as checkpoint_refs:
+        refs.remove_references(filepath, checkpoint_refs, timeline, [checkpoint_id])
+    store.remove_checkpoint(filepath, checkpoint_id)
 
-    config.set_state(filepath, "active_checkpoint", checkpoint_id)
-    config.set_state(
-        filepath,
-        "disk_usage",
-        utils.get_disk_usage(os.path.join(filepath, config.PATHS_KEYS.ROOT_FOLDER)),
+
+def _commit_checkpoint(request, manifest):
+    filepath = request["filepath"]
+    checkpoint_id = request["checkpoint_id"]
+    timeline = request["timeline"]
+
+    with refs.edit_refs(filepath) as checkpoint_refs:
+        refs.add_references(checkpoint_refs, timeline, [checkpoint_id])
+
+    # updates timeline info
+    checkpoint = {
+        "id": checkpoint_id,
+        "description": request["description"],
+        "date": request["date"],
+        "timestamp": request["timestamp"],
+        # For sorting the list, see sorting
+        "size": manifest["size"],
+        "stored": manifest["written"],
+    }
+    utils.record_timeline_events(
+        filepath, timeline, [history.add_checkpoint(checkpoint)]
     )
+
+    config.bump_generation()
+
+    with config.edit_state(filepath) as state:
+        # Another checkpoint may have been loaded while this one was stored
+        if (
+            state["current_timeline"] == timeline
+            and state["active_checkpoint"] == request["base_checkpoint_id"]
+        ):
+            state["active_checkpoint"] = checkpoint_id
+
+        utils.update_disk_usage(state, manifest["written"])
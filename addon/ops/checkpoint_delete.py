@@ -1,8 +1,6 @@
-import json
-import os
 import bpy
 
-from .. import config, utils
+from .. import config, history, jobs, refs, store, utils
 
 
 class DeleteCheckpoint(bpy.types.Operator):
@@ -38,55 +36,62 @@ class DeleteCheckpoint(bpy.types.Operator):
 
         filepath = bpy.path.abspath("//")
 
-        delete_checkpoint(filepath, checkpoint_context.selectedListIndex)
+        delete_checkpoint(filepath, utils.get_selected_index(checkpoint_context))
 
         # Clean up
         self.id = ""
-        checkpoint_context.selectedListIndex = 0
+        utils.select_checkpoint(checkpoint_context, 0)
 
         self.report({"INFO"}, "Checkpoint deleted successfully!")
         return {"FINISHED"}
 
 
 def delete_checkpoint(filepath, checkpoint_index):
-    _paths = config.get_paths(filepath)
     state = config.get_state(filepath)
-    _timelines = _paths[config.PATHS_KEYS.TIMELINES_FOLDER]
-    _checkpoints = _paths[config.PATHS_KEYS.CHECKPOINTS_FOLDER]
 
-    current_timeline = os.path.join(_timelines, state["current_timeline"])
-    with open(current_timeline, "r+") as f:
-        timeline_history = json.load(f)
+    current_timeline = state["current_timeline"]
 
-        checkpoint_id = timeline_history[checkpoint_index]["id"]
+    # The index is only written back once the timeline is
+    with refs.edit_refs(filepath) as checkpoint_refs:
+        (checkpoint,) = history.read_timeline(
+            filepath, current_timeline, checkpoint_index, 1
+        )
+        checkpoint_id = checkpoint["id"]
 
-        del timeline_history[checkpoint_index]
+        utils.record_timeline_events(
+            filepath, current_timeline, [history.delete_checkpoint(checkpoint_id)]
+        )
 
-        f.seek(0)
-        json.dump(timeline_history, f, indent=4)
-        f.truncate()
+        orphans = refs.remove_references(
+            filepath, checkpoint_refs, current_timeline, [checkpoint_id]
+        )
 
-    timelines = list(
-        filter(lambda f: f != state["current_timeline"], os.listdir(_timelines))
+    config.bump_generation()
+    remove_orphans(filepath, orphans)
+
+
+def remove_orphans(filepath, checkpoint_ids):
+    """
+    Deletes checkpoints no timeline refers to in a background job, then
+    updates disk usage once. The job can't be cancelled: nothing refers to
+    these checkpoints anymore, they would never be removed afterwards.
+    """
+    if not checkpoint_ids:
+        return None
+
+    def remove(job):
+        return store.remove_checkpoints(filepath, checkpoint_ids)
+
+    def finish(job):
+        if job.state == jobs.FINISHED:
+            utils.add_disk_usage(filepath, -job.result)
+
+    job = jobs.Job(
+        "REMOVE_CHECKPOINTS",
+        f"Free {len(checkpoint_ids)} checkpoint(s)",
+        remove,
+        priority=jobs.PRIORITY_MAINTENANCE,
+        on_finish=finish,
+        cancellable=False,
     )
-
-    shouldDelete = True
-
-    if timelines:
-        for tl in timelines:
-            if not shouldDelete:
-                break
-            with open(os.path.join(_timelines, tl)) as f:
-                checkpoints_data = json.load(f)
-                for obj in checkpoints_data:
-                    if obj["id"] == checkpoint_id:
-                        shouldDelete = False
-                        break
-
-    if shouldDelete:
-        os.remove(os.path.join(_checkpoints, checkpoint_id))
-        config.set_state(
-            filepath,
-            "disk_usage",
-            utils.get_disk_usage(os.path.join(filepath, config.PATHS_KEYS.ROOT_FOLDER)),
-        )
+    return utils.submit_job(job)
@@ -1,8 +1,6 @@
-import json
-import os
 import bpy
 
-from .. import config
+from .. import config, history, utils
 
 
 class EditCheckpoint(bpy.types.Operator):
@@ -41,7 +39,7 @@ class EditCheckpoint(bpy.types.Operator):
 
         edit_checkpoint(
             filepath,
-            checkpoint_context.selectedListIndex,
+            utils.get_selected_index(checkpoint_context),
             checkpoint_context.checkpointDescription,
         )
 
@@ -54,17 +52,16 @@ class EditCheckpoint(bpy.types.Operator):
 
 
 def edit_checkpoint(filepath, checkpoint_index, description):
-    _paths = config.get_paths(filepath)
     state = config.get_state(filepath)
+    current_timeline = state["current_timeline"]
 
-    current_timeline = os.path.join(
-        _paths[config.PATHS_KEYS.TIMELINES_FOLDER], state["current_timeline"]
-    )
-    with open(current_timeline, "r+") as f:
-        timeline_history = json.load(f)
+    (checkpoint,) = history.read_timeline(filepath, current_timeline, checkpoint_index, 1)
+    checkpoint_id = checkpoint["id"]
 
-        timeline_history[checkpoint_index]["description"] = description
+    utils.record_timeline_events(
+        filepath,
+        current_timeline,
+        [history.edit_checkpoint(checkpoint_id, description)],
+    )
 
-        f.seek(0)
-        json.dump(timeline_history, f, indent=4)
-        f.truncate()
+    config.bump_generation()
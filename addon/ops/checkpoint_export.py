@@ -1,8 +1,7 @@
 import os
-import shutil
 import bpy
 
-from .. import config
+from .. import jobs, store, utils
 
 
 class ExportCheckpoint(bpy.types.Operator):
@@ -21,26 +20,37 @@ class ExportCheckpoint(bpy.types.Operator):
             checkpoint_context.selectedListIndex
         ]["description"]
 
-        export_checkpoint(filepath, self.id, checkpointDescription)
+        start_export_checkpoint(filepath, self.id, checkpointDescription)
 
         # Clean up
         self.id = ""
-        self.report({"INFO"}, "Checkpoint exported successfully!")
+        self.report({"INFO"}, "Exporting checkpoint...")
         return {"FINISHED"}
 
 
-def export_checkpoint(filepath, checkpoint_id, description):
-    _paths = config.get_paths(filepath)
-
-    # get checkpoint wth the provided id
-    checkpoint = os.path.join(
-        _paths[config.PATHS_KEYS.CHECKPOINTS_FOLDER], checkpoint_id
-    )
-
+def _get_export_name(filepath, description):
     # create folder "exported"
     export_path = os.path.join(filepath, "exported")
     if not os.path.exists(export_path):
         os.mkdir(export_path)
 
-    export_name = os.path.join(export_path, f"{description}.blend")
-    shutil.copy(checkpoint, export_name)
+    return os.path.join(export_path, f"{description}.blend")
+
+
+def export_checkpoint(filepath, checkpoint_id, description):
+    export_name = _get_export_name(filepath, description)
+    store.restore_checkpoint(filepath, checkpoint_id, export_name)
+
+
+def start_export_checkpoint(filepath, checkpoint_id, description):
+    export_name = _get_export_name(filepath, description)
+
+    job = jobs.Job(
+        "EXPORT_CHECKPOINT",
+        f"Export '{description}'",
+        lambda job: store.restore_checkpoint(
+            filepath, checkpoint_id, export_name, job.update
+        ),
+        priority=jobs.PRIORITY_INTERACTIVE,
+    )
+    return utils.submit_job(job)
@@ -1,8 +1,7 @@
 import os
-import shutil
 import bpy
 
-from .. import config
+from .. import config, store, utils
 
 
 class LoadCheckpoint(bpy.types.Operator):
@@ -13,6 +12,10 @@ class LoadCheckpoint(bpy.types.Operator):
 
     id: bpy.props.StringProperty(name="", description="ID of checkpoint to load")
 
+    @classmethod
+    def poll(cls, context):
+        return not utils.is_loading()
+
     def execute(self, context):
         filepath = bpy.path.abspath("//")
 
@@ -21,23 +24,16 @@ class LoadCheckpoint(bpy.types.Operator):
         if activeCheckpointId == self.id:
             return {"CANCELLED"}
 
-        load_checkpoint(filepath, self.id)
-
-        bpy.ops.wm.revert_mainfile()
+        utils.start_load_checkpoint(filepath, self.id)
 
         return {"FINISHED"}
 
 
 def load_checkpoint(filepath, checkpoint_id):
-    _paths = config.get_paths(filepath)
-    state = config.get_state(filepath)
-
-    config.set_state(filepath, "active_checkpoint", checkpoint_id)
+    with config.edit_state(filepath) as state:
+        state["active_checkpoint"] = checkpoint_id
 
-    checkpoint_path = os.path.join(
-        _paths[config.PATHS_KEYS.CHECKPOINTS_FOLDER], checkpoint_id
-    )
     filename = state["filename"]
     destination_file = os.path.join(filepath, filename)
 
-    shutil.copy(checkpoint_path, destination_file)
+    store.restore_checkpoint(filepath, checkpoint_id, destination_file)
@@ -0,0 +1,107 @@
+import bpy
+
+from .. import config, history, utils
+
+
+_MAX_RESULTS = 20
+
+
+class SearchCheckpoints(bpy.types.Operator):
+    """Search the checkpoints of every timeline"""
+
+    bl_label = "Search checkpoints"
+    bl_idname = "checkpoint.search_checkpoints"
+
+    query: bpy.props.StringProperty(
+        name="",
+        options={"TEXTEDIT_UPDATE"},
+        description="Words of the checkpoint description, or their start",
+    )
+
+    fuzzy: bpy.props.BoolProperty(
+        name="Fuzzy", description="Also find words spelled a bit differently"
+    )
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self, width=400)
+
+    def draw(self, context):
+        filepath = bpy.path.abspath("//")
+
+        layout = self.layout
+
+        row = layout.row(align=True)
+        row.prop(self, "query", icon="VIEWZOOM")
+        row.prop(self, "fuzzy", toggle=True)
+
+        if not self.query:
+            return
+
+        index = utils.get_search_index(filepath)
+        hits = index.search(self.query, self.fuzzy, _MAX_RESULTS)
+        if not hits:
+            layout.label(text="No checkpoint found")
+            return
+
+        col = layout.column(align=True)
+        for hit in hits:
+            row = col.row(align=True)
+            jumpOps = row.operator(
+                JumpToCheckpoint.bl_idname, text=hit.description, icon="KEYFRAME"
+            )
+            jumpOps.timeline = hit.timeline
+            jumpOps.id = hit.checkpoint_id
+
+            timelineCol = row.column()
+            timelineCol.alignment = "RIGHT"
+            timelineCol.label(
+                text=hit.timeline.replace(".json", ""), icon=utils.TIMELINE_ICON
+            )
+
+    def execute(self, context):
+        return {"FINISHED"}
+
+
+class JumpToCheckpoint(bpy.types.Operator):
+    """Select the checkpoint in the list, switching to its timeline"""
+
+    bl_label = "Go to checkpoint"
+    bl_idname = "checkpoint.jump_to_checkpoint"
+
+    timeline: bpy.props.StringProperty(name="", description="Timeline of the checkpoint")
+    id: bpy.props.StringProperty(name="", description="ID of checkpoint to select")
+
+    @classmethod
+    def poll(cls, context):
+        return not utils.is_loading()
+
+    def execute(self, context):
+        filepath = bpy.path.abspath("//")
+        checkpoint_context = context.window_manager.checkpoint
+
+        if not history.has_timeline(filepath, self.timeline):
+            self.report({"ERROR"}, "The timeline no longer exists")
+            return {"CANCELLED"}
+
+        index = history.find_checkpoint(filepath, self.timeline, self.id)
+        if index is None:
+            self.report({"ERROR"}, "The checkpoint no longer exists")
+            return {"CANCELLED"}
+
+        state = config.get_state(filepath)
+        if self.timeline == state["current_timeline"]:
+            utils.select_checkpoint(checkpoint_context, index)
+            return {"FINISHED"}
+
+        # Switching timelines replaces the working file
+        if bpy.data.is_dirty or utils.check_is_modified(filepath):
+            self.report(
+                {"ERROR"},
+                "Add a checkpoint first, switching timelines would lose your changes",
+            )
+            return {"CANCELLED"}
+
+        utils.switch_timeline(filepath, self.timeline)
+        utils.select_checkpoint(checkpoint_context, index)
+
+        return {"FINISHED"}
@@ -0,0 +1,37 @@
+import bpy
+
+from .. import model, utils
+
+
+class PageCheckpoints(bpy.types.Operator):
+    """Show other checkpoints of the timeline"""
+
+    bl_label = __doc__
+    bl_idname = "checkpoint.page_checkpoints"
+
+    direction: bpy.props.EnumProperty(
+        items=[
+            ("FIRST", "First", "Newest checkpoints"),
+            ("PREVIOUS", "Previous", "Newer checkpoints"),
+            ("NEXT", "Next", "Older checkpoints"),
+            ("LAST", "Last", "Oldest checkpoints"),
+        ],
+    )
+
+    def execute(self, context):
+        filepath = bpy.path.abspath("//")
+        checkpoint_context = context.window_manager.checkpoint
+
+        count = model.get_project(filepath).checkpoint_count
+        start = checkpoint_context.listOffset
+        if self.direction == "FIRST":
+            start = 0
+        elif self.direction == "PREVIOUS":
+            start -= model.WINDOW_SIZE
+        elif self.direction == "NEXT":
+            start += model.WINDOW_SIZE
+        else:
+            start = count - 1
+
+        utils.select_row(checkpoint_context, max(min(start, count - 1), 0))
+        return {"FINISHED"}
@@ -0,0 +1,59 @@
+import bpy
+
+from .. import accounting, config, jobs, store, utils
+
+
+_MB = 1024 * 1024
+
+RECOUNT_JOB = "RECOUNT_DISK_USAGE"
+
+
+class RecountDiskUsage(bpy.types.Operator):
+    """Recount the disk space used by checkpoints, and what each timeline uses on its own. Frees stored objects no checkpoint needs"""
+
+    bl_label = "Recount disk usage"
+    bl_idname = "checkpoint.recount_disk_usage"
+
+    @classmethod
+    def poll(cls, context):
+        return not config.cp_state.scheduler.find(RECOUNT_JOB)
+
+    def execute(self, context):
+        filepath = bpy.path.abspath("//")
+
+        job = jobs.Job(
+            RECOUNT_JOB,
+            "Recount disk usage",
+            lambda job: _count_usage(filepath),
+            priority=jobs.PRIORITY_MAINTENANCE,
+            on_finish=lambda job: _finish_recount(job, filepath),
+        )
+        utils.submit_job(job)
+
+        return {"FINISHED"}
+
+
+def _count_usage(filepath):
+    # The full sweep, deletes only free the objects they know about
+    store.collect_garbage(filepath)
+    return accounting.get_usage(filepath), accounting.get_timeline_usage(filepath)
+
+
+def _finish_recount(job, filepath):
+    if job.state != jobs.FINISHED:
+        return
+
+    usage, timelines_usage = job.result
+    with config.edit_state(filepath) as state:
+        state["disk_usage"] = usage.logical / _MB
+
+    timeline_usage = timelines_usage.get(
+        state["current_timeline"], accounting.TimelineUsage(0, 0)
+    )
+
+    checkpoint_context = bpy.context.window_manager.checkpoint
+    checkpoint_context.diskUsage = usage.logical / _MB
+    checkpoint_context.diskUsagePhysical = usage.physical / _MB
+    checkpoint_context.timelineUniqueUsage = timeline_usage.unique / _MB
+    checkpoint_context.timelineSharedUsage = timeline_usage.shared / _MB
+    checkpoint_context.usageTimeline = state["current_timeline"]
@@ -0,0 +1,27 @@
+import bpy
+
+from .. import config
+
+
+class CancelJob(bpy.types.Operator):
+    """Cancel background job"""
+
+    bl_label = __doc__
+    bl_idname = "checkpoint.cancel_job"
+
+    job_id: bpy.props.IntProperty(name="", description="ID of the job to cancel")
+
+    def execute(self, context):
+        config.cp_state.scheduler.cancel(self.job_id)
+        return {"FINISHED"}
+
+
+class ClearJobHistory(bpy.types.Operator):
+    """Clear finished jobs from the list"""
+
+    bl_label = "Clear finished"
+    bl_idname = "checkpoint.clear_job_history"
+
+    def execute(self, context):
+        config.cp_state.scheduler.history.clear()
+        return {"FINISHED"}
@@ -1,11 +1,12 @@
 from datetime import datetime, timezone
 import json
 import os
-import shutil
 import uuid
 import bpy
 
 from .. import config
+from .. import history
+from .. import store
 from .. import utils
 
 
@@ -28,7 +29,7 @@ class StartVersionControl(bpy.types.Operator):
         initialize_version_control(filepath, filename)
 
         checkpoint_context.isInitialized = True
-        checkpoint_context.selectedListIndex = 0
+        utils.select_checkpoint(checkpoint_context, 0)
 
         self.report({"INFO"}, "Version control started!")
 
@@ -57,34 +58,52 @@ def initialize_version_control(filepath, filename):
     if not os.path.exists(_objects):
         os.mkdir(_objects)
 
-    _original_tl_path = os.path.join(_timelines, config.PATHS_KEYS.ORIGINAL_TL_FILE)
-    if not os.path.exists(_original_tl_path):
+    if not history.has_timeline(filepath, config.PATHS_KEYS.ORIGINAL_TL_FILE):
         # generate first checkpoint
         _initial_checkpoint_id = f"{uuid.uuid4().hex}.blend"
 
         source_file = os.path.join(filepath, filename)
-        destination_file = os.path.join(_saves, _initial_checkpoint_id)
-        shutil.copy(source_file, destination_file)
-
-        datetimeString = datetime.now(timezone.utc).strftime(utils.CP_TIME_FORMAT)
-
-        with open(_original_tl_path, "w") as file:
-            first_checkpoint = [
-                {
-                    "id": _initial_checkpoint_id,
-                    "description": "Initial checkpoint",
-                    "date": datetimeString,
-                }
-            ]
-            json.dump(first_checkpoint, file)
-
-    if not os.path.exists(_persisted_state):
+        codec, level = utils.get_compression_settings()
+        manifest = store.save_checkpoint(
+            filepath,
+            source_file,
+            _initial_checkpoint_id,
+            codec,
+            level,
+            max_delta_chain=utils.prefs().deltaChainLength,
+            method=utils.get_storage_method(),
+        )
+
+        now = datetime.now(timezone.utc)
+
+        first_checkpoint = [
+            {
+                "id": _initial_checkpoint_id,
+                "description": "Initial checkpoint",
+                "date": now.strftime(utils.CP_TIME_FORMAT),
+                "timestamp": int(now.timestamp()),
+                "size": manifest["size"],
+                "stored": manifest["written"],
+            }
+        ]
+        history.write_timeline(
+            filepath, config.PATHS_KEYS.ORIGINAL_TL_FILE, first_checkpoint
+        )
+
+    if not config.uses_database(filepath) and not os.path.exists(_persisted_state):
         # generate initial state
         with open(_persisted_state, "w") as file:
             initial_state = {
                 "current_timeline": config.PATHS_KEYS.ORIGINAL_TL_FILE,
                 "active_checkpoint": _initial_checkpoint_id,
-                "disk_usage": 0,
+                # A fresh tree, walking it once is cheap
+                "disk_usage": utils.get_disk_usage(_root),
                 "filename": filename,
             }
             json.dump(initial_state, file)
+
+    if utils.prefs().metadataBackend == "SQLITE":
+        history.convert_to_database(filepath)
+
+    config.bump_generation()
+    utils.invalidate_timeline_catalogue()
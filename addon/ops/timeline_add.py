@@ -1,8 +1,6 @@
-import json
-import os
 import bpy
 
-from .. import config
+from .. import config, history, refs
 from .. import utils
 
 
@@ -22,6 +20,10 @@ class NewTimeline(bpy.types.Operator):
         name="", description="Keep previous checkpoints"
     )
 
+    @classmethod
+    def poll(cls, context):
+        return not utils.is_loading()
+
     def execute(self, context):
         filepath = bpy.path.abspath("//")
         checkpoint_context = context.window_manager.checkpoint
@@ -31,7 +33,7 @@ class NewTimeline(bpy.types.Operator):
             new_name = create_new_timeline(
                 filepath,
                 slugfied_name,
-                checkpoint_context.selectedListIndex,
+                utils.get_selected_index(checkpoint_context),
                 self.new_tl_keep_history,
             )
         except FileExistsError:
@@ -39,7 +41,7 @@ class NewTimeline(bpy.types.Operator):
             return {"CANCELLED"}
 
         # Clean up
-        checkpoint_context.selectedListIndex = 0
+        utils.select_checkpoint(checkpoint_context, 0)
 
         utils.switch_timeline(filepath, new_name)
 
@@ -48,34 +50,35 @@ class NewTimeline(bpy.types.Operator):
         if checkpoint_context.newTimelineName:
             checkpoint_context.newTimelineName = ""
 
-        bpy.ops.wm.revert_mainfile()
-
         return {"FINISHED"}
 
 
 def create_new_timeline(filepath, name, start_checkpoint_index, keep_history):
     state = config.get_state(filepath)
-    _paths = config.get_paths(filepath)
-    _timelines = _paths[config.PATHS_KEYS.TIMELINES_FOLDER]
 
     new_name = f"{name}.json"
-    new_tl_path = os.path.join(_timelines, new_name)
 
-    if os.path.exists(new_tl_path):
+    if history.has_timeline(filepath, new_name):
         raise FileExistsError(f"File '{name}' already exists")
 
-    # Get current timeline history
-    # TODO test if "get_checkpoints" can be switched with checkpoint_context.checkpoints
+    # The new timeline shares the current one's checkpoints, nothing is copied
+    # and nothing is read, whatever the history's length
     current_timeline = state["current_timeline"]
-    timeline_history = utils.get_checkpoints(filepath, current_timeline)
+    with refs.edit_refs(filepath) as checkpoint_refs:
+        with utils.update_search_index(filepath) as index:
+            history.branch_timeline(
+                filepath, current_timeline, new_name, start_checkpoint_index, keep_history
+            )
+            if index is not None:
+                index.defer_timeline(new_name)
 
-    if keep_history:
-        new_tl_history = timeline_history[start_checkpoint_index:]
-    else:
-        new_tl_history = [timeline_history[start_checkpoint_index]]
+        if keep_history:
+            refs.share_references(checkpoint_refs, new_name, current_timeline)
+        else:
+            (checkpoint,) = history.read_timeline(filepath, new_name, count=1)
+            refs.add_references(checkpoint_refs, new_name, [checkpoint["id"]])
 
-    # create new timeline file
-    with open(new_tl_path, "w") as file:
-        json.dump(new_tl_history, file)
+    config.bump_generation()
+    utils.invalidate_timeline_catalogue()
 
     return new_name
@@ -1,7 +1,6 @@
-import os
 import bpy
 
-from .. import config, utils
+from .. import config, history, refs, utils
 
 
 class RenameTimeline(bpy.types.Operator):
@@ -38,17 +37,22 @@ class RenameTimeline(bpy.types.Operator):
 
 
 def rename_timeline(filepath, name):
-    state = config.get_state(filepath)
-    _paths = config.get_paths(filepath)
-    _timelines = _paths[config.PATHS_KEYS.TIMELINES_FOLDER]
-
-    new_name = f"{name}.json"
-    new_tl_path = os.path.join(_timelines, new_name)
-    if os.path.exists(new_tl_path):
-        raise FileExistsError(f"File '{name}' already exists")
-
-    previous_tl_name = state["current_timeline"]
-    previous_tl_path = os.path.join(_timelines, previous_tl_name)
-
-    os.rename(previous_tl_path, new_tl_path)
-    config.set_state(filepath, "current_timeline", new_name)
+    # Locked once for the whole rename: another instance never sees the
+    # timeline renamed in one place and not yet in the others
+    with config.write_lock(filepath):
+        state = config.get_state(filepath)
+
+        new_name = f"{name}.json"
+        if history.has_timeline(filepath, new_name):
+            raise FileExistsError(f"File '{name}' already exists")
+
+        previous_tl_name = state["current_timeline"]
+
+        with utils.update_search_index(filepath) as index:
+            history.rename_timeline(filepath, previous_tl_name, new_name)
+            if index is not None:
+                index.rename_timeline(previous_tl_name, new_name)
+        with refs.edit_refs(filepath) as checkpoint_refs:
+            refs.rename_timeline(checkpoint_refs, previous_tl_name, new_name)
+        config.set_state(filepath, "current_timeline", new_name)
+    utils.invalidate_timeline_catalogue()
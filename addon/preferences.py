@@ -3,7 +3,7 @@ import shutil
 
 import bpy
 
-from . import config, utils
+from . import config, metadata, utils
 from .. import addon_updater_ops
 
 
@@ -41,7 +41,10 @@ class ResetProject(bpy.types.Operator):
         _root_path = config.get_paths(filepath)[config.PATHS_KEYS.ROOT_FOLDER]
 
         if os.path.exists(_root_path):
-            shutil.rmtree(_root_path)
+            # Not while another instance is writing to it
+            with config.write_lock(filepath):
+                metadata.close_connections()
+                shutil.rmtree(_root_path)
 
             context.window_manager.checkpoint.isInitialized = False
 
@@ -68,6 +71,64 @@ class AddonPreferences(bpy.types.AddonPreferences):
         default=False,
     )
 
+    storageMethod: bpy.props.EnumProperty(
+        name="Storage",
+        description="How new checkpoints are stored",
+        items=[
+            (
+                "AUTO",
+                "Automatic",
+                "Plain copies where the filesystem can share them (btrfs, XFS), compressed deltas otherwise",
+            ),
+            ("STORE", "Compressed deltas", "Deduplicate and compress checkpoints"),
+            ("COPY", "Full copies", "Keep a plain copy of the file per checkpoint"),
+        ],
+        default="AUTO",
+    )
+
+    metadataBackend: bpy.props.EnumProperty(
+        name="Project data",
+        description="Where projects keep their state and timelines",
+        items=[
+            ("JSON", "JSON files", "One file per timeline"),
+            (
+                "SQLITE",
+                "SQLite database",
+                "One database per project, faster with long histories. Projects are converted when opened, and stay converted",
+            ),
+        ],
+        default="JSON",
+        update=lambda self, context: utils.convert_project_metadata(),
+    )
+
+    compressionCodec: bpy.props.EnumProperty(
+        name="Compression",
+        description="Codec used to compress newly stored checkpoints",
+        items=[
+            ("NONE", "None", "Store checkpoints uncompressed"),
+            ("ZLIB", "Zlib", "Fast compression"),
+            ("BZ2", "Bzip2", "Better compression, slower"),
+            ("LZMA", "LZMA", "Best compression, slowest"),
+        ],
+        default="ZLIB",
+    )
+
+    compressionLevel: bpy.props.IntProperty(
+        name="Level",
+        description="Compression level, higher is smaller but slower",
+        default=6,
+        min=1,
+        max=9,
+    )
+
+    deltaChainLength: bpy.props.IntProperty(
+        name="Max delta chain",
+        description="Store checkpoints as deltas against the previous one, with a full checkpoint every this many deltas to keep loading fast (0 to disable)",
+        default=8,
+        min=0,
+        max=64,
+    )
+
     # Addon updater preferences.
     auto_check_update = bpy.props.BoolProperty(
         name="Auto-check for Update",
@@ -115,6 +176,23 @@ class AddonPreferences(bpy.types.AddonPreferences):
         row = layout.row()
         row.prop(self, "shouldAutoStart")
 
+        row = layout.row()
+        row.prop(self, "storageMethod")
+
+        row = layout.row()
+        row.prop(self, "metadataBackend")
+
+        row = layout.row()
+        row.enabled = self.storageMethod != "COPY"
+        row.prop(self, "compressionCodec")
+        levelCol = row.column()
+        levelCol.enabled = self.compressionCodec != "NONE"
+        levelCol.prop(self, "compressionLevel")
+
+        row = layout.row()
+        row.enabled = self.storageMethod != "COPY"
+        row.prop(self, "deltaChainLength")
+
         layout.separator()
 
         row = layout.row()
@@ -1,25 +1,46 @@
 import bpy
 
 from . import config
+from . import model
+from . import sorting
 from . import utils
 
 
+_NO_TIMELINES = []
+
+
 class CheckpointsListItem(bpy.types.PropertyGroup):
     id: bpy.props.StringProperty(description="Unique ID of checkpoint")
     date: bpy.props.StringProperty(description="Date of checkpoint")
+    # A string: IntProperty is 32 bits, FloatProperty single precision.
+    # Empty if unknown
+    timestamp: bpy.props.StringProperty(description="Date of checkpoint, in seconds since the epoch")
+    age: bpy.props.StringProperty(description="Time since the checkpoint, refreshed every minute")
     description: bpy.props.StringProperty(description="Checkpoint description")
+    # In MB, -1 for checkpoints from before sizes were recorded
+    size: bpy.props.FloatProperty(default=-1, description="Size of the file")
+    stored: bpy.props.FloatProperty(
+        default=-1, description="Space the checkpoint added to the store"
+    )
 
 
 class CheckpointsPanelData(bpy.types.PropertyGroup):
     def getTimelines(self, context):
         filepath = bpy.path.abspath("//")
-        state = config.get_state(filepath)
-        timelines = utils.listall_timelines(filepath)
+        project = model.get_project(filepath)
+        if not project.has_root_folder:
+            return _NO_TIMELINES
 
-        currentTimeline = state["current_timeline"]
+        catalogue = utils.get_timeline_catalogue(filepath)
+        currentTimeline = project.state["current_timeline"]
+
+        # Blender doesn't keep the strings of dynamic enum items alive, so
+        # the list returned must stay referenced from Python
+        if catalogue["items_timeline"] == currentTimeline:
+            return catalogue["items"]
 
         timelinesList = []
-        for index, timeline in enumerate(timelines):
+        for index, timeline in enumerate(catalogue["timelines"]):
             if timeline == currentTimeline:
                 index = -1
             tl_format_name = timeline.replace(".json", "")
@@ -33,12 +54,14 @@ class CheckpointsPanelData(bpy.types.PropertyGroup):
                 )
             )
 
+        catalogue["items"] = timelinesList
+        catalogue["items_timeline"] = currentTimeline
         return timelinesList
 
     def setActiveTimeline(self, context):
         filepath = bpy.path.abspath("//")
         state = config.get_state(filepath)
-        timelines = utils.listall_timelines(filepath)
+        timelines = utils.get_timeline_catalogue(filepath)["timelines"]
 
         selectedTimeline = context.window_manager.checkpoint.timelines
         currentTimeline = state["current_timeline"]
@@ -46,10 +69,12 @@ class CheckpointsPanelData(bpy.types.PropertyGroup):
         if not selectedTimeline in timelines or selectedTimeline == currentTimeline:
             return
 
-        utils.switch_timeline(filepath, selectedTimeline)
+        # The file is reverted once the checkpoint is loaded
+        if utils.is_loading():
+            context.window_manager.checkpoint.timelines = currentTimeline
+            return
 
-        # Load the reverted file
-        bpy.ops.wm.revert_mainfile()
+        utils.switch_timeline(filepath, selectedTimeline)
 
     timelines: bpy.props.EnumProperty(
         name="Timeline",
@@ -76,12 +101,40 @@ class CheckpointsPanelData(bpy.types.PropertyGroup):
 
     selectedListIndex: bpy.props.IntProperty(default=0)
 
+    # The list only holds a window of the timeline, see model.WINDOW_SIZE.
+    # selectedListIndex is relative to it
+    listOffset: bpy.props.IntProperty(
+        default=0, min=0, description="Index of the first checkpoint in the list"
+    )
+
+    def resetListPosition(self, context):
+        utils.select_row(self, 0)
+
+    listSort: bpy.props.EnumProperty(
+        name="Sort by",
+        items=sorting.SORT_ITEMS,
+        default=sorting.TIMELINE,
+        update=resetListPosition,
+    )
+
+    listSortReverse: bpy.props.BoolProperty(
+        name="Reverse", description="Sort in reverse order", update=resetListPosition
+    )
+
     activeCheckpointId: bpy.props.StringProperty(
         name="", description="Current/last active checkpoint ID"
     )
 
     diskUsage: bpy.props.FloatProperty(default=0)
 
+    # Filled by the disk usage recount, in MB
+    diskUsagePhysical: bpy.props.FloatProperty(default=0)
+    timelineUniqueUsage: bpy.props.FloatProperty(default=0)
+    timelineSharedUsage: bpy.props.FloatProperty(default=0)
+    usageTimeline: bpy.props.StringProperty(
+        description="Timeline the unique/shared usage was counted for"
+    )
+
     isInitialized: bpy.props.BoolProperty(
         name="Version Control Status",
         default=False,
@@ -0,0 +1,186 @@
+import contextlib
+
+from . import config, history, journal
+
+
+# Maps each checkpoint id to the timelines listing it, so finding out whether
+# a checkpoint is still used doesn't mean reading every timeline. Changes
+# are journaled (see journal), each costs a line, not a rewrite of the index.
+#
+# A timeline branched with its history lists none of the checkpoints it
+# shares, the index only records the timeline it shares them with: branching
+# costs the same whatever the history's length. A checkpoint no timeline
+# lists anymore is looked up in the timelines sharing it (see
+# remove_references), those still showing it list it from then on.
+#
+#   {"checkpoints": {<id>: [<timeline>, ...]}, "shares": {<timeline>: <source>}}
+#
+# Callers update the index before adding references to timelines and after
+# removing them: if anything fails in between, the index over-counts, which
+# can only keep an unused checkpoint around, never delete a used one.
+
+
+def _refs_path(filepath):
+    _paths = config.get_paths(filepath)
+    return _paths[config.PATHS_KEYS.REFS_FILE]
+
+
+def build_refs(filepath):
+    """Rebuilds the index from the timeline files, every timeline listing all it shows"""
+    checkpoints = {}
+    for timeline in sorted(history.list_timelines(filepath)):
+        for checkpoint in history.read_timeline(filepath, timeline):
+            timelines = checkpoints.setdefault(checkpoint["id"], [])
+            if timeline not in timelines:
+                timelines.append(timeline)
+
+    return {"checkpoints": checkpoints, "shares": {}}
+
+
+def _apply(refs, change):
+    """
+    Applies a change (see add_references...), returns the checkpoints no
+    timeline lists anymore
+    """
+    op = change["op"]
+    checkpoints = refs["checkpoints"]
+    shares = refs["shares"]
+    unlisted = []
+    if op == "add":
+        for checkpoint_id in change["ids"]:
+            timelines = checkpoints.setdefault(checkpoint_id, [])
+            if change["timeline"] not in timelines:
+                timelines.append(change["timeline"])
+    elif op == "remove":
+        for checkpoint_id in change["ids"]:
+            # Not indexed at all means the index is behind, keep the checkpoint
+            timelines = checkpoints.get(checkpoint_id)
+            if timelines is None:
+                continue
+            if change["timeline"] in timelines:
+                timelines.remove(change["timeline"])
+            if not timelines:
+                del checkpoints[checkpoint_id]
+                unlisted.append(checkpoint_id)
+    elif op == "share":
+        shares[change["timeline"]] = change["source"]
+    elif op == "forget":
+        # Timelines sharing its checkpoints share those of its source now
+        source = shares.pop(change["timeline"], None)
+        for timeline in [t for t, s in shares.items() if s == change["timeline"]]:
+            if source is None:
+                del shares[timeline]
+            else:
+                shares[timeline] = source
+    elif op == "rename":
+        timeline, new_timeline = change["timeline"], change["new_timeline"]
+        for timelines in checkpoints.values():
+            if timeline in timelines:
+                timelines[timelines.index(timeline)] = new_timeline
+        if timeline in shares:
+            shares[new_timeline] = shares.pop(timeline)
+        for other, source in shares.items():
+            if source == timeline:
+                shares[other] = new_timeline
+    else:
+        raise ValueError(f"Unknown reference change '{op}'")
+    return unlisted
+
+
+def _read_refs(filepath):
+    """The index, shared: read it under the project lock, and don't modify it"""
+    return journal.read(
+        _refs_path(filepath), lambda: build_refs(filepath), _apply
+    )
+
+
+def get_refs(filepath):
+    """
+    {checkpoint id: timelines showing it}, listing or sharing it. Reads the
+    timelines sharing checkpoints, see share_references.
+    """
+    with config.read_lock(filepath):
+        refs = _read_refs(filepath)
+        result = {
+            checkpoint_id: list(timelines)
+            for checkpoint_id, timelines in refs["checkpoints"].items()
+        }
+        for timeline in refs["shares"]:
+            for checkpoint in history.read_timeline(filepath, timeline):
+                timelines = result.setdefault(checkpoint["id"], [])
+                if timeline not in timelines:
+                    timelines.append(timeline)
+        return result
+
+
+@contextlib.contextmanager
+def edit_refs(filepath):
+    """
+    Yields the index for changes, which are journaled all at once when the
+    block exits without an exception (see journal). The project stays locked
+    for writing until then.
+    """
+    with config.write_lock(filepath):
+        with journal.editing(
+            _refs_path(filepath), lambda: build_refs(filepath), _apply
+        ) as edit:
+            yield edit
+
+
+def add_references(refs, timeline, checkpoint_ids):
+    refs.apply({"op": "add", "timeline": timeline, "ids": list(checkpoint_ids)})
+
+
+def share_references(refs, timeline, source):
+    """'timeline' was branched off 'source' with its history"""
+    refs.apply({"op": "share", "timeline": timeline, "source": source})
+
+
+def _get_sharing(shares, timeline):
+    """The timelines sharing checkpoints of 'timeline', directly or not"""
+    sharing = []
+    for other in shares:
+        source = shares[other]
+        # Renames and deletions keep the shares a tree, this is a safeguard
+        for _ in range(len(shares)):
+            if source is None or source == timeline:
+                break
+            source = shares.get(source)
+        if source == timeline and other != timeline:
+            sharing.append(other)
+    return sharing
+
+
+def remove_references(filepath, refs, timeline, checkpoint_ids):
+    """Returns the checkpoint ids no timeline shows anymore"""
+    orphans = refs.apply(
+        {"op": "remove", "timeline": timeline, "ids": list(checkpoint_ids)}
+    )
+    for other in _get_sharing(refs.data["shares"], timeline):
+        if not orphans:
+            break
+        shown = history.filter_checkpoints(filepath, other, orphans)
+        if shown:
+            add_references(refs, other, shown)
+            shown = set(shown)
+            orphans = [c for c in orphans if c not in shown]
+    return orphans
+
+
+def remove_timeline(filepath, refs, timeline):
+    """
+    Removes the references of a deleted timeline, returns the checkpoint
+    ids no timeline shows anymore
+    """
+    listed = [
+        checkpoint_id
+        for checkpoint_id, timelines in refs.data["checkpoints"].items()
+        if timeline in timelines
+    ]
+    orphans = remove_references(filepath, refs, timeline, listed)
+    refs.apply({"op": "forget", "timeline": timeline})
+    return orphans
+
+
+def rename_timeline(refs, previous_name, new_name):
+    refs.apply({"op": "rename", "timeline": previous_name, "new_timeline": new_name})
@@ -0,0 +1,250 @@
+import bisect
+import collections
+import heapq
+import re
+
+
+# Inverted index of the checkpoint descriptions of every timeline, for
+# search. Descriptions are split into lowercase words (tokens), each listing
+# the checkpoints using it. A query word matches the tokens it starts, and
+# with 'fuzzy' also the tokens sharing enough trigrams with it (typos).
+#
+# Tokens are kept sorted only when a prefix search needs it, and trigrams
+# point to tokens, not to checkpoints, so both stay small: they grow with
+# the vocabulary, not with the number of checkpoints.
+
+_TOKEN = re.compile(r"\w+")
+
+# Share of trigrams a token needs with a query word to match it fuzzily
+_FUZZY_SIMILARITY = 0.4
+
+_EXACT_SCORE = 3
+_PREFIX_SCORE = 2
+_FUZZY_SCORE = 1
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+def _trigrams(token):
+    padded = f" {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class Hit:
+    __slots__ = ("timeline", "checkpoint_id", "description", "score")
+
+    def __init__(self, timeline, checkpoint_id, description, score):
+        self.timeline = timeline
+        self.checkpoint_id = checkpoint_id
+        self.description = description
+        self.score = score
+
+
+class SearchIndex:
+    def __init__(self):
+        # Entries are numbered, (timeline, checkpoint id) tuples would have
+        # their hash computed again on every set operation
+        self._entries = {}
+        self._keys = {}
+        self._next_entry = 0
+        self.descriptions = {}
+        self.timestamps = {}
+        self._postings = {}
+        self._trigrams = collections.defaultdict(set)
+        self._sorted_tokens = None
+        # Timelines to read before the next search, see defer_timeline
+        self.deferred = set()
+
+    def __len__(self):
+        return len(self.descriptions)
+
+    def _add_token(self, token, key):
+        keys = self._postings.get(token)
+        if keys is None:
+            keys = self._postings[token] = set()
+            for trigram in _trigrams(token):
+                self._trigrams[trigram].add(token)
+            self._sorted_tokens = None
+        keys.add(key)
+
+    def _remove_token(self, token, key):
+        keys = self._postings[token]
+        keys.discard(key)
+        if keys:
+            return
+
+        del self._postings[token]
+        for trigram in _trigrams(token):
+            tokens = self._trigrams[trigram]
+            tokens.discard(token)
+            if not tokens:
+                del self._trigrams[trigram]
+        self._sorted_tokens = None
+
+    def add(self, timeline, checkpoint):
+        key = (timeline, checkpoint["id"])
+        self.remove(*key)
+
+        entry = self._next_entry
+        self._next_entry += 1
+        self._entries[key] = entry
+        self._keys[entry] = key
+
+        description = checkpoint["description"]
+        self.descriptions[entry] = description
+        # None for dates that couldn't be parsed
+        self.timestamps[entry] = checkpoint.get("timestamp") or 0
+        for token in set(tokenize(description)):
+            self._add_token(token, entry)
+
+    def remove(self, timeline, checkpoint_id):
+        entry = self._entries.pop((timeline, checkpoint_id), None)
+        if entry is None:
+            return
+        del self._keys[entry]
+        del self.timestamps[entry]
+        for token in set(tokenize(self.descriptions.pop(entry))):
+            self._remove_token(token, entry)
+
+    def edit(self, timeline, checkpoint_id, description):
+        entry = self._entries.get((timeline, checkpoint_id))
+        if entry is None:
+            return
+        checkpoint = {"id": checkpoint_id, "description": description}
+        checkpoint["timestamp"] = self.timestamps[entry]
+        self.add(timeline, checkpoint)
+
+    def apply_events(self, timeline, events):
+        """Follows the changes of a timeline, see history.append_events"""
+        for event in events:
+            op = event["op"]
+            if op == "add":
+                self.add(timeline, event["checkpoint"])
+            elif op == "edit":
+                self.edit(timeline, event["id"], event["description"])
+            elif op == "delete":
+                self.remove(timeline, event["id"])
+
+    def add_timeline(self, timeline, checkpoints):
+        self.deferred.discard(timeline)
+        for checkpoint in checkpoints:
+            self.add(timeline, checkpoint)
+
+    def defer_timeline(self, timeline):
+        """
+        Leaves a new timeline to be read when next searched, a branch with
+        its history would be read whole otherwise
+        """
+        self.deferred.add(timeline)
+
+    def _timeline_entries(self, timeline):
+        return [entry for key, entry in self._entries.items() if key[0] == timeline]
+
+    def remove_timeline(self, timeline):
+        self.deferred.discard(timeline)
+        for entry in self._timeline_entries(timeline):
+            self.remove(*self._keys[entry])
+
+    def rename_timeline(self, timeline, new_timeline):
+        if timeline in self.deferred:
+            self.deferred.remove(timeline)
+            self.deferred.add(new_timeline)
+        for entry in self._timeline_entries(timeline):
+            checkpoint = {
+                "id": self._keys[entry][1],
+                "description": self.descriptions[entry],
+                "timestamp": self.timestamps[entry],
+            }
+            self.remove(timeline, checkpoint["id"])
+            self.add(new_timeline, checkpoint)
+
+    def _prefixed(self, word):
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+
+        tokens = self._sorted_tokens
+        index = bisect.bisect_left(tokens, word)
+        while index < len(tokens) and tokens[index].startswith(word):
+            yield tokens[index]
+            index += 1
+
+    def _similar(self, word):
+        trigrams = _trigrams(word)
+        shared = collections.Counter()
+        for trigram in trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+
+        for token, count in shared.items():
+            union = len(trigrams) + len(_trigrams(token)) - count
+            if count / union >= _FUZZY_SIMILARITY:
+                yield token
+
+    def _match_word(self, word, fuzzy):
+        """
+        The checkpoints matching one query word, as [(score, keys)] from the
+        best score down. Postings are merged as sets, not key by key.
+        """
+        exact = self._postings.get(word, set())
+        prefixed = set().union(
+            *(self._postings[token] for token in self._prefixed(word) if token != word)
+        )
+        tiers = [(_EXACT_SCORE, exact), (_PREFIX_SCORE, prefixed - exact)]
+
+        if fuzzy and len(word) >= 3:
+            similar = set().union(
+                *(
+                    self._postings[token]
+                    for token in self._similar(word)
+                    if not token.startswith(word)
+                )
+            )
+            tiers.append((_FUZZY_SCORE, similar - exact - prefixed))
+
+        return [(score, keys) for score, keys in tiers if keys]
+
+    def search(self, query, fuzzy=False, limit=50):
+        """
+        The checkpoints matching every word of 'query', best matches first,
+        then newest first
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+
+        matched = [self._match_word(word, fuzzy) for word in set(words)]
+        if len(matched) == 1:
+            # Scores come in tiers already, only the best ones are sorted
+            best = []
+            for score, keys in matched[0]:
+                newest = heapq.nlargest(
+                    limit - len(best), keys, key=self.timestamps.__getitem__
+                )
+                best.extend((key, score) for key in newest)
+                if len(best) >= limit:
+                    break
+            return [self._hit(key, score) for key, score in best]
+
+        # Rarest words first, the intersection only gets smaller
+        candidates = None
+        for tiers in sorted(matched, key=lambda t: sum(len(keys) for _, keys in t)):
+            keys = set().union(*(keys for _, keys in tiers))
+            candidates = keys if candidates is None else candidates & keys
+            if not candidates:
+                return []
+
+        scores = dict.fromkeys(candidates, 0)
+        for tiers in matched:
+            for score, keys in tiers:
+                for key in keys & candidates:
+                    scores[key] += score
+
+        best = heapq.nlargest(
+            limit, scores, key=lambda key: (scores[key], self.timestamps[key])
+        )
+        return [self._hit(key, scores[key]) for key in best]
+
+    def _hit(self, entry, score):
+        timeline, checkpoint_id = self._keys[entry]
+        return Hit(timeline, checkpoint_id, self.descriptions[entry], score)
@@ -0,0 +1,105 @@
+import numpy as np
+
+
+# Orders of a timeline's checkpoints for the list. The checkpoints are
+# turned into one array per property once, each order is then a single
+# argsort instead of Python comparisons between checkpoints.
+
+TIMELINE = "TIMELINE"
+DATE = "DATE"
+SIZE = "SIZE"
+RATIO = "RATIO"
+DESCRIPTION = "DESCRIPTION"
+
+SORT_ITEMS = [
+    (TIMELINE, "Timeline", "Newest first, as they were added to the timeline"),
+    (DATE, "Date", "By the date the checkpoints were made"),
+    (SIZE, "Stored size", "By the space the checkpoints added to the store"),
+    (RATIO, "Ratio", "By stored size relative to the size of the file"),
+    (DESCRIPTION, "Description", "Alphabetically by description"),
+]
+
+# Checkpoints from before sizes were recorded
+UNKNOWN = -1
+
+
+class Columns:
+    """The checkpoints of a timeline (newest first), one array per property"""
+
+    def __init__(self, checkpoints):
+        self.ids = [c["id"] for c in checkpoints]
+        self.descriptions = [c["description"] for c in checkpoints]
+        self.dates = [c["date"] for c in checkpoints]
+        self.timestamps = self._integers(checkpoints, "timestamp")
+        # Dates that couldn't be parsed, unknown like missing ones but marked
+        self.unparsed = {
+            i for i, c in enumerate(checkpoints) if c.get("timestamp", 0) is None
+        }
+        self.sizes = self._integers(checkpoints, "size")
+        self.stored = self._integers(checkpoints, "stored")
+
+    @staticmethod
+    def _integers(checkpoints, key):
+        return np.fromiter(
+            (UNKNOWN if c.get(key) is None else c[key] for c in checkpoints),
+            dtype=np.int64,
+            count=len(checkpoints),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_checkpoint(self, index):
+        """The checkpoint at 'index', like history.read_timeline gives it"""
+        checkpoint = {
+            "id": self.ids[index],
+            "description": self.descriptions[index],
+            "date": self.dates[index],
+        }
+        for key, column in (
+            ("timestamp", self.timestamps),
+            ("size", self.sizes),
+            ("stored", self.stored),
+        ):
+            if column[index] != UNKNOWN:
+                checkpoint[key] = int(column[index])
+        if index in self.unparsed:
+            checkpoint["timestamp"] = None
+        return checkpoint
+
+    def _get_values(self, sort):
+        """Values to sort by, NaN where unknown"""
+        if sort == DATE:
+            values = self.timestamps.astype(np.float64)
+            values[self.timestamps == UNKNOWN] = np.nan
+        elif sort == SIZE:
+            values = self.stored.astype(np.float64)
+            values[self.stored == UNKNOWN] = np.nan
+        elif sort == RATIO:
+            known = (self.stored != UNKNOWN) & (self.sizes > 0)
+            values = np.full(len(self), np.nan)
+            values[known] = self.stored[known] / self.sizes[known]
+        else:
+            raise ValueError(f"Unknown sort '{sort}'")
+        return values
+
+    def get_order(self, sort, reverse=False):
+        """
+        Indices of the checkpoints in 'sort' order, smallest first unless
+        'reverse'. Checkpoints without the value go last either way.
+        """
+        if sort == TIMELINE:
+            order = np.arange(len(self))
+            return order[::-1] if reverse else order
+
+        if sort == DESCRIPTION:
+            descriptions = np.array([d.casefold() for d in self.descriptions], dtype=str)
+            order = np.argsort(descriptions, kind="stable")
+            return order[::-1] if reverse else order
+
+        values = self._get_values(sort)
+        known = np.flatnonzero(~np.isnan(values))
+        order = known[np.argsort(values[known], kind="stable")]
+        if reverse:
+            order = order[::-1]
+        return np.concatenate((order, np.flatnonzero(np.isnan(values))))
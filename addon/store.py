@@ -0,0 +1,918 @@
+import bz2
+import concurrent.futures
+import hashlib
+import json
+import lzma
+import os
+import struct
+import tempfile
+import uuid
+import zlib
+
+from . import blocks, chunking, config, copying, delta, journal
+
+
+MANIFEST_FORMAT = "checkpoint-manifest"
+MANIFEST_VERSION = 4
+
+# Codec name: (object file suffix, compressor(level), decompressor())
+CODECS = {
+    "none": ("", None, None),
+    "zlib": (".zz", zlib.compressobj, zlib.decompressobj),
+    "bz2": (".bz2", bz2.BZ2Compressor, bz2.BZ2Decompressor),
+    "lzma": (
+        ".xz",
+        lambda level: lzma.LZMACompressor(preset=level),
+        lzma.LZMADecompressor,
+    ),
+}
+DEFAULT_CODEC = "zlib"
+DEFAULT_LEVEL = 6
+
+# "store" deduplicates and compresses into the object store, "copy" keeps a
+# plain copy of the file, "auto" copies only where copies share their extents
+# with the source (reflinks), so they are instant and take no space
+STORAGE_METHODS = ("auto", "store", "copy")
+DEFAULT_STORAGE_METHOD = "auto"
+
+# Content-defined chunking parameters, in bytes
+CHUNK_MIN_SIZE = 16 * 1024
+CHUNK_MAX_SIZE = 256 * 1024
+CHUNK_BOUNDARY_MASK = 0xFF
+
+_STREAM_READ_SIZE = 64 * 1024
+_STREAM_OUTPUT_LIMIT = 1024 * 1024
+
+# Number of references to each stored object, by checkpoint manifests and
+# by the base manifests stored as objects (see _save_delta), journaled in the
+# objects folder. Objects are freed as their count drops to zero, a full
+# sweep (collect_garbage) is only for maintenance.
+_REFCOUNTS_FILE = "_refcounts.json"
+
+# Unlinks are mostly waiting on the filesystem (network shares especially),
+# so batches of them are spread over a few threads
+_REMOVE_WORKERS = 8
+
+
+def _objects_folder(filepath):
+    _paths = config.get_paths(filepath)
+    return _paths[config.PATHS_KEYS.OBJECTS_FOLDER]
+
+
+def _checkpoint_path(filepath, checkpoint_id):
+    _paths = config.get_paths(filepath)
+    return os.path.join(_paths[config.PATHS_KEYS.CHECKPOINTS_FOLDER], checkpoint_id)
+
+
+def _object_path(objects_folder, digest, codec="none"):
+    suffix = CODECS[codec][0]
+    return os.path.join(objects_folder, digest[:2], f"{digest}{suffix}")
+
+
+def _find_object(objects_folder, digest):
+    """Returns the codec an object is stored with, or None if it isn't stored"""
+    for codec in CODECS:
+        if os.path.exists(_object_path(objects_folder, digest, codec)):
+            return codec
+
+    return None
+
+
+def _compress(data, codec, level):
+    compressor = CODECS[codec][1](level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _write_object(objects_folder, digest, data, codec, level):
+    """
+    Stores 'data' under its digest.
+    Returns the codec the object ends up stored with and the bytes written.
+    """
+    stored_codec = _find_object(objects_folder, digest)
+    if stored_codec:
+        return stored_codec, 0
+
+    if CODECS[codec][1]:
+        compressed = _compress(data, codec, level)
+        # Already compressed data (e.g. compressed .blend files) is kept raw
+        if len(compressed) < len(data):
+            data = compressed
+        else:
+            codec = "none"
+
+    object_path = _object_path(objects_folder, digest, codec)
+    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+
+    temp_path = f"{object_path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, object_path)
+
+    return codec, len(data)
+
+
+def _put_object(objects_folder, data, codec, level):
+    """Stores a small object, returns its [digest, codec] reference and bytes written"""
+    digest = hashlib.sha256(data).hexdigest()
+    stored_codec, written = _write_object(objects_folder, digest, data, codec, level)
+    return [digest, stored_codec], written
+
+
+def _read_object(objects_folder, digest, codec):
+    with open(_object_path(objects_folder, digest, codec), "rb") as f:
+        data = f.read()
+
+    decompressor = CODECS[codec][2]
+    return decompressor().decompress(data) if decompressor else data
+
+
+class _ObjectWriter:
+    """Streams an object of any size into the store, compressing on the fly"""
+
+    def __init__(self, objects_folder, codec, level):
+        os.makedirs(objects_folder, exist_ok=True)
+
+        self._objects_folder = objects_folder
+        self._codec = codec
+        self._digest = hashlib.sha256()
+        self._temp_path = os.path.join(objects_folder, f"{uuid.uuid4().hex}.tmp")
+        self._file = open(self._temp_path, "wb")
+
+        compressor = CODECS[codec][1]
+        self._compressor = compressor(level) if compressor else None
+
+    def write(self, data):
+        self._digest.update(data)
+        if self._compressor:
+            data = self._compressor.compress(data)
+        self._file.write(data)
+
+    def discard(self):
+        self._file.close()
+        os.remove(self._temp_path)
+
+    def close(self):
+        """Returns the object's [digest, codec] reference and bytes written"""
+        if self._compressor:
+            self._file.write(self._compressor.flush())
+        written = self._file.tell()
+        self._file.close()
+
+        digest = self._digest.hexdigest()
+        stored_codec = _find_object(self._objects_folder, digest)
+        if stored_codec:
+            os.remove(self._temp_path)
+            return [digest, stored_codec], 0
+
+        object_path = _object_path(self._objects_folder, digest, self._codec)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(self._temp_path, object_path)
+
+        return [digest, self._codec], written
+
+
+class _ObjectReader:
+    """File-like reader over the decompressed content of a stored object"""
+
+    def __init__(self, objects_folder, digest, codec):
+        self._file = open(_object_path(objects_folder, digest, codec), "rb")
+        self._buffer = bytearray()
+
+        decompressor = CODECS[codec][2]
+        self._decompressor = decompressor() if decompressor else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._file.close()
+
+    def _decompress_more(self):
+        """Returns False once the compressed stream is exhausted"""
+        decompressor = self._decompressor
+
+        # zlib hands back the input it couldn't consume, bz2/lzma keep it
+        if hasattr(decompressor, "unconsumed_tail"):
+            data = decompressor.unconsumed_tail or self._file.read(_STREAM_READ_SIZE)
+            if not data:
+                self._buffer += decompressor.flush()
+                return False
+        elif decompressor.eof:
+            return False
+        elif decompressor.needs_input:
+            data = self._file.read(_STREAM_READ_SIZE)
+            if not data:
+                return False
+        else:
+            data = b""
+
+        self._buffer += decompressor.decompress(data, _STREAM_OUTPUT_LIMIT)
+        return True
+
+    def read(self, size):
+        if not self._decompressor:
+            return self._file.read(size)
+
+        while len(self._buffer) < size and self._decompress_more():
+            pass
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+def is_manifest(checkpoint_path):
+    """Older projects store checkpoints as plain .blend copies"""
+    with open(checkpoint_path, "rb") as f:
+        return f.read(1) == b"{"
+
+
+def read_manifest(checkpoint_path):
+    with open(checkpoint_path) as f:
+        manifest = json.load(f)
+
+    if manifest.get("format") != MANIFEST_FORMAT:
+        raise ValueError(f"'{checkpoint_path}' is not a checkpoint manifest")
+
+    return manifest
+
+
+def _read_manifest_object(objects_folder, reference):
+    return json.loads(_read_object(objects_folder, *reference))
+
+
+def _iter_manifest_chunks(manifest):
+    """Yields (digest, length, codec), version 1 manifests only had raw chunks"""
+    for entry in manifest.get("chunks", []):
+        digest, length = entry[0], entry[1]
+        codec = entry[2] if len(entry) > 2 else "none"
+        yield digest, length, codec
+
+
+class _RawSource:
+    """The file's bytes as they are"""
+
+    def __init__(self, source_file):
+        self._source_file = source_file
+        self.size = os.path.getsize(source_file)
+        self.digest = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def iter_pieces(self):
+        """Yields (data, cut_before, cut_after), cuts being forced chunk boundaries"""
+        file_digest = hashlib.sha256()
+        with open(self._source_file, "rb") as f:
+            while True:
+                data = f.read(chunking.READ_SIZE)
+                if not data:
+                    break
+                file_digest.update(data)
+                yield data, False, False
+        self.digest = file_digest.hexdigest()
+
+    def finish(self):
+        """Returns manifest fields describing the source, and bytes written"""
+        return {}, 0
+
+    def discard(self):
+        pass
+
+
+class _NormalizedSource:
+    """
+    A .blend file with its pointers zeroed (see blocks.NormalizedBlend). Chunks
+    are cut around every block large enough to be a chunk of its own, so
+    unchanged datablocks map to the same stored chunks from save to save.
+    """
+
+    def __init__(self, objects_folder, source_file, codec, level):
+        self._objects_folder = objects_folder
+        self._codec = codec
+        self._level = level
+        self._blend = blocks.NormalizedBlend(source_file)
+        self._pointers = None
+        self._pieces = None
+        self.size = self._blend.size
+        self.digest = self._blend.digest
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        # Block data are views into the file's memory map, release them first
+        self.discard()
+        self._blend.__exit__(*args)
+
+    def iter_pieces(self):
+        self.discard()
+        self._pointers = _ObjectWriter(self._objects_folder, self._codec, self._level)
+        self._pieces = self._blend.iter_pieces(self._pointers.write)
+
+        for bhead, data in self._pieces:
+            is_large = len(data) >= CHUNK_MIN_SIZE
+            if bhead:
+                yield bhead, is_large, False
+            if data:
+                yield data, False, is_large
+
+    def finish(self):
+        reference, written = self._pointers.close()
+        self._pointers = None
+        fields = {"pointers": reference, "pointer_size": self._blend.pointer_size}
+        return fields, written
+
+    def discard(self):
+        if self._pieces:
+            self._pieces.close()
+            self._pieces = None
+        if self._pointers:
+            self._pointers.discard()
+            self._pointers = None
+
+
+def _open_source(objects_folder, source_file, codec, level):
+    """Normalizes uncompressed .blend files, anything else is stored as is"""
+    try:
+        return _NormalizedSource(objects_folder, source_file, codec, level)
+    except (ValueError, struct.error, OSError):
+        return _RawSource(source_file)
+
+
+def _iter_pieces(source, progress):
+    """source.iter_pieces(), calling progress(done, total) in bytes along the way"""
+    done = 0
+    for piece in source.iter_pieces():
+        yield piece
+        if progress:
+            done += len(piece[0])
+            progress(done, source.size)
+
+
+def _save_chunks(objects_folder, source, codec, level, with_signature, progress):
+    """Stores the whole file as deduplicated chunks (a delta chain keyframe)"""
+    chunker = chunking.Chunker(CHUNK_MIN_SIZE, CHUNK_MAX_SIZE, CHUNK_BOUNDARY_MASK)
+    signature = delta.SignatureBuilder() if with_signature else None
+
+    chunks = []
+    size = 0
+    stored = 0
+
+    def add_chunks(new_chunks):
+        nonlocal size, stored
+        for chunk in new_chunks:
+            digest = hashlib.sha256(chunk).hexdigest()
+            chunk_codec, written = _write_object(
+                objects_folder, digest, chunk, codec, level
+            )
+            stored += written
+            chunks.append([digest, len(chunk), chunk_codec])
+            size += len(chunk)
+
+    for data, cut_before, cut_after in _iter_pieces(source, progress):
+        if cut_before:
+            add_chunks(chunker.finish())
+            if signature:
+                signature.cut()
+
+        add_chunks(chunker.update(data))
+        if signature:
+            signature.update(data)
+
+        if cut_after:
+            add_chunks(chunker.finish())
+            if signature:
+                signature.cut()
+    add_chunks(chunker.finish())
+
+    manifest = {
+        "method": "chunks",
+        "size": size,
+        "digest": source.digest,
+        "chain": 0,
+        "chunks": chunks,
+    }
+
+    if signature:
+        manifest["signature"], written = _put_object(
+            objects_folder, signature.finish(), codec, level
+        )
+        stored += written
+
+    fields, written = source.finish()
+    manifest.update(fields)
+    manifest["stored"] = stored + written
+    return manifest
+
+
+def _save_delta(objects_folder, source, base_manifest, codec, level, progress):
+    """
+    Stores the file as a delta against 'base_manifest'.
+    Returns None when the file changed too much for a delta to pay off.
+    """
+    base_signature = _read_object(objects_folder, *base_manifest["signature"])
+
+    writer = _ObjectWriter(objects_folder, codec, level)
+    encoder = delta.DeltaEncoder(base_signature, writer.write)
+
+    try:
+        for data, cut_before, cut_after in _iter_pieces(source, progress):
+            if cut_before:
+                encoder.cut()
+            encoder.update(data)
+            if cut_after:
+                encoder.cut()
+        signature = encoder.finish()
+    except BaseException:
+        writer.discard()
+        source.discard()
+        raise
+
+    if encoder.literal_size > encoder.size // 2:
+        writer.discard()
+        source.discard()
+        return None
+
+    delta_reference, stored = writer.close()
+    signature_reference, written = _put_object(objects_folder, signature, codec, level)
+    stored += written
+
+    # The base manifest is kept as an object of its own so the chain stays
+    # loadable after the base checkpoint itself is deleted
+    base_data = json.dumps(base_manifest, sort_keys=True).encode()
+    base_reference, written = _put_object(objects_folder, base_data, codec, level)
+    stored += written
+
+    manifest = {
+        "method": "delta",
+        "size": encoder.size,
+        "digest": source.digest,
+        "chain": base_manifest.get("chain", 0) + 1,
+        "base": base_reference,
+        "delta": delta_reference,
+        "signature": signature_reference,
+    }
+
+    fields, written = source.finish()
+    manifest.update(fields)
+    manifest["stored"] = stored + written
+    return manifest
+
+
+def _get_delta_base(filepath, base_checkpoint_id, max_delta_chain):
+    """Manifest of the checkpoint to delta against, if it can be used as a base"""
+    if not base_checkpoint_id or max_delta_chain <= 0:
+        return None
+
+    base_path = _checkpoint_path(filepath, base_checkpoint_id)
+    if not os.path.exists(base_path) or not is_manifest(base_path):
+        return None
+
+    base_manifest = read_manifest(base_path)
+    if "signature" not in base_manifest:
+        return None
+    if base_manifest.get("chain", 0) >= max_delta_chain:
+        return None
+
+    return base_manifest
+
+
+def save_checkpoint(
+    filepath,
+    source_file,
+    checkpoint_id,
+    codec=DEFAULT_CODEC,
+    level=DEFAULT_LEVEL,
+    base_checkpoint_id=None,
+    max_delta_chain=0,
+    method=DEFAULT_STORAGE_METHOD,
+    progress=None,
+):
+    """
+    Stores 'source_file' as checkpoint 'checkpoint_id'.
+    Returns the checkpoint's manifest, or for plain copies a summary with the
+    copy strategy used. Either has 'written' set to the bytes added on disk.
+
+    With 'max_delta_chain' set, the file is stored as a delta against
+    'base_checkpoint_id', unless that would make the chain of deltas to replay
+    on load longer than 'max_delta_chain', in which case a full keyframe is
+    stored. Keyframes only write chunks not already present in the store.
+    Uncompressed .blend files are stored with their pointers normalized, so
+    datablocks that didn't change are shared between checkpoints.
+    Everything is compressed as it streams, so memory use doesn't depend on
+    the file size. 'progress' is called with (done, total) bytes as the file
+    is read, and may start over when a delta is dropped for a keyframe.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression codec '{codec}'")
+    if method not in STORAGE_METHODS:
+        raise ValueError(f"Unknown storage method '{method}'")
+
+    checkpoint_path = _checkpoint_path(filepath, checkpoint_id)
+    temp_path = f"{checkpoint_path}.tmp"
+
+    if method == "copy" or (
+        method == "auto"
+        and copying.supports_reflink(os.path.dirname(checkpoint_path))
+    ):
+        strategy = copying.copy_file(source_file, temp_path)
+        os.replace(temp_path, checkpoint_path)
+        size = os.path.getsize(checkpoint_path)
+        if progress:
+            progress(size, size)
+        return {"method": "copy", "size": size, "strategy": strategy, "written": size}
+
+    _objects = _objects_folder(filepath)
+
+    # Held by any Blender instance saving or garbage collecting: objects a
+    # save writes or shares aren't referenced by a manifest until it's written
+    with config.store_lock(filepath):
+        with _open_source(_objects, source_file, codec, level) as source:
+            manifest = None
+            base_manifest = _get_delta_base(
+                filepath, base_checkpoint_id, max_delta_chain
+            )
+            if base_manifest:
+                manifest = _save_delta(
+                    _objects, source, base_manifest, codec, level, progress
+                )
+
+            if not manifest:
+                manifest = _save_chunks(
+                    _objects,
+                    source,
+                    codec,
+                    level,
+                    with_signature=max_delta_chain > 0,
+                    progress=progress,
+                )
+
+        manifest.update(
+            {
+                "format": MANIFEST_FORMAT,
+                "version": MANIFEST_VERSION,
+                "codec": codec,
+                "level": level,
+            }
+        )
+
+        # Counted before the manifest exists: a crash in between leaves
+        # objects counted, never a checkpoint with uncounted objects
+        with _edit_refcounts(filepath) as refcounts:
+            _count_references(refcounts, _objects, manifest)
+
+        with open(temp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, checkpoint_path)
+
+    written = manifest["stored"] + os.path.getsize(checkpoint_path)
+    return dict(manifest, written=written)
+
+
+class _DigestWriter:
+    def __init__(self, destination, progress=None, total=0):
+        self._destination = destination
+        self._progress = progress
+        self._total = total
+        self._done = 0
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        self._destination.write(data)
+        if self._progress:
+            self._done += len(data)
+            self._progress(self._done, self._total)
+
+
+def _write_chunks(objects_folder, manifest, destination):
+    for digest, length, codec in _iter_manifest_chunks(manifest):
+        chunk = _read_object(objects_folder, digest, codec)
+        if len(chunk) != length:
+            raise ValueError(f"Corrupted checkpoint object '{digest}'")
+        destination.write(chunk)
+
+
+def _apply_delta(objects_folder, manifest, base, destination):
+    with _ObjectReader(objects_folder, *manifest["delta"]) as delta_file:
+        delta.apply_delta(base, delta_file, destination)
+
+
+def _materialize(objects_folder, manifest, destination):
+    """
+    Writes the stored (normalized) content described by 'manifest' into the
+    'destination' file object, replaying delta chains from their keyframe
+    up. Each step only needs the one before it: whatever the chain's
+    length, two temporary files exist at a time.
+    """
+    chain = [manifest]
+    while chain[-1].get("method", "chunks") != "chunks":
+        chain.append(_read_manifest_object(objects_folder, chain[-1]["base"]))
+
+    keyframe = chain.pop()
+    if not chain:
+        _write_chunks(objects_folder, keyframe, destination)
+        return
+
+    base = tempfile.TemporaryFile(dir=objects_folder)
+    try:
+        _write_chunks(objects_folder, keyframe, base)
+        for step in reversed(chain[1:]):
+            previous, base = base, tempfile.TemporaryFile(dir=objects_folder)
+            with previous:
+                _apply_delta(objects_folder, step, previous, base)
+        _apply_delta(objects_folder, manifest, base, destination)
+    finally:
+        base.close()
+
+
+def restore_checkpoint(filepath, checkpoint_id, destination_file, progress=None):
+    """
+    Reassembles checkpoint 'checkpoint_id' into 'destination_file'.
+    Returns the copy strategy used for plain copies, None for stored ones.
+    'progress' is called with (done, total) bytes as the file is written.
+    """
+    checkpoint_path = _checkpoint_path(filepath, checkpoint_id)
+    temp_path = f"{destination_file}.tmp"
+
+    if not is_manifest(checkpoint_path):
+        strategy = copying.copy_file(checkpoint_path, temp_path)
+        os.replace(temp_path, destination_file)
+        if progress:
+            size = os.path.getsize(destination_file)
+            progress(size, size)
+        return strategy
+
+    _objects = _objects_folder(filepath)
+    manifest = read_manifest(checkpoint_path)
+
+    try:
+        with open(temp_path, "wb") as f:
+            output = _DigestWriter(f, progress, manifest["size"])
+            if "pointers" in manifest:
+                with _ObjectReader(_objects, *manifest["pointers"]) as table:
+                    patcher = blocks.PointerPatcher(
+                        output, table, manifest["pointer_size"]
+                    )
+                    _materialize(_objects, manifest, patcher)
+                    patcher.close()
+            else:
+                _materialize(_objects, manifest, output)
+
+        if output.digest.hexdigest() != manifest["digest"]:
+            raise ValueError(f"Checkpoint '{checkpoint_id}' failed to reassemble")
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    os.replace(temp_path, destination_file)
+    return None
+
+
+def get_checkpoint_size(filepath, checkpoint_id):
+    """Size of the .blend file the checkpoint restores to"""
+    checkpoint_path = _checkpoint_path(filepath, checkpoint_id)
+
+    if not is_manifest(checkpoint_path):
+        return os.path.getsize(checkpoint_path)
+
+    return read_manifest(checkpoint_path)["size"]
+
+
+def get_checkpoint_digest(filepath, checkpoint_id):
+    """
+    sha256 hex digest of the .blend file the checkpoint restores to.
+    Plain copies don't record it, they are read in full.
+    """
+    checkpoint_path = _checkpoint_path(filepath, checkpoint_id)
+
+    if is_manifest(checkpoint_path):
+        return read_manifest(checkpoint_path)["digest"]
+
+    return hash_file(checkpoint_path)
+
+
+def hash_file(path, progress=None):
+    """sha256 hex digest of a file, 'progress' gets (done, total) bytes"""
+    file_digest = hashlib.sha256()
+    total = os.path.getsize(path)
+    done = 0
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunking.READ_SIZE)
+            if not data:
+                break
+            file_digest.update(data)
+            if progress:
+                done += len(data)
+                progress(done, total)
+
+    return file_digest.hexdigest()
+
+
+def _remove_file(path):
+    size = os.path.getsize(path)
+    os.remove(path)
+    return size
+
+
+def _remove_files(paths):
+    """Returns the bytes freed"""
+    if len(paths) < 2:
+        return sum(_remove_file(path) for path in paths)
+
+    with concurrent.futures.ThreadPoolExecutor(_REMOVE_WORKERS) as executor:
+        # Consuming the results re-raises the first error
+        return sum(executor.map(_remove_file, paths))
+
+
+def remove_checkpoint(filepath, checkpoint_id):
+    """
+    Removes the checkpoint, and the stored objects no other checkpoint needs.
+    Returns the bytes freed.
+    """
+    return remove_checkpoints(filepath, [checkpoint_id])
+
+
+def remove_checkpoints(filepath, checkpoint_ids):
+    """Removes many checkpoints at once, see 'remove_checkpoint'"""
+    _objects = _objects_folder(filepath)
+    paths = [_checkpoint_path(filepath, c) for c in checkpoint_ids]
+
+    with config.store_lock(filepath):
+        manifests = [read_manifest(path) for path in paths if is_manifest(path)]
+        # Manifests first: a crash after leaves objects counted, not missing
+        freed = _remove_files(paths)
+        if not manifests:
+            return freed
+
+        unreferenced = []
+        with _edit_refcounts(filepath) as refcounts:
+            for manifest in manifests:
+                unreferenced.extend(_release_references(refcounts, _objects, manifest))
+
+        return freed + _remove_files(
+            [os.path.join(_objects, name[:2], name) for name in unreferenced]
+        )
+
+
+def _object_name(reference):
+    digest, codec = reference
+    return f"{digest}{CODECS[codec][0]}"
+
+
+def _refcounts_path(filepath):
+    return os.path.join(_objects_folder(filepath), _REFCOUNTS_FILE)
+
+
+def _apply_refcounts(refcounts, change):
+    """Applies a change to the counts, returns the objects left unreferenced"""
+    op = change["op"]
+    unreferenced = []
+    if op == "add":
+        for name in change["objects"]:
+            refcounts[name] = refcounts.get(name, 0) + 1
+    elif op == "release":
+        for name in change["objects"]:
+            # Not counted at all means the counts are behind, keep the object
+            count = refcounts.get(name)
+            if count is None:
+                continue
+            if count > 1:
+                refcounts[name] = count - 1
+            else:
+                del refcounts[name]
+                unreferenced.append(name)
+    else:
+        raise ValueError(f"Unknown reference count change '{op}'")
+    return unreferenced
+
+
+def _edit_refcounts(filepath):
+    """journal.editing of the counts, under the store lock"""
+    return journal.editing(
+        _refcounts_path(filepath), lambda: _count_objects(filepath), _apply_refcounts
+    )
+
+
+def _get_references(manifest):
+    """The [digest, codec] references of the objects 'manifest' points to"""
+    references = [
+        [digest, codec] for digest, _, codec in _iter_manifest_chunks(manifest)
+    ]
+    for key in ("signature", "delta", "pointers", "base"):
+        if key in manifest:
+            references.append(manifest[key])
+    return references
+
+
+def _count_references(refcounts, objects_folder, manifest):
+    """
+    Counts the objects 'manifest' points to, and those of its base manifest
+    if it's counted for the first time, and so on down its delta chain
+    """
+    while True:
+        names = [_object_name(r) for r in _get_references(manifest)]
+        refcounts.apply({"op": "add", "objects": names})
+        base = manifest.get("base")
+        if base is None or refcounts.data[_object_name(base)] > 1:
+            return
+        manifest = _read_manifest_object(objects_folder, base)
+
+
+def _release_references(refcounts, objects_folder, manifest):
+    """
+    Uncounts the objects 'manifest' points to, and those of its base manifest
+    if nothing refers to it anymore. Returns the objects left unreferenced.
+    """
+    unreferenced = []
+    while manifest is not None:
+        released = refcounts.apply(
+            {"op": "release", "objects": [_object_name(r) for r in _get_references(manifest)]}
+        )
+        unreferenced.extend(released)
+
+        base = manifest.get("base")
+        manifest = None
+        if base is not None and _object_name(base) in released:
+            manifest = _read_manifest_object(objects_folder, base)
+    return unreferenced
+
+
+def _count_objects(filepath):
+    """The counts from scratch, reading every manifest"""
+    _paths = config.get_paths(filepath)
+    _saves = _paths[config.PATHS_KEYS.CHECKPOINTS_FOLDER]
+    _objects = _paths[config.PATHS_KEYS.OBJECTS_FOLDER]
+
+    refcounts = journal.Edit({}, _apply_refcounts)
+    for entry in os.scandir(_saves):
+        if entry.name.endswith(".tmp"):
+            continue
+        if entry.is_file() and is_manifest(entry.path):
+            _count_references(refcounts, _objects, read_manifest(entry.path))
+    return refcounts.data
+
+
+def _mark_manifest(objects_folder, manifest, referenced):
+    """Adds the names of all objects 'manifest' depends on to 'referenced'"""
+    for digest, _, codec in _iter_manifest_chunks(manifest):
+        referenced.add(_object_name((digest, codec)))
+
+    for key in ("signature", "delta", "pointers"):
+        if key in manifest:
+            referenced.add(_object_name(manifest[key]))
+
+    if "base" in manifest:
+        base_name = _object_name(manifest["base"])
+        if base_name not in referenced:
+            referenced.add(base_name)
+            base_manifest = _read_manifest_object(objects_folder, manifest["base"])
+            _mark_manifest(objects_folder, base_manifest, referenced)
+
+
+def get_checkpoint_objects(filepath, checkpoint_id):
+    """Paths of the stored objects a checkpoint needs, none for plain copies"""
+    checkpoint_path = _checkpoint_path(filepath, checkpoint_id)
+    if not is_manifest(checkpoint_path):
+        return []
+
+    _objects = _objects_folder(filepath)
+    referenced = set()
+    _mark_manifest(_objects, read_manifest(checkpoint_path), referenced)
+    return [os.path.join(_objects, name[:2], name) for name in referenced]
+
+
+def collect_garbage(filepath):
+    """
+    Counts the references to every stored object again, from the manifests,
+    and deletes the objects nothing refers to. Returns the bytes freed.
+    Removing checkpoints already frees their objects, this full scan is for
+    maintenance, e.g. after a crash left objects behind.
+    """
+    _objects = _objects_folder(filepath)
+    if not os.path.exists(_objects):
+        return 0
+
+    with config.store_lock(filepath):
+        refcounts = _count_objects(filepath)
+        journal.rewrite(_refcounts_path(filepath), refcounts, _apply_refcounts)
+        return _sweep_objects(_objects, refcounts)
+
+
+def _sweep_objects(objects_folder, referenced):
+    unreferenced = []
+    for fanout in os.scandir(objects_folder):
+        if not fanout.is_dir():
+            continue
+        for entry in os.scandir(fanout.path):
+            if entry.name in referenced or entry.name.endswith(".tmp"):
+                continue
+            unreferenced.append(entry.path)
+
+    return _remove_files(unreferenced)
@@ -7,6 +7,7 @@ from .timeline_edit_panel import EditTimelinePanel
 from .checkpoints_list_panel import SubPanelCheckpointsList, CheckpointsList
 from .checkpoint_add_panel import SubPanelCheckpointAdd
 from .tooltip import SwitchTimelineErrorTooltip
+from .jobs_panel import SubPanelJobs
 
 
 """ORDER MATTERS"""
@@ -19,6 +20,7 @@ classes = [
     SwitchTimelineErrorTooltip,
     SubPanelCheckpointsList,
     SubPanelCheckpointAdd,
+    SubPanelJobs,
 ]
 
 
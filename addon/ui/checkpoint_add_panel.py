@@ -1,6 +1,7 @@
 import bpy
 
-from .. import ops, ui, utils
+from .. import config, model, ops, ui, utils
+from .jobs_panel import format_job_progress
 
 
 _DISK_USAGE_ICONS = ["PACKAGE", "FILE_BLEND"]
@@ -41,6 +42,12 @@ class SubPanelCheckpointAdd(utils.CheckpointsPanelMixin, bpy.types.Panel):
         checkpoint = addCol.operator(ops.AddCheckpoint.bl_idname)
         checkpoint.description = description
 
+        scheduler = config.cp_state.scheduler
+        for job in scheduler.find(ops.checkpoint_add.ADD_CHECKPOINT_JOB):
+            progress = format_job_progress(job)
+            row = layout.row()
+            row.label(text=f"Saving checkpoint: {progress}", icon="TIME")
+
         layout.separator()
 
         diskUsage = context.window_manager.checkpoint.diskUsage
@@ -53,7 +60,26 @@ class SubPanelCheckpointAdd(utils.CheckpointsPanelMixin, bpy.types.Panel):
 
         col2 = row.column()
         col2.alignment = "RIGHT"
-        col2.label(text=f"Disk space used: {_format_size(diskUsage)}")
+        subRow = col2.row(align=True)
+        subRow.label(text=f"Disk space used: {_format_size(diskUsage)}")
+        subRow.operator(ops.RecountDiskUsage.bl_idname, text="", icon="FILE_REFRESH")
+
+        # Details are only known after a recount
+        checkpoint_context = context.window_manager.checkpoint
+        if not checkpoint_context.usageTimeline:
+            return
+
+        physical = _format_size(checkpoint_context.diskUsagePhysical)
+        col = layout.column(align=True)
+        col.alignment = "RIGHT"
+        col.label(text=f"Allocated on disk: {physical}")
+
+        filepath = bpy.path.abspath("//")
+        state = model.get_project(filepath).state
+        if checkpoint_context.usageTimeline == state["current_timeline"]:
+            unique = _format_size(checkpoint_context.timelineUniqueUsage)
+            shared = _format_size(checkpoint_context.timelineSharedUsage)
+            col.label(text=f"This timeline: {unique} own, {shared} shared")
 
 
 def _format_size(size):
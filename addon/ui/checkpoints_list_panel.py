@@ -1,7 +1,6 @@
 import bpy
-from datetime import datetime
 
-from .. import ops, ui, utils
+from .. import model, ops, sorting, ui, utils
 
 _CHECKPOINT_ICON = "KEYFRAME"
 _ACTIVE_CHECKPOINT_ICON = "KEYTYPE_KEYFRAME_VEC"
@@ -35,6 +34,8 @@ class SubPanelCheckpointsList(utils.CheckpointsPanelMixin, bpy.types.Panel):
         # TODO melhorar para não travar mais as ações, e sim exibir aviso de que alterações serão perdidas
         isFileModified = utils.check_is_modified(filepath)
 
+        row_button.operator(ops.SearchCheckpoints.bl_idname, text="", icon="VIEWZOOM")
+
         if isFileModified:
             row.enabled = False
             row_button.popover(
@@ -67,14 +68,17 @@ class SubPanelCheckpointsList(utils.CheckpointsPanelMixin, bpy.types.Panel):
             maxrows=10,
         )
 
+        project = model.get_project(filepath)
+        if project.checkpoint_count > model.WINDOW_SIZE:
+            self.draw_pages(layout, checkpoint_context, project.checkpoint_count)
+
         if checkpoint_context.checkpoints:
             selectedCheckpointId = checkpoint_context.checkpoints[
                 checkpoint_context.selectedListIndex
             ]["id"]
+            selectedIndex = utils.get_selected_index(checkpoint_context)
 
-            isSelectedCheckpointInitial = (
-                selectedCheckpointId == checkpoint_context.checkpoints[-1]["id"]
-            )
+            isSelectedCheckpointInitial = selectedIndex == project.checkpoint_count - 1
 
             isSelectedCheckpointActive = (
                 selectedCheckpointId == checkpoint_context.activeCheckpointId
@@ -83,7 +87,7 @@ class SubPanelCheckpointsList(utils.CheckpointsPanelMixin, bpy.types.Panel):
             isActionButtonsEnabled = (
                 not isSelectedCheckpointActive
                 if checkpoint_context.activeCheckpointId
-                else checkpoint_context.selectedListIndex != 0
+                else selectedIndex != 0
             )
 
             isBlenderDirty = bpy.data.is_dirty
@@ -130,6 +134,34 @@ class SubPanelCheckpointsList(utils.CheckpointsPanelMixin, bpy.types.Panel):
             editCol.enabled = not isSelectedCheckpointInitial
             editCol.operator(ops.EditCheckpoint.bl_idname, text="Edit", icon=_EDIT_ICON)
 
+    def draw_pages(self, layout, checkpoint_context, count):
+        start = checkpoint_context.listOffset
+        end = min(start + model.WINDOW_SIZE, count)
+
+        row = layout.row(align=True)
+
+        newerCol = row.row(align=True)
+        newerCol.enabled = start > 0
+        newerCol.operator(
+            ops.PageCheckpoints.bl_idname, text="", icon="REW"
+        ).direction = "FIRST"
+        newerCol.operator(
+            ops.PageCheckpoints.bl_idname, text="", icon="TRIA_LEFT"
+        ).direction = "PREVIOUS"
+
+        label = row.row()
+        label.alignment = "CENTER"
+        label.label(text=f"{start + 1}-{end} of {count}")
+
+        olderCol = row.row(align=True)
+        olderCol.enabled = end < count
+        olderCol.operator(
+            ops.PageCheckpoints.bl_idname, text="", icon="TRIA_RIGHT"
+        ).direction = "NEXT"
+        olderCol.operator(
+            ops.PageCheckpoints.bl_idname, text="", icon="FF"
+        ).direction = "LAST"
+
 
 class CheckpointsList(bpy.types.UIList):
     """List of checkpoints of the current project."""
@@ -142,7 +174,12 @@ class CheckpointsList(bpy.types.UIList):
         activeCheckpointId = context.window_manager.checkpoint.activeCheckpointId
 
         isActiveCheckpoint = (
-            item.id == activeCheckpointId if activeCheckpointId else index == 0
+            item.id == activeCheckpointId
+            if activeCheckpointId
+            else model.get_project(bpy.path.abspath("//")).to_index(
+                data.listOffset + index
+            )
+            == 0
         )
 
         col1 = row.column()
@@ -151,22 +188,31 @@ class CheckpointsList(bpy.types.UIList):
             icon=_ACTIVE_CHECKPOINT_ICON if isActiveCheckpoint else _CHECKPOINT_ICON,
         )
 
-        # Get last mofied string
-        checkpoint_time = datetime.strptime(item.date, utils.CP_TIME_FORMAT)
-        lastModified = utils.getLastModifiedStr(checkpoint_time)
-
         col2 = row.column()
         col2.alignment = "RIGHT"
         col2.ui_units_x = 2.5
-        col2.label(text=lastModified)
+        col2.label(text=_get_sort_label(data.listSort, item))
 
     def draw_filter(self, context, layout):
+        checkpoint_context = context.window_manager.checkpoint
+
         row = layout.row()
 
         subrow = row.row(align=True)
         subrow.prop(self, "filter_name", text="Search")
         subrow.prop(self, "use_filter_invert", text="", icon="ARROW_LEFTRIGHT")
 
+        # Sorted over the whole timeline by the model, not just the rows
+        # the list holds, see model.ProjectModel.set_sort
+        row = layout.row(align=True)
+        row.prop(checkpoint_context, "listSort", text="")
+        row.prop(
+            checkpoint_context,
+            "listSortReverse",
+            text="",
+            icon="SORT_DESC" if checkpoint_context.listSortReverse else "SORT_ASC",
+        )
+
     def filter_items(self, context, data, propname):
         checkpoints = getattr(data, propname)
         helper_funcs = bpy.types.UI_UL_list
@@ -183,3 +229,14 @@ class CheckpointsList(bpy.types.UIList):
             )
 
         return flt_flags, []
+
+
+def _get_sort_label(sort, item):
+    """What the list shows next to the description, the value sorted by"""
+    if sort == sorting.SIZE:
+        return f"{item.stored:.2f} MB" if item.stored >= 0 else "-"
+    if sort == sorting.RATIO:
+        if item.stored < 0 or item.size <= 0:
+            return "-"
+        return f"{item.stored / item.size:.0%}"
+    return item.age
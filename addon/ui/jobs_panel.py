@@ -0,0 +1,92 @@
+import bpy
+
+from .. import config, jobs, ops, ui, utils
+
+
+_STATE_ICONS = {
+    jobs.QUEUED: "SORTTIME",
+    jobs.RUNNING: "TIME",
+    jobs.FINISHED: "CHECKMARK",
+    jobs.FAILED: "ERROR",
+    jobs.CANCELLED: "CANCEL",
+}
+
+
+def format_job_progress(job):
+    if job.state == jobs.QUEUED:
+        return "queued"
+    if job.is_cancelling:
+        return "cancelling"
+    if job.state == jobs.FAILED:
+        return str(job.error)
+    if job.state != jobs.RUNNING:
+        return job.state.lower()
+    if not job.total:
+        return "running"
+
+    throughput = job.throughput / (1024 * 1024)
+    return f"{job.progress:.0%} ({throughput:.1f} MB/s)"
+
+
+class SubPanelJobs(utils.CheckpointsPanelMixin, bpy.types.Panel):
+    """
+    Running, queued and recently finished background jobs, and the time
+    spent waiting for other Blender instances using the project
+    """
+
+    bl_idname = "CHECKPOINT_PT_jobs"
+    bl_parent_id = ui.MainPanel.bl_idname
+    bl_label = "Jobs"
+
+    @classmethod
+    def poll(cls, context):
+        scheduler = config.cp_state.scheduler
+        return context.window_manager.checkpoint.isInitialized and (
+            scheduler.has_jobs() or scheduler.history or _is_lock_contended()
+        )
+
+    def draw(self, context):
+        layout = self.layout
+        scheduler = config.cp_state.scheduler
+
+        if _is_lock_contended():
+            stats = config.get_lock_stats(bpy.path.abspath("//"))
+            col = layout.column(align=True)
+            col.label(
+                text=f"Waited for other instances: {stats.wait_time:.1f}s"
+                f" ({stats.contended}x, longest {stats.max_wait:.1f}s)",
+                icon="LOCKED",
+            )
+            if stats.timeouts:
+                col.label(text=f"Gave up waiting {stats.timeouts}x", icon="ERROR")
+            layout.separator()
+
+        col = layout.column(align=True)
+        for job in scheduler.jobs:
+            row = col.row(align=True)
+            row.label(text=job.label, icon=_STATE_ICONS[job.state])
+            row.label(text=format_job_progress(job))
+
+            cancelCol = row.column(align=True)
+            cancelCol.enabled = job.cancellable and not job.is_cancelling
+            cancel = cancelCol.operator(ops.CancelJob.bl_idname, text="", icon="X")
+            cancel.job_id = job.id
+
+        if not scheduler.history:
+            return
+
+        layout.separator()
+
+        col = layout.column(align=True)
+        for job in reversed(scheduler.history):
+            row = col.row(align=True)
+            row.label(text=job.label, icon=_STATE_ICONS[job.state])
+            row.label(text=format_job_progress(job))
+
+        row = layout.row()
+        row.operator(ops.ClearJobHistory.bl_idname)
+
+
+def _is_lock_contended():
+    stats = config.get_lock_stats(bpy.path.abspath("//"))
+    return bool(stats.contended or stats.timeouts)
@@ -2,7 +2,10 @@ import bpy
 
 from ... import addon_updater_ops
 
-from .. import ops, config, utils
+from .. import ops, config, model, utils
+
+
+_MB = 1024 * 1024
 
 
 class MainPanel(utils.CheckpointsPanelMixin, bpy.types.Panel):
@@ -19,9 +22,9 @@ class MainPanel(utils.CheckpointsPanelMixin, bpy.types.Panel):
 
         checkpoint_context = context.window_manager.checkpoint
 
-        root_folder = config.has_root_folder(filepath)
+        project = model.get_project(filepath)
 
-        if not root_folder:
+        if not project.has_root_folder:
             checkpoint_context.isInitialized = False
             row = layout.row()
             row.operator(
@@ -36,7 +39,7 @@ class MainPanel(utils.CheckpointsPanelMixin, bpy.types.Panel):
                 row.label(text="You must save your project first")
             return
 
-        state = config.get_state(filepath)
+        state = project.state
         if state["filename"] != filename:
             checkpoint_context.isInitialized = False
 
@@ -65,15 +68,19 @@ class MainPanel(utils.CheckpointsPanelMixin, bpy.types.Panel):
             )
         else:
             checkpoint_context.isInitialized = True
-            addCheckpointsToList()
+            project.set_sort(
+                checkpoint_context.listSort, checkpoint_context.listSortReverse
+            )
+            project.set_window(checkpoint_context.listOffset)
+            if config.cp_state.list_version != (project, project.version):
+                addCheckpointsToList(project)
 
         addon_updater_ops.update_notice_box_ui(self, context)
 
 
-def addCheckpointsToList():
-    """Add checkpoints to list"""
-    filepath = bpy.path.abspath("//")
-    state = config.get_state(filepath)
+def addCheckpointsToList(project):
+    """Add the checkpoints of the model's window to list"""
+    state = project.state
 
     checkpoint_context = bpy.context.window_manager.checkpoint
 
@@ -87,10 +94,22 @@ def addCheckpointsToList():
     checkpoint_context.activeCheckpointId = state["active_checkpoint"]
     checkpoint_context.diskUsage = state["disk_usage"]
 
-    current_timeline = state["current_timeline"]
-    checkpoint = utils.get_checkpoints(filepath, current_timeline)
-    for cp in checkpoint:
+    for cp in project.checkpoints:
         item = checkpoints.add()
         item.id = cp["id"]
         item.date = cp["date"]
+        timestamp = cp.get("timestamp")
+        item.timestamp = "" if timestamp is None else str(timestamp)
         item.description = cp["description"]
+        item.size = cp["size"] / _MB if "size" in cp else -1
+        item.stored = cp["stored"] / _MB if "stored" in cp else -1
+
+    utils.refresh_relative_dates(checkpoints)
+
+    # The window is moved back when the timeline got shorter
+    if checkpoint_context.listOffset != project.window_start:
+        checkpoint_context.listOffset = project.window_start
+    if checkpoint_context.selectedListIndex >= len(checkpoints):
+        checkpoint_context.selectedListIndex = max(len(checkpoints) - 1, 0)
+
+    config.cp_state.list_version = (project, project.version)
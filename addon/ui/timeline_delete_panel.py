@@ -1,6 +1,6 @@
 import bpy
 
-from .. import config, ops, utils
+from .. import config, model, ops, utils
 
 
 class DeleteTimelinePanel(utils.CheckpointsPanelMixin, bpy.types.Panel):
@@ -12,7 +12,7 @@ class DeleteTimelinePanel(utils.CheckpointsPanelMixin, bpy.types.Panel):
 
     def draw(self, context):
         filepath = bpy.path.abspath("//")
-        state = config.get_state(filepath)
+        state = model.get_project(filepath).state
         currentTimeline = state.get("current_timeline")
 
         is_original_timeline = currentTimeline == config.PATHS_KEYS.ORIGINAL_TL_FILE
@@ -42,5 +42,13 @@ class DeleteTimelinePanel(utils.CheckpointsPanelMixin, bpy.types.Panel):
                 icon=utils.DELETE_ICON,
             )
 
+            checkpoint_context = context.window_manager.checkpoint
+            if checkpoint_context.usageTimeline == currentTimeline:
+                row = layout.row()
+                row.label(
+                    text=f"Frees about {checkpoint_context.timelineUniqueUsage:.2f} MB",
+                    icon="PACKAGE",
+                )
+
             row = layout.row()
             row.operator(ops.DeleteTimeline.bl_idname, text="Delete Timeline")
@@ -1,6 +1,6 @@
 import bpy
 
-from .. import config, ops, utils
+from .. import config, model, ops, utils
 
 
 class EditTimelinePanel(utils.CheckpointsPanelMixin, bpy.types.Panel):
@@ -12,7 +12,7 @@ class EditTimelinePanel(utils.CheckpointsPanelMixin, bpy.types.Panel):
 
     def draw(self, context):
         filepath = bpy.path.abspath("//")
-        state = config.get_state(filepath)
+        state = model.get_project(filepath).state
         currentTimeline = state.get("current_timeline")
 
         is_original_timeline = currentTimeline == config.PATHS_KEYS.ORIGINAL_TL_FILE
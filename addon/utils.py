@@ -1,18 +1,16 @@
+import contextlib
 import os
 import bpy
-import json
-import shutil
 
 import re
 from unicodedata import normalize
 
 from datetime import datetime, timezone
 
-from . import config
+from . import accounting, config, history, jobs, locking, model, search, store
 
 
-# Format: Fri Sep  2 19:36:07 2022 +0530
-CP_TIME_FORMAT = "%c %z"
+CP_TIME_FORMAT = config.CP_TIME_FORMAT
 
 TIMELINE_ICON = "WINDOW"
 DELETE_ICON = "TRASH"
@@ -24,6 +22,14 @@ TIMELINE_ACTION_OPTIONS_2_83_POLYFILL = (
 )
 TIMELINES_DEFAULT_POLYFILL_2_83 = None if (2, 84, 0) > bpy.app.version else -1
 
+_JOBS_POLL_INTERVAL = 0.2
+
+LOAD_CHECKPOINT_JOB = "LOAD_CHECKPOINT"
+_HASH_JOB = "HASH_WORKING_FILE"
+_COMPACT_JOB = "COMPACT_TIMELINES"
+_MAX_FILE_DIGESTS = 16
+_MAX_CHECKPOINT_DIGESTS = 64
+
 
 class CheckpointsPanelMixin:
     bl_space_type = "VIEW_3D"
@@ -38,6 +44,53 @@ def prefs(context=None):
     return bpy.context.preferences.addons.get(addon_name, None).preferences
 
 
+def get_compression_settings():
+    """Codec and level new checkpoints are stored with"""
+    preferences = prefs()
+    return preferences.compressionCodec.lower(), preferences.compressionLevel
+
+
+def get_storage_method():
+    return prefs().storageMethod.lower()
+
+
+def tag_redraw():
+    """Redraws the 3D views, where the addon's panels live"""
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == CheckpointsPanelMixin.bl_space_type:
+                area.tag_redraw()
+
+
+def submit_job(job, tag=None):
+    """Queues a jobs.Job, its 'on_finish' will be called on the main thread"""
+    config.cp_state.scheduler.submit(job, tag)
+    if not bpy.app.timers.is_registered(_poll_jobs):
+        # Persistent: jobs often outlive the file, when a checkpoint is
+        # loaded or the timeline switched while they run
+        bpy.app.timers.register(
+            _poll_jobs, first_interval=_JOBS_POLL_INTERVAL, persistent=True
+        )
+    return job
+
+
+def stop_polling_jobs():
+    if bpy.app.timers.is_registered(_poll_jobs):
+        bpy.app.timers.unregister(_poll_jobs)
+
+
+def _poll_jobs():
+    scheduler = config.cp_state.scheduler
+    try:
+        scheduler.poll()
+    finally:
+        tag_redraw()
+
+    if scheduler.has_jobs():
+        return _JOBS_POLL_INTERVAL
+    return None
+
+
 def slugify(text):
     """
     Simplifies a string, converts it to lowercase, removes non-word characters
@@ -50,16 +103,19 @@ def slugify(text):
 
 
 def get_disk_usage(filepath):
-    total_size = 0
-    for dirpath, dirnames, filenames in os.walk(filepath):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            # skip if it is symbolic link
-            if not os.path.islink(fp):
-                total_size += os.path.getsize(fp)
+    """Logical size of everything under 'filepath', in MB. Walks the whole tree"""
+    return accounting.get_folder_usage(filepath).logical / (1024 * 1024)
+
+
+def add_disk_usage(filepath, size):
+    """Updates the running disk usage with the bytes an operation added (or freed, if negative)"""
+    with config.edit_state(filepath) as state:
+        update_disk_usage(state, size)
 
-    # Convert to MB
-    return total_size / (1024 * 1024)
+
+def update_disk_usage(state, size):
+    """add_disk_usage on a state being edited, see config.edit_state"""
+    state["disk_usage"] = max(state["disk_usage"] + size / (1024 * 1024), 0)
 
 
 def getLastModifiedStr(date):
@@ -79,16 +135,9 @@ def getLastModifiedStr(date):
         hours = delta.seconds // 3600
         if hours <= 0:
             mins = (delta.seconds // 60) % 60
+            # Labels are refreshed once a minute, seconds would be stale
             if mins <= 0:
-                secs = delta.seconds - hours * 3600 - mins * 60
-                if secs <= 0:
-                    output = "now"
-
-                # Secs
-                elif secs == 1:
-                    output = f"{secs} sec"
-                else:
-                    output = f"{secs} sec"
+                output = "now"
 
             # Mins
             elif mins == 1:
@@ -111,53 +160,338 @@ def getLastModifiedStr(date):
     return output
 
 
+def get_relative_date(timestamp):
+    """getLastModifiedStr for a checkpoint "timestamp", empty if unknown"""
+    if timestamp is None:
+        return ""
+    return getLastModifiedStr(datetime.fromtimestamp(timestamp, timezone.utc))
+
+
+def refresh_relative_dates(checkpoints):
+    """Updates the 'age' labels of the checkpoints list items"""
+    for item in checkpoints:
+        age = get_relative_date(int(item.timestamp) if item.timestamp else None)
+        if item.age != age:
+            item.age = age
+
+
 def get_checkpoints(filepath, timeline=config.PATHS_KEYS.ORIGINAL_TL_FILE):
-    _paths = config.get_paths(filepath)
+    return history.read_timeline(filepath, timeline)
+
+
+def _get_list_project():
+    """The model the list shows, if any, up to date with the last changes"""
+    project = config.cp_state.project
+    if project is not None:
+        project.refresh()
+    return project
+
+
+def get_selected_index(checkpoint_context):
+    """The selected checkpoint's index in the timeline, not in the list"""
+    row = checkpoint_context.listOffset + checkpoint_context.selectedListIndex
+    project = _get_list_project()
+    return project.to_index(row) if project else row
+
 
-    timeline_path = os.path.join(_paths[config.PATHS_KEYS.TIMELINES_FOLDER], timeline)
-    with open(timeline_path) as f:
-        timeline_history = json.load(f)
+def select_row(checkpoint_context, row):
+    """Selects the 'row'-th row of the list, moving its window to it"""
+    start = row - row % model.WINDOW_SIZE
+    checkpoint_context.listOffset = start
+    checkpoint_context.selectedListIndex = row - start
 
-        return timeline_history
+
+def select_checkpoint(checkpoint_context, index):
+    """Selects the 'index'-th checkpoint of the timeline, wherever the list sorts it"""
+    project = _get_list_project()
+    select_row(checkpoint_context, project.to_row(index) if project else index)
 
 
 def listall_timelines(filepath):
-    _paths = config.get_paths(filepath)
-    return os.listdir(_paths[config.PATHS_KEYS.TIMELINES_FOLDER])
+    return history.list_timelines(filepath)
 
 
-def switch_timeline(filepath, timeline=config.PATHS_KEYS.ORIGINAL_TL_FILE):
+def record_timeline_events(filepath, timeline, events):
+    """Applies 'events' to the timeline, compacting the project's later if needed"""
+    with update_search_index(filepath) as index:
+        is_due = history.append_events(filepath, timeline, events)
+        if index is not None:
+            index.apply_events(timeline, events)
+
+    if is_due:
+        if config.cp_state.scheduler.find(_COMPACT_JOB, filepath):
+            return
+
+        job = jobs.Job(
+            _COMPACT_JOB,
+            "Compact timelines",
+            lambda job: history.compact_graph(filepath),
+            priority=jobs.PRIORITY_MAINTENANCE,
+        )
+        submit_job(job, filepath)
+
+
+def get_timeline_catalogue(filepath):
+    """
+    The timeline names of the project, listed once and kept until a timeline
+    is added, renamed or deleted (see invalidate_timeline_catalogue). Also
+    holds the timeline selector items built from them.
+    """
+    catalogue = config.cp_state.timeline_catalogue
+    if catalogue is None or catalogue["filepath"] != filepath:
+        catalogue = {
+            "filepath": filepath,
+            "timelines": sorted(listall_timelines(filepath)),
+            "items": None,
+            "items_timeline": None,
+        }
+        config.cp_state.timeline_catalogue = catalogue
+
+    return catalogue
+
+
+def _get_timelines_stamp(filepath):
+    """Changes whenever a timeline is written, by any Blender instance"""
     _paths = config.get_paths(filepath)
+    _metadata = _paths[config.PATHS_KEYS.METADATA_FILE]
+    files = [
+        _paths[config.PATHS_KEYS.TIMELINES_FOLDER],
+        history.get_graph_path(filepath),
+        _metadata,
+        f"{_metadata}-wal",
+    ]
+
+    stamp = []
+    for path in files:
+        try:
+            stat = os.stat(path)
+            stamp.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return stamp
+
+
+def get_search_index(filepath):
+    """
+    The search index of the descriptions of every timeline (see search),
+    built on first use. The addon's own changes update it (see
+    update_search_index), others get it built again.
+    """
+    cached = config.cp_state.search_index
+    stamp = _get_timelines_stamp(filepath)
+    if cached is None or cached["filepath"] != filepath or cached["stamp"] != stamp:
+        index = search.SearchIndex()
+        for timeline in listall_timelines(filepath):
+            index.add_timeline(timeline, get_checkpoints(filepath, timeline))
+        cached = {"filepath": filepath, "stamp": stamp, "index": index}
+        config.cp_state.search_index = cached
+
+    index = cached["index"]
+    for timeline in list(index.deferred):
+        index.add_timeline(timeline, get_checkpoints(filepath, timeline))
+    return index
+
+
+@contextlib.contextmanager
+def update_search_index(filepath):
+    """
+    Yields the search index for the changes the block makes to the
+    timelines, or None if it isn't built or is out of date anyway. An index
+    the block fails to update is dropped.
+    """
+    cached = config.cp_state.search_index
+    config.cp_state.search_index = None
+    if (
+        cached is None
+        or cached["filepath"] != filepath
+        or cached["stamp"] != _get_timelines_stamp(filepath)
+    ):
+        yield None
+        return
+
+    yield cached["index"]
+    cached["stamp"] = _get_timelines_stamp(filepath)
+    config.cp_state.search_index = cached
+
+
+def convert_project_metadata():
+    """Moves the open project to SQLite if the preferences ask for it"""
+    filepath = bpy.path.abspath("//")
+    if (
+        prefs().metadataBackend != "SQLITE"
+        or not bpy.data.is_saved
+        or not config.has_root_folder(filepath)
+        or config.uses_database(filepath)
+    ):
+        return
+
+    history.convert_to_database(filepath)
+    config.bump_generation()
+
+
+def invalidate_timeline_catalogue():
+    config.cp_state.timeline_catalogue = None
+
+
+def is_loading():
+    """Whether a checkpoint is being loaded, see start_load_checkpoint"""
+    return bool(config.cp_state.scheduler.find(LOAD_CHECKPOINT_JOB))
+
+
+def start_load_checkpoint(filepath, checkpoint_id):
+    """
+    Reassembles the checkpoint in a background job, next to the working file.
+    Replacing the working file and reverting happen on the main thread once
+    it's done, so nothing the user does in the meantime gets mixed in.
+    """
     state = config.get_state(filepath)
+    destination_file = os.path.join(filepath, state["filename"])
+    restored_file = f"{destination_file}.load.tmp"
+
+    def finish(job):
+        if job.state != jobs.FINISHED:
+            return
+
+        # Already in place if the state was busy at a previous try
+        if os.path.exists(restored_file):
+            os.replace(restored_file, destination_file)
+        config.set_state(filepath, "active_checkpoint", checkpoint_id)
+        bpy.ops.wm.revert_mainfile()
+
+    job = jobs.Job(
+        LOAD_CHECKPOINT_JOB,
+        "Load checkpoint",
+        lambda job: store.restore_checkpoint(
+            filepath, checkpoint_id, restored_file, job.update
+        ),
+        priority=jobs.PRIORITY_INTERACTIVE,
+        on_finish=finish,
+    )
+    return submit_job(job)
 
-    config.set_state(filepath, "current_timeline", timeline)
 
-    timeline_path = os.path.join(_paths[config.PATHS_KEYS.TIMELINES_FOLDER], timeline)
-    with open(timeline_path) as f:
-        timeline_history = json.load(f)
-        first_checkpoint = timeline_history[0]
-        checkpoint = os.path.join(
-            _paths[config.PATHS_KEYS.CHECKPOINTS_FOLDER], first_checkpoint["id"]
-        )
+def switch_timeline(filepath, timeline=config.PATHS_KEYS.ORIGINAL_TL_FILE):
+    """
+    Makes 'timeline' current and loads its newest checkpoint in a job (see
+    start_load_checkpoint). The state switches right away: the timeline
+    switched from may be gone already.
+    """
+    (first_checkpoint,) = history.read_timeline(filepath, timeline, count=1)
+
+    with config.edit_state(filepath) as state:
+        state["current_timeline"] = timeline
+        state["active_checkpoint"] = first_checkpoint["id"]
+
+    return start_load_checkpoint(filepath, first_checkpoint["id"])
 
-        config.set_state(filepath, "active_checkpoint", first_checkpoint["id"])
 
-        filename = state["filename"]
-        destination_file = os.path.join(filepath, filename)
-        shutil.copy(checkpoint, destination_file)
+def get_file_fingerprint(path):
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+def remember_file_digest(fingerprint, digest):
+    # Only the working file's recent versions are worth keeping
+    if len(config.cp_state.file_digests) >= _MAX_FILE_DIGESTS:
+        config.cp_state.file_digests.clear()
+    config.cp_state.file_digests[fingerprint] = digest
+
+
+def remember_checkpoint_digest(checkpoint_id, digest):
+    # Only those of the checkpoints loaded or added lately are compared
+    if len(config.cp_state.checkpoint_digests) >= _MAX_CHECKPOINT_DIGESTS:
+        config.cp_state.checkpoint_digests.clear()
+    config.cp_state.checkpoint_digests[checkpoint_id] = digest
 
 
 def check_is_modified(filepath):
+    """
+    Whether the working file differs from the active checkpoint. The answer
+    is cached until the file is saved or loaded or the state changes, so
+    redraws don't touch the disk.
+    """
+    cache = config.cp_state.modified_cache
+    if cache is not None and cache["filepath"] != filepath:
+        cache = None
+    if cache is not None and not cache["stale"]:
+        return cache["is_modified"]
+
+    try:
+        config.cp_state.modified_cache = _compare_with_checkpoint(filepath)
+    except locking.LockTimeout:
+        # Another instance holds the project: the last answer stands, or
+        # unmodified without one, until a next redraw can read the state
+        return cache is not None and cache["is_modified"]
+
+    return config.cp_state.modified_cache["is_modified"]
+
+
+def invalidate_is_modified():
+    """Compares again at the next check, keeping the answer until then"""
+    cache = config.cp_state.modified_cache
+    if cache is not None:
+        cache["stale"] = True
+
+
+def _compare_with_checkpoint(filepath):
     state = config.get_state(filepath)
-    _paths = config.get_paths(filepath)
-    _saves = _paths[config.PATHS_KEYS.CHECKPOINTS_FOLDER]
 
     filename = state["filename"]
     active_checkpoint = state["active_checkpoint"]
 
     source_file = os.path.join(filepath, filename)
-    active_checkpoint_file = os.path.join(_saves, active_checkpoint)
-
-    stat1 = os.stat(source_file)
-    stat2 = os.stat(active_checkpoint_file)
-    return stat1.st_size != stat2.st_size
+    fingerprint = get_file_fingerprint(source_file)
+    checkpoint_size = store.get_checkpoint_size(filepath, active_checkpoint)
+
+    cache = {
+        "filepath": filepath,
+        "is_modified": fingerprint[1] != checkpoint_size,
+        "stale": False,
+    }
+    if cache["is_modified"]:
+        return cache
+
+    # Same size, only the content can tell. Until it's hashed, the file is
+    # assumed unmodified like a size check alone would
+    file_digest = config.cp_state.file_digests.get(fingerprint)
+    checkpoint_digest = config.cp_state.checkpoint_digests.get(active_checkpoint)
+    if file_digest and checkpoint_digest:
+        cache["is_modified"] = file_digest != checkpoint_digest
+    else:
+        _start_hashing(filepath, fingerprint, active_checkpoint)
+
+    return cache
+
+
+def _start_hashing(filepath, fingerprint, checkpoint_id):
+    tag = (fingerprint, checkpoint_id)
+    if config.cp_state.scheduler.find(_HASH_JOB, tag):
+        return
+
+    def work(job):
+        file_digest = config.cp_state.file_digests.get(fingerprint)
+        if file_digest is None:
+            file_digest = store.hash_file(fingerprint[0], job.update)
+
+        checkpoint_digest = config.cp_state.checkpoint_digests.get(checkpoint_id)
+        if checkpoint_digest is None:
+            checkpoint_digest = store.get_checkpoint_digest(filepath, checkpoint_id)
+
+        return file_digest, checkpoint_digest
+
+    def finish(job):
+        if job.state != jobs.FINISHED:
+            return
+        file_digest, checkpoint_digest = job.result
+        remember_file_digest(fingerprint, file_digest)
+        remember_checkpoint_digest(checkpoint_id, checkpoint_digest)
+        invalidate_is_modified()
+
+    job = jobs.Job(
+        _HASH_JOB,
+        "Compare with checkpoint",
+        work,
+        priority=jobs.PRIORITY_MAINTENANCE,
+        on_finish=finish,
+    )
+    submit_job(job, tag)
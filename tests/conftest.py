@@ -0,0 +1,52 @@
+import json
+import os
+import sys
+import types
+
+import pytest
+
+
+# The addon's modules are imported as a package of their own, without the
+# Blender add-on around them: those tested here don't use bpy
+_ADDON_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "addon")
+
+_package = types.ModuleType("checkpoint_addon")
+_package.__path__ = [os.path.abspath(_ADDON_FOLDER)]
+sys.modules.setdefault("checkpoint_addon", _package)
+
+from checkpoint_addon import config  # noqa: E402
+
+
+def _make_project(filepath):
+    _paths = config.get_paths(filepath)
+    for key in (
+        config.PATHS_KEYS.ROOT_FOLDER,
+        config.PATHS_KEYS.TIMELINES_FOLDER,
+        config.PATHS_KEYS.CHECKPOINTS_FOLDER,
+        config.PATHS_KEYS.OBJECTS_FOLDER,
+    ):
+        os.mkdir(_paths[key])
+
+    with open(_paths[config.PATHS_KEYS.PERSISTED_STATE_FILE], "w") as f:
+        json.dump(
+            {
+                "current_timeline": config.PATHS_KEYS.ORIGINAL_TL_FILE,
+                "active_checkpoint": None,
+                "disk_usage": 0,
+                "filename": "project.blend",
+            },
+            f,
+        )
+    return filepath
+
+
+@pytest.fixture
+def make_project(tmp_path_factory):
+    """Creates empty JSON projects, see 'project'"""
+    return lambda: _make_project(f"{tmp_path_factory.mktemp('project')}{os.sep}")
+
+
+@pytest.fixture
+def project(tmp_path):
+    """An empty JSON project's folder, with the addon's folders and state"""
+    return _make_project(f"{tmp_path}{os.sep}")
@@ -0,0 +1,187 @@
+import os
+
+import pytest
+
+from checkpoint_addon import config, history
+
+
+ORIGINAL = config.PATHS_KEYS.ORIGINAL_TL_FILE
+
+
+def _checkpoint(index):
+    return {
+        "id": f"{index}.blend",
+        "description": f"Checkpoint {index}",
+        "date": "01/01/24 12:00",
+        "timestamp": 1704110400 + index,
+        "size": 1000 + index,
+        "stored": 100 + index,
+    }
+
+
+def _history(count):
+    """Checkpoints 'count' - 1 to 0, newest first"""
+    return [_checkpoint(i) for i in range(count - 1, -1, -1)]
+
+
+def _ids(filepath, timeline, start=0, count=None):
+    checkpoints = history.read_timeline(filepath, timeline, start, count)
+    return [c["id"] for c in checkpoints]
+
+
+def _description(filepath, timeline, index):
+    (checkpoint,) = history.read_timeline(filepath, timeline, index, 1)
+    return checkpoint["description"]
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def timeline_project(request, project):
+    """A project with 'Original.json' listing checkpoints 4 to 0"""
+    history.write_timeline(project, ORIGINAL, _history(5))
+    if request.param == "sqlite":
+        history.convert_to_database(project)
+    return project
+
+
+def test_events(timeline_project):
+    history.append_events(
+        timeline_project,
+        ORIGINAL,
+        [
+            history.add_checkpoint(_checkpoint(5)),
+            history.edit_checkpoint("2.blend", "Edited"),
+            history.delete_checkpoint("3.blend"),
+        ],
+    )
+
+    assert _ids(timeline_project, ORIGINAL) == [
+        "5.blend",
+        "4.blend",
+        "2.blend",
+        "1.blend",
+        "0.blend",
+    ]
+    assert history.read_timeline(timeline_project, ORIGINAL, 0, 1) == [_checkpoint(5)]
+    assert _description(timeline_project, ORIGINAL, 2) == "Edited"
+    assert _ids(timeline_project, ORIGINAL, 1, 2) == ["4.blend", "2.blend"]
+    assert history.count_checkpoints(timeline_project, ORIGINAL) == 5
+    assert history.find_checkpoint(timeline_project, ORIGINAL, "2.blend") == 2
+    assert history.find_checkpoint(timeline_project, ORIGINAL, "3.blend") is None
+
+
+def test_branch_with_history(timeline_project):
+    history.branch_timeline(timeline_project, ORIGINAL, "branch.json", 1, True)
+    history.append_events(
+        timeline_project,
+        "branch.json",
+        [
+            history.add_checkpoint(_checkpoint(10)),
+            history.edit_checkpoint("1.blend", "Only on the branch"),
+            history.delete_checkpoint("2.blend"),
+        ],
+    )
+
+    assert _ids(timeline_project, "branch.json") == [
+        "10.blend",
+        "3.blend",
+        "1.blend",
+        "0.blend",
+    ]
+    assert _description(timeline_project, "branch.json", 2) == "Only on the branch"
+    assert history.filter_checkpoints(
+        timeline_project, "branch.json", ["4.blend", "3.blend", "2.blend"]
+    ) == ["3.blend"]
+
+    # The timeline branched from doesn't see any of it
+    assert history.read_timeline(timeline_project, ORIGINAL) == _history(5)
+
+
+def test_branch_without_history(timeline_project):
+    history.branch_timeline(timeline_project, ORIGINAL, "branch.json", 2, False)
+
+    assert history.read_timeline(timeline_project, "branch.json") == [_checkpoint(2)]
+    assert history.common_ancestor(
+        timeline_project, ORIGINAL, "branch.json"
+    ) == _checkpoint(2)
+    with pytest.raises(FileExistsError):
+        history.branch_timeline(timeline_project, ORIGINAL, "branch.json", 0, False)
+
+
+def test_rename_and_delete_timelines(timeline_project):
+    history.branch_timeline(timeline_project, ORIGINAL, "branch.json", 0, True)
+    history.rename_timeline(timeline_project, "branch.json", "renamed.json")
+
+    timelines = sorted(history.list_timelines(timeline_project))
+    assert timelines == [ORIGINAL, "renamed.json"]
+    assert history.read_timeline(timeline_project, "renamed.json") == _history(5)
+
+    history.delete_timeline(timeline_project, "renamed.json")
+
+    assert history.list_timelines(timeline_project) == [ORIGINAL]
+    assert history.read_timeline(timeline_project, ORIGINAL) == _history(5)
+
+
+def test_compact_keeps_what_timelines_show(project):
+    history.write_timeline(project, ORIGINAL, _history(5))
+    history.branch_timeline(project, ORIGINAL, "branch.json", 2, True)
+    history.branch_timeline(project, ORIGINAL, "dropped.json", 0, False)
+    history.append_events(
+        project,
+        "branch.json",
+        [history.add_checkpoint(_checkpoint(i)) for i in range(10, 20)]
+        + [
+            history.edit_checkpoint("1.blend", "Edited"),
+            history.delete_checkpoint("0.blend"),
+        ],
+    )
+    history.delete_timeline(project, "dropped.json")
+
+    expected = {
+        timeline: history.read_timeline(project, timeline)
+        for timeline in history.list_timelines(project)
+    }
+    graph_path = history.get_graph_path(project)
+    size = os.path.getsize(graph_path)
+
+    history.compact_graph(project)
+
+    assert os.path.getsize(graph_path) < size
+    for timeline, checkpoints in expected.items():
+        assert history.read_timeline(project, timeline) == checkpoints
+
+    # Appends go after the compacted records
+    history.append_events(project, ORIGINAL, [history.add_checkpoint(_checkpoint(30))])
+    assert _ids(project, ORIGINAL, 0, 2) == ["30.blend", "4.blend"]
+
+
+def test_backends_agree(make_project):
+    project, database_project = make_project(), make_project()
+    for filepath in (project, database_project):
+        history.write_timeline(filepath, ORIGINAL, _history(7))
+    history.convert_to_database(database_project)
+
+    for filepath in (project, database_project):
+        history.branch_timeline(filepath, ORIGINAL, "a.json", 1, True)
+        history.branch_timeline(filepath, "a.json", "b.json", 2, False)
+        history.append_events(
+            filepath,
+            "a.json",
+            [
+                history.add_checkpoint(_checkpoint(20)),
+                history.delete_checkpoint("4.blend"),
+                history.edit_checkpoint("0.blend", "Edited on a"),
+            ],
+        )
+        history.append_events(
+            filepath, ORIGINAL, [history.delete_checkpoint("6.blend")]
+        )
+
+    assert config.uses_database(database_project)
+    for timeline in (ORIGINAL, "a.json", "b.json"):
+        for start, count in ((0, None), (1, 2), (3, 10)):
+            assert history.read_timeline(
+                project, timeline, start, count
+            ) == history.read_timeline(database_project, timeline, start, count)
+    assert history.common_ancestor(
+        project, ORIGINAL, "a.json"
+    ) == history.common_ancestor(database_project, ORIGINAL, "a.json")
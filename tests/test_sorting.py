@@ -0,0 +1,60 @@
+from checkpoint_addon import sorting
+
+
+def _checkpoint(index, timestamp, stored, size, description=None):
+    checkpoint = {
+        "id": f"{index}.blend",
+        "description": description or f"Checkpoint {index}",
+        "date": "",
+        "timestamp": timestamp,
+    }
+    # Missing from checkpoints made before sizes were recorded
+    if stored is not None:
+        checkpoint["stored"] = stored
+    if size is not None:
+        checkpoint["size"] = size
+    return checkpoint
+
+
+# Newest first, as timelines list them. None timestamps are dates that
+# couldn't be parsed
+CHECKPOINTS = [
+    _checkpoint(0, 300, 50, 1000, "beta"),
+    _checkpoint(1, None, None, None, "Alpha"),
+    _checkpoint(2, 100, 10, 0, "gamma"),
+    _checkpoint(3, 200, None, 500, "alpha 2"),
+    _checkpoint(4, None, 30, 100, "Delta"),
+]
+
+
+def _order(sort, reverse=False):
+    return list(sorting.Columns(CHECKPOINTS).get_order(sort, reverse))
+
+
+def test_timeline_order():
+    assert _order(sorting.TIMELINE) == [0, 1, 2, 3, 4]
+    assert _order(sorting.TIMELINE, reverse=True) == [4, 3, 2, 1, 0]
+
+
+def test_unknown_values_go_last():
+    assert _order(sorting.DATE) == [2, 3, 0, 1, 4]
+    assert _order(sorting.DATE, reverse=True) == [0, 3, 2, 1, 4]
+    assert _order(sorting.SIZE) == [2, 4, 0, 1, 3]
+    assert _order(sorting.SIZE, reverse=True) == [0, 4, 2, 1, 3]
+
+
+def test_ratio_needs_both_sizes():
+    # 0.05 and 0.3, checkpoint 2 has a size of 0
+    assert _order(sorting.RATIO) == [0, 4, 1, 2, 3]
+    assert _order(sorting.RATIO, reverse=True) == [4, 0, 1, 2, 3]
+
+
+def test_description_ignores_case():
+    assert _order(sorting.DESCRIPTION) == [1, 3, 0, 4, 2]
+    assert _order(sorting.DESCRIPTION, reverse=True) == [2, 4, 0, 3, 1]
+
+
+def test_columns_give_back_the_checkpoints():
+    columns = sorting.Columns(CHECKPOINTS)
+    for index, checkpoint in enumerate(CHECKPOINTS):
+        assert columns.get_checkpoint(index) == checkpoint
@@ -0,0 +1,102 @@
+import os
+import random
+
+from checkpoint_addon import config, journal, store
+
+
+def _objects(filepath):
+    """Names of the stored objects, without the reference counts"""
+    objects_folder = config.get_paths(filepath)[config.PATHS_KEYS.OBJECTS_FOLDER]
+    return {
+        name
+        for _, _, names in os.walk(objects_folder)
+        for name in names
+        if not name.startswith("_")
+    }
+
+
+def _refcounts(filepath):
+    return journal.read(
+        store._refcounts_path(filepath),
+        lambda: store._count_objects(filepath),
+        store._apply_refcounts,
+    )
+
+
+def _versions(count, size=600 * 1024):
+    """Contents of a file edited a bit each time, some chunks kept"""
+    rng = random.Random(count)
+    content = bytearray(rng.randbytes(size))
+    versions = [bytes(content)]
+    for _ in range(count - 1):
+        start = rng.randrange(size - 4096)
+        content[start : start + 4096] = rng.randbytes(4096)
+        if rng.random() < 0.5:
+            content.extend(rng.randbytes(1000))
+        else:
+            del content[-1000:]
+        versions.append(bytes(content))
+    return versions
+
+
+def _save_all(filepath, tmp_path, versions, max_delta_chain):
+    ids = []
+    for index, content in enumerate(versions):
+        source = tmp_path / f"source{index}"
+        source.write_bytes(content)
+        checkpoint_id = f"{index}.blend"
+        store.save_checkpoint(
+            filepath,
+            str(source),
+            checkpoint_id,
+            base_checkpoint_id=ids[-1] if ids else None,
+            max_delta_chain=max_delta_chain,
+            method="store",
+        )
+        ids.append(checkpoint_id)
+    return ids
+
+
+def _restore(filepath, tmp_path, checkpoint_id):
+    destination = tmp_path / "restored"
+    store.restore_checkpoint(filepath, checkpoint_id, str(destination))
+    return destination.read_bytes()
+
+
+def test_restore_is_byte_identical_across_delta_chains(project, tmp_path):
+    versions = _versions(8)
+    ids = _save_all(project, tmp_path, versions, max_delta_chain=3)
+
+    for checkpoint_id, content in zip(ids, versions):
+        assert _restore(project, tmp_path, checkpoint_id) == content
+
+
+def test_deleting_keeps_the_chains_of_the_others(project, tmp_path):
+    versions = _versions(8)
+    ids = _save_all(project, tmp_path, versions, max_delta_chain=3)
+
+    # Bases of deltas still needed, and a keyframe
+    for checkpoint_id in (ids[1], ids[2], ids[4]):
+        store.remove_checkpoint(project, checkpoint_id)
+
+    for index in (0, 3, 5, 6, 7):
+        assert _restore(project, tmp_path, ids[index]) == versions[index]
+
+
+def test_deleting_everything_frees_every_object(project, tmp_path):
+    ids = _save_all(project, tmp_path, _versions(6), max_delta_chain=2)
+    assert _objects(project)
+
+    # Out of order, bases before the deltas on them
+    store.remove_checkpoints(project, ids[::2])
+    store.remove_checkpoints(project, ids[1::2])
+
+    assert _refcounts(project) == {}
+    assert _objects(project) == set()
+
+
+def test_refcounts_match_a_full_count(project, tmp_path):
+    ids = _save_all(project, tmp_path, _versions(6), max_delta_chain=2)
+    store.remove_checkpoints(project, [ids[0], ids[3]])
+
+    assert _refcounts(project) == store._count_objects(project)